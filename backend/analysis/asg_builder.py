@@ -32,6 +32,7 @@ class ASGBuilder:
         
         # Extract functions
         functions = parser.extract_functions(tree, content)
+        calls = parser.extract_calls(tree, content)
         for func in functions:
             node_id = self._generate_node_id(file_path, func['name'], func['start_line'])
             code = content.encode('utf8')[func['start_byte']:func['end_byte']].decode('utf8')
@@ -44,7 +45,10 @@ class ASGBuilder:
                 start_line=func['start_line'],
                 end_line=func['end_line'],
                 code=code,
-                metadata={'signature': func.get('signature', '')}
+                metadata={
+                    'signature': func.get('signature', ''),
+                    'calls': self._called_names(func, calls)
+                }
             ))
         
         # Extract classes
@@ -80,8 +84,7 @@ class ASGBuilder:
                 metadata={}
             ))
         
-        # Extract function calls and create edges
-        calls = parser.extract_calls(tree, content)
+        # Create edges for calls to functions in the same file
         for call in calls:
             # Find which function this call belongs to
             calling_func = self._find_containing_function(call['line'], functions)
@@ -107,6 +110,19 @@ class ASGBuilder:
         content = f"{file_path}::{name}::{line}"
         return hashlib.md5(content.encode()).hexdigest()
     
+    def _called_names(self, func: Dict, calls: List[Dict]) -> List[str]:
+        """
+        Get the names a function calls, without receivers (``self.save`` -> ``save``).
+        
+        Kept on the node so calls into other files can be resolved by name.
+        """
+        names = {
+            call['function'].rsplit('.', 1)[-1]
+            for call in calls
+            if func['start_line'] <= call['line'] <= func['end_line']
+        }
+        return sorted(names)
+    
     def _find_containing_function(self, line: int, functions: List[Dict]) -> Dict:
         """Find which function contains a given line."""
         for func in functions:
@@ -0,0 +1,328 @@
+"""
+Call graph over the indexed repository with PageRank centrality.
+
+Functions and classes are nodes; a call from one to a name points at the
+nodes with that name, preferring ones in the caller's file. Centrality is
+recomputed after each indexing run, warm-started from the previous scores
+so only the changed regions move, and served from an in-memory array.
+Other workers pick up the persisted result with sync().
+"""
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+import logging
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from db.models import CodeNode, NodeType
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+RANKED_NODE_TYPES = (NodeType.FUNCTION, NodeType.CLASS, NodeType.METHOD)
+
+
+class CallGraph:
+    """Registry of call graph nodes per file, with centrality scores."""
+    
+    def __init__(
+        self,
+        db_path: str,
+        damping: float = 0.85,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100
+    ):
+        """
+        Initialize call graph.
+        
+        Args:
+            db_path: Directory holding the persisted graph and scores
+            damping: PageRank damping factor
+            tolerance: L1 change at which power iteration stops
+            max_iterations: Maximum power iterations per computation
+        """
+        self.db_path = Path(db_path)
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self._lock = threading.Lock()
+        
+        # file_path -> [(node_id, name, called names)]
+        self.files: Dict[str, List[Tuple[str, str, List[str]]]] = {}
+        self._dirty = False
+        self._file_key: Optional[Tuple[int, int]] = None
+        
+        # Published (node_id -> row, ranks, scores normalized to [0, 1]),
+        # replaced as one tuple so readers always see a consistent set
+        self._snapshot: Tuple[Dict[str, int], np.ndarray, np.ndarray] = (
+            {}, np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float32)
+        )
+        
+        self._load()
+    
+    def update_file(self, file_path: str, nodes: List[CodeNode]):
+        """
+        Replace a file's call graph nodes.
+        
+        Args:
+            file_path: File the nodes were extracted from
+            nodes: ASG nodes of the file
+        """
+        entries = [
+            (node.id, node.name, node.metadata.get('calls', []))
+            for node in nodes
+            if node.type in RANKED_NODE_TYPES
+        ]
+        with self._lock:
+            if self.files.get(file_path) != entries:
+                self.files[file_path] = entries
+                self._dirty = True
+    
+    def remove_file(self, file_path: str):
+        """Drop a file's nodes from the call graph."""
+        with self._lock:
+            if self.files.pop(file_path, None) is not None:
+                self._dirty = True
+    
+    def compute(self) -> int:
+        """
+        Recompute PageRank if the graph changed, and persist it.
+        
+        Returns:
+            Number of power iterations run (0 if nothing changed)
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            node_ids, _, _, src, dst, weights = self._edge_arrays()
+            self._dirty = False
+        
+        node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        ranks, iterations = self._pagerank(node_index, src, dst, weights)
+        self._snapshot = (node_index, ranks, normalize(ranks))
+        self.save()
+        
+        logger.info(f"Computed centrality for {len(node_ids)} nodes in {iterations} iterations")
+        return iterations
+    
+    def score(self, node_ids: List[str]) -> float:
+        """
+        Get the centrality of a set of nodes (the highest among them).
+        
+        Args:
+            node_ids: Node IDs, e.g. those a chunk covers
+            
+        Returns:
+            Score in [0, 1]; 0.0 for unknown nodes
+        """
+        node_index, _, scores = self._snapshot
+        rows = [node_index[node_id] for node_id in node_ids if node_id in node_index]
+        if not rows:
+            return 0.0
+        return float(scores[rows].max())
+    
+    def scores(self, node_id_lists: List[List[str]]) -> np.ndarray:
+        """
+        Get the centrality of many node sets at once, as score() would for each.
+        
+        Args:
+            node_id_lists: Node IDs per item, e.g. per retrieved chunk
+            
+        Returns:
+            Score per item in [0, 1]; 0.0 for items without known nodes
+        """
+        node_index, _, scores = self._snapshot
+        item_rows = [
+            [node_index[node_id] for node_id in node_ids if node_id in node_index]
+            for node_ids in node_id_lists
+        ]
+        counts = np.array([len(rows) for rows in item_rows], dtype=np.int64)
+        result = np.zeros(len(item_rows), dtype=np.float32)
+        known = counts > 0
+        if known.any():
+            # Max over each item's slice of the flattened rows
+            rows = np.fromiter((row for rows in item_rows for row in rows), dtype=np.int64)
+            offsets = (np.cumsum(counts) - counts)[known]
+            result[known] = np.maximum.reduceat(scores[rows], offsets)
+        return result
+    
+    def edges(self) -> Tuple[List[str], List[str], List[str], np.ndarray, np.ndarray]:
+        """
+        Get the resolved call graph.
+        
+        Returns:
+            (node_ids, names, file_paths, src, dst), with edges as node rows
+        """
+        with self._lock:
+            node_ids, names, node_files, src, dst, _ = self._edge_arrays()
+        return node_ids, names, node_files, src, dst
+    
+    def get_stats(self) -> dict:
+        """Get call graph statistics."""
+        node_index, _, _ = self._snapshot
+        return {
+            "files": len(self.files),
+            "ranked_nodes": len(node_index)
+        }
+    
+    def clear(self):
+        """Remove all nodes and scores."""
+        with self._lock:
+            self.files = {}
+            self._dirty = True
+        self.compute()
+    
+    def _edge_arrays(self) -> Tuple[List[str], List[str], List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Resolve called names to nodes and build weighted edge arrays.
+        
+        A call resolves to the same-named nodes in the caller's file if
+        there are any, otherwise to all same-named nodes; its weight is
+        split evenly between them.
+        """
+        node_ids: List[str] = []
+        names: List[str] = []
+        node_files: List[str] = []
+        by_name: Dict[str, List[int]] = {}
+        for file_path, entries in self.files.items():
+            for node_id, name, _ in entries:
+                by_name.setdefault(name, []).append(len(node_ids))
+                node_ids.append(node_id)
+                names.append(name)
+                node_files.append(file_path)
+        
+        src, dst, weights = [], [], []
+        caller = 0
+        for file_path, entries in self.files.items():
+            for _, _, called in entries:
+                for name in called:
+                    targets = by_name.get(name, [])
+                    local = [t for t in targets if node_files[t] == file_path]
+                    targets = [t for t in (local or targets) if t != caller]
+                    for target in targets:
+                        src.append(caller)
+                        dst.append(target)
+                        weights.append(1.0 / len(targets))
+                caller += 1
+        
+        return (
+            node_ids,
+            names,
+            node_files,
+            np.asarray(src, dtype=np.int32),
+            np.asarray(dst, dtype=np.int32),
+            np.asarray(weights, dtype=np.float64)
+        )
+    
+    def _pagerank(
+        self,
+        node_index: Dict[str, int],
+        src: np.ndarray,
+        dst: np.ndarray,
+        weights: np.ndarray
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Power iteration, warm-started from the previous ranks.
+        
+        Returns:
+            (ranks summing to 1, iterations run)
+        """
+        n = len(node_index)
+        if n == 0:
+            return np.zeros(0, dtype=np.float64), 0
+        
+        # Warm start: carry over ranks of nodes that still exist
+        ranks = np.full(n, 1.0 / n)
+        previous_index, previous_ranks, _ = self._snapshot
+        if previous_ranks.size:
+            rows = [(i, previous_index[node_id]) for node_id, i in node_index.items() if node_id in previous_index]
+            if rows:
+                new_rows, old_rows = map(np.asarray, zip(*rows))
+                ranks[new_rows] = previous_ranks[old_rows]
+            ranks /= ranks.sum()
+        
+        out_weight = np.bincount(src, weights=weights, minlength=n)
+        dangling = out_weight == 0
+        edge_share = weights / np.where(dangling, 1.0, out_weight)[src]
+        
+        iterations = 0
+        for iterations in range(1, self.max_iterations + 1):
+            flow = np.bincount(dst, weights=ranks[src] * edge_share, minlength=n)
+            updated = (1.0 - self.damping) / n + self.damping * (flow + ranks[dangling].sum() / n)
+            delta = np.abs(updated - ranks).sum()
+            ranks = updated
+            if delta < self.tolerance:
+                break
+        
+        return ranks, iterations
+    
+    def save(self):
+        """Persist the call graph and scores."""
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        node_index, ranks, _ = self._snapshot
+        with self._lock:
+            data = {"files": dict(self.files), "node_index": node_index, "ranks": ranks}
+        
+        path = self.db_path / "call_graph.pkl"
+        tmp_path = self.db_path / "call_graph.pkl.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._file_key = self._stat_graph()
+    
+    def sync(self) -> bool:
+        """
+        Reload the graph if another process saved a newer one (unsaved changes win).
+        
+        Returns:
+            Whether the graph was reloaded
+        """
+        file_key = self._stat_graph()
+        if file_key is None or file_key == self._file_key or self._dirty:
+            return False
+        
+        with self._lock:
+            if self._dirty or self._stat_graph() == self._file_key:
+                return False
+            self._load()
+        return True
+    
+    def _stat_graph(self) -> Optional[Tuple[int, int]]:
+        """Identify the persisted graph file (os.replace gives each one a new inode)."""
+        try:
+            stat = os.stat(self.db_path / "call_graph.pkl")
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+    
+    def _load(self):
+        """Load the persisted call graph and scores, if any."""
+        path = self.db_path / "call_graph.pkl"
+        file_key = self._stat_graph()
+        if file_key is None:
+            return
+        
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading call graph: {e}")
+            return
+        
+        self._file_key = file_key
+        self.files = data["files"]
+        self._snapshot = (data["node_index"], data["ranks"], normalize(data["ranks"]))
+        logger.info(f"Loaded call graph: {len(data['node_index'])} ranked nodes")
+
+
+def normalize(ranks: np.ndarray) -> np.ndarray:
+    """Scale ranks so the most central node scores 1.0."""
+    if ranks.size == 0:
+        return ranks.astype(np.float32)
+    return (ranks / ranks.max()).astype(np.float32)
+
+
+# Global call graph instance
+call_graph = CallGraph(settings.call_graph_path, damping=settings.pagerank_damping)
@@ -1,124 +1,368 @@
 """
 Control Flow Graph (CFG) builder.
-Builds execution flow graphs for functions.
+Builds basic-block execution flow graphs for functions from the tree-sitter AST.
+
+Statements that always execute in sequence are collapsed into one block;
+branches, loops, exception handlers and early exits become labelled edges
+between blocks.
 """
-from typing import List, Dict, Any
-from db.models import CFGNode, CFGEdge
-import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+from analysis.tree_sitter_parser import parser
+from db.models import BasicBlock, CodeNode, FunctionCFG
+
+FUNCTION_TYPES = ('function_definition', 'function_declaration', 'method_definition')
+BLOCK_TYPES = ('block', 'statement_block')
+LOOP_TYPES = ('for_statement', 'for_in_statement', 'while_statement')
+SWITCH_TYPES = ('switch_statement', 'match_statement')
+HANDLER_TYPES = ('except_clause', 'except_group_clause', 'catch_clause')
+EXIT_LABELS = {'return_statement': "return", 'raise_statement': "raise", 'throw_statement': "raise"}
+
+
+def first_line(node: Any) -> int:
+    """Get the 1-based first line of an AST node."""
+    return node.start_point[0] + 1
+
+
+def last_line(node: Any) -> int:
+    """Get the 1-based last line of an AST node."""
+    return node.end_point[0] + 1
+
+
+def clause_body(clause: Any) -> Any:
+    """Get the statements of an else/except/catch/finally clause."""
+    return clause.child_by_field_name('body') or clause.named_children[-1]
+
+
+class _CFGWalk:
+    """Blocks and edges of one function while its AST is walked."""
+    
+    def __init__(self, function_node: Any):
+        """
+        Start a CFG with its entry and exit blocks.
+        
+        Args:
+            function_node: Tree-sitter node of the function
+        """
+        self.blocks = [
+            BasicBlock("entry", first_line(function_node), first_line(function_node)),
+            BasicBlock("exit", last_line(function_node), last_line(function_node))
+        ]
+        self.edges: List[Tuple[int, int, str]] = []
+        self.reached = set()
+        
+        # (continue target, break target) of the enclosing loops and switches
+        self.jumps: List[Tuple[Optional[int], int]] = []
+    
+    def new_block(self, kind: str = "block", start_line: int = 0, end_line: int = 0) -> int:
+        """Add a block; plain blocks start empty (line 0) until a statement is appended."""
+        self.blocks.append(BasicBlock(kind, start_line, end_line))
+        return len(self.blocks) - 1
+    
+    def edge(self, source: int, target: int, label: str = ""):
+        """Add a control flow edge."""
+        self.edges.append((source, target, label))
+        self.reached.add(target)
+    
+    def close(self, source: Optional[int], target: int, label: str = ""):
+        """Connect the end of a branch to where it continues, unless it never falls through."""
+        if source is not None:
+            self.edge(source, target, label)
+    
+    def branch(self, source: int, label: str = "") -> int:
+        """Start a new empty block reached from another one."""
+        block = self.new_block()
+        self.edge(source, block, label)
+        return block
+    
+    def join(self, block: int) -> Optional[int]:
+        """Get a join block as the current block, or None if nothing reaches it."""
+        return block if block in self.reached else None
+    
+    def append(self, current: int, start_line: int, end_line: int) -> int:
+        """Add straight-line statements to the current block, starting a new one if needed."""
+        if self.blocks[current].kind != "block":
+            current = self.branch(current)
+        block = self.blocks[current]
+        if block.start_line == 0:
+            block.start_line = start_line
+        block.end_line = max(block.end_line, end_line)
+        return current
+    
+    def header(self, current: int, node: Any, body: Optional[Any], kind: str, label: str = "") -> int:
+        """Add the condition or loop block covering a statement's header lines."""
+        start_line = first_line(node)
+        end_line = max(start_line, first_line(body) - 1) if body is not None else last_line(node)
+        block = self.new_block(kind, start_line, end_line)
+        self.edge(current, block, label)
+        return block
+    
+    def visit_sequence(self, nodes: List[Any], current: Optional[int]) -> Optional[int]:
+        """Visit statements in order; statements after a jump are unreachable and skipped."""
+        for node in nodes:
+            if current is None:
+                break
+            if node.type != 'comment':
+                current = self.visit(node, current)
+        return current
+    
+    def visit(self, node: Any, current: int) -> Optional[int]:
+        """
+        Add a statement to the CFG.
+        
+        Returns:
+            Block control continues from, or None if it never falls through
+        """
+        if node.type in BLOCK_TYPES:
+            return self.visit_sequence(node.named_children, current)
+        if node.type == 'if_statement':
+            return self.visit_if(node, current)
+        if node.type in LOOP_TYPES:
+            return self.visit_loop(node, current)
+        if node.type == 'do_statement':
+            return self.visit_do(node, current)
+        if node.type == 'try_statement':
+            return self.visit_try(node, current)
+        if node.type in SWITCH_TYPES:
+            return self.visit_switch(node, current)
+        if node.type == 'with_statement':
+            body = node.child_by_field_name('body')
+            current = self.append(current, first_line(node), max(first_line(node), first_line(body) - 1))
+            return self.visit(body, current)
+        
+        if node.type in EXIT_LABELS:
+            block = self.append(current, first_line(node), last_line(node))
+            self.edge(block, FunctionCFG.EXIT, EXIT_LABELS[node.type])
+            return None
+        if node.type == 'break_statement' and self.jumps:
+            block = self.append(current, first_line(node), last_line(node))
+            self.edge(block, self.jumps[-1][1], "break")
+            return None
+        if node.type == 'continue_statement':
+            targets = [target for target, _ in self.jumps if target is not None]
+            if targets:
+                block = self.append(current, first_line(node), last_line(node))
+                self.edge(block, targets[-1], "continue")
+                return None
+        
+        return self.append(current, first_line(node), last_line(node))
+    
+    def visit_if(self, node: Any, current: int) -> Optional[int]:
+        """Add an if statement with its elif/else branches."""
+        after = self.new_block()
+        consequence = node.child_by_field_name('consequence')
+        condition = self.header(current, node, consequence, "condition")
+        self.close(self.visit(consequence, self.branch(condition, "true")), after)
+        
+        for alternative in node.children_by_field_name('alternative'):
+            if alternative.type == 'elif_clause':
+                consequence = alternative.child_by_field_name('consequence')
+                condition = self.header(condition, alternative, consequence, "condition", "false")
+                self.close(self.visit(consequence, self.branch(condition, "true")), after)
+            else:
+                self.close(self.visit(clause_body(alternative), self.branch(condition, "false")), after)
+                return self.join(after)
+        
+        self.edge(condition, after, "false")
+        return self.join(after)
+    
+    def visit_loop(self, node: Any, current: int) -> Optional[int]:
+        """Add a for/while loop; a Python loop's else branch runs when the condition fails."""
+        body = node.child_by_field_name('body')
+        header = self.header(current, node, body, "loop")
+        after = self.new_block()
+        
+        self.jumps.append((header, after))
+        self.close(self.visit(body, self.branch(header, "loop")), header, "back")
+        self.jumps.pop()
+        
+        alternative = node.child_by_field_name('alternative')
+        if alternative is not None:
+            self.close(self.visit(clause_body(alternative), self.branch(header, "false")), after)
+        else:
+            self.edge(header, after, "false")
+        return self.join(after)
+    
+    def visit_do(self, node: Any, current: int) -> Optional[int]:
+        """Add a do/while loop, whose condition is tested after the body."""
+        condition = node.child_by_field_name('condition')
+        start = self.branch(current)
+        test = self.new_block("loop", first_line(condition), last_line(condition))
+        after = self.new_block()
+        
+        self.jumps.append((test, after))
+        self.close(self.visit(node.child_by_field_name('body'), start), test)
+        self.jumps.pop()
+        
+        self.edge(test, start, "back")
+        self.edge(test, after, "false")
+        return self.join(after)
+    
+    def visit_try(self, node: Any, current: int) -> Optional[int]:
+        """Add a try statement; handlers are entered from the start of the protected block."""
+        start = self.new_block("block", first_line(node), first_line(node))
+        self.edge(current, start)
+        end = self.visit(node.child_by_field_name('body'), start)
+        
+        handlers = [child for child in node.named_children if child.type in HANDLER_TYPES]
+        else_clause = next((child for child in node.named_children if child.type == 'else_clause'), None)
+        finally_clause = node.child_by_field_name('finalizer') or next(
+            (child for child in node.named_children if child.type == 'finally_clause'), None
+        )
+        
+        if else_clause is not None and end is not None:
+            end = self.visit(clause_body(else_clause), self.branch(end))
+        
+        after = self.new_block()
+        self.close(end, after)
+        for handler in handlers:
+            self.close(self.visit(clause_body(handler), self.branch(start, "exception")), after)
+        
+        current = self.join(after)
+        if finally_clause is not None and current is not None:
+            current = self.visit(clause_body(finally_clause), current)
+        return current
+    
+    def visit_switch(self, node: Any, current: int) -> Optional[int]:
+        """Add a switch (cases fall through) or match statement."""
+        body = node.child_by_field_name('body')
+        condition = self.header(current, node, body, "condition")
+        after = self.new_block()
+        falls_through = node.type == 'switch_statement'
+        
+        # break leaves the switch; continue still targets the enclosing loop
+        self.jumps.append((None, after))
+        previous = None
+        has_default = False
+        for case in body.named_children:
+            if case.type == 'comment':
+                continue
+            has_default = has_default or self._is_default(case)
+            start = self.branch(condition, "case")
+            self.close(previous, start)
+            statements = case.children_by_field_name('body') or [case.child_by_field_name('consequence')]
+            end = self.visit_sequence(statements, start)
+            if falls_through:
+                previous = end
+            else:
+                self.close(end, after)
+        self.close(previous, after)
+        self.jumps.pop()
+        
+        if not has_default:
+            self.edge(condition, after, "false")
+        return self.join(after)
+    
+    def _is_default(self, case: Any) -> bool:
+        """Check whether a switch/match case matches every value."""
+        if case.type == 'switch_default':
+            return True
+        patterns = [child for child in case.named_children if child.type == 'case_pattern']
+        return (
+            len(patterns) == 1
+            and patterns[0].text == b'_'
+            and case.child_by_field_name('guard') is None
+        )
+    
+    def finish(self, function_id: str) -> FunctionCFG:
+        """
+        Drop empty and unreachable blocks and number the rest.
+        
+        An empty block's incoming edges are redirected to its only
+        successor, keeping the incoming label unless it has none.
+        """
+        successors: Dict[int, List[Tuple[int, str]]] = {}
+        for source, target, label in self.edges:
+            successors.setdefault(source, []).append((target, label))
+        
+        def is_empty(block: int) -> bool:
+            return (
+                self.blocks[block].kind == "block"
+                and self.blocks[block].start_line == 0
+                and len(successors.get(block, [])) == 1
+            )
+        
+        def resolve(target: int, label: str) -> Tuple[int, str]:
+            seen = set()
+            while is_empty(target) and target not in seen:
+                seen.add(target)
+                target, next_label = successors[target][0]
+                label = label or next_label
+            return target, label
+        
+        # Keep blocks reachable from the entry over redirected edges
+        edges = []
+        order = [FunctionCFG.ENTRY, FunctionCFG.EXIT]
+        number = {FunctionCFG.ENTRY: 0, FunctionCFG.EXIT: 1}
+        stack = [FunctionCFG.ENTRY]
+        while stack:
+            source = stack.pop()
+            for target, label in successors.get(source, []):
+                target, label = resolve(target, label)
+                if target not in number:
+                    number[target] = len(order)
+                    order.append(target)
+                    stack.append(target)
+                edges.append((number[source], number[target], label))
+        
+        return FunctionCFG(
+            function_id=function_id,
+            blocks=[self.blocks[block] for block in order],
+            edges=list(dict.fromkeys(edges))
+        )
 
 
 class CFGBuilder:
     """Builds Control Flow Graphs for functions."""
     
-    def build_cfg(self, function_id: str, function_code: str, start_line: int) -> tuple[List[CFGNode], List[CFGEdge]]:
+    def build_cfgs(self, file_path: str, content: str, function_nodes: List[CodeNode]) -> List[FunctionCFG]:
         """
-        Build CFG for a function.
-        
-        This is a simplified CFG builder. A production version would use
-        more sophisticated analysis based on the AST.
+        Build CFGs for the functions of a file.
         
         Args:
-            function_id: ID of the function node
-            function_code: Function source code
-            start_line: Starting line number of function
+            file_path: Path to file
+            content: File content
+            function_nodes: ASG function nodes of the file
             
         Returns:
-            Tuple of (cfg_nodes, cfg_edges)
+            One CFG per function node found in the file's AST
         """
-        nodes = []
-        edges = []
+        tree = parser.parse_file(file_path, content)
+        if tree is None:
+            return []
         
-        lines = function_code.split('\n')
+        function_ids = {(node.name, node.start_line): node.id for node in function_nodes}
+        cfgs = []
         
-        # Create entry node
-        entry_id = f"{function_id}_entry"
-        nodes.append(CFGNode(
-            id=entry_id,
-            function_id=function_id,
-            code="<entry>",
-            line_number=start_line,
-            type="entry"
-        ))
-        
-        # Create exit node
-        exit_id = f"{function_id}_exit"
-        nodes.append(CFGNode(
-            id=exit_id,
-            function_id=function_id,
-            code="<exit>",
-            line_number=start_line + len(lines) - 1,
-            type="exit"
-        ))
-        
-        # Create nodes for each statement (simplified)
-        prev_node_id = entry_id
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line or line.startswith('#') or line.startswith('//'):
-                continue
-            
-            node_id = f"{function_id}_stmt_{i}"
-            node_type = self._classify_statement(line)
+        def traverse(node):
+            if node.type in FUNCTION_TYPES:
+                name_node = node.child_by_field_name('name')
+                if name_node:
+                    function_id = function_ids.get((name_node.text.decode('utf8'), first_line(node)))
+                    if function_id is not None:
+                        cfgs.append(self.build_cfg(function_id, node))
             
-            nodes.append(CFGNode(
-                id=node_id,
-                function_id=function_id,
-                code=line,
-                line_number=start_line + i,
-                type=node_type
-            ))
-            
-            # Connect to previous node
-            edges.append(CFGEdge(
-                source_id=prev_node_id,
-                target_id=node_id
-            ))
+            for child in node.children:
+                traverse(child)
+        
+        traverse(tree.root_node)
+        return cfgs
+    
+    def build_cfg(self, function_id: str, function_node: Any) -> FunctionCFG:
+        """
+        Build the basic-block CFG of a function.
+        
+        Args:
+            function_id: ID of the function node
+            function_node: Tree-sitter node of the function
             
-            # Handle control flow
-            if node_type == "condition":
-                # For if statements, we'd need more analysis
-                # Simplified: just continue flow
-                prev_node_id = node_id
-            elif node_type == "loop":
-                # Create back edge for loop
-                prev_node_id = node_id
-            elif line.startswith('return'):
-                # Connect to exit
-                edges.append(CFGEdge(
-                    source_id=node_id,
-                    target_id=exit_id
-                ))
-                prev_node_id = node_id
-            else:
-                prev_node_id = node_id
-        
-        # Connect last statement to exit if not already connected
-        if prev_node_id != entry_id:
-            edges.append(CFGEdge(
-                source_id=prev_node_id,
-                target_id=exit_id
-            ))
-        else:
-            # Empty function
-            edges.append(CFGEdge(
-                source_id=entry_id,
-                target_id=exit_id
-            ))
-        
-        return nodes, edges
-    
-    def _classify_statement(self, line: str) -> str:
-        """Classify statement type."""
-        line_lower = line.lower()
-        
-        if line_lower.startswith(('if ', 'elif ', 'else:', 'switch', 'case')):
-            return "condition"
-        elif line_lower.startswith(('for ', 'while ', 'do ')):
-            return "loop"
-        elif line_lower.startswith('return'):
-            return "return"
-        else:
-            return "statement"
+        Returns:
+            Function CFG
+        """
+        walk = _CFGWalk(function_node)
+        body = function_node.child_by_field_name('body')
+        current = walk.visit(body, FunctionCFG.ENTRY) if body is not None else FunctionCFG.ENTRY
+        walk.close(current, FunctionCFG.EXIT)
+        return walk.finish(function_id)
 
 
 # Global CFG builder instance
@@ -0,0 +1,259 @@
+"""
+Bounded execution path analysis over basic-block CFGs.
+
+A depth-first search finds the back edges of a function's CFG; each one
+is replaced by edges from its source to wherever the loop header exits,
+so every path runs a loop body at most once and the graph becomes a DAG.
+Path counts come from one dynamic-programming pass over the DAG, and
+enumeration returns either the k shortest paths or k paths chosen
+greedily to cover the most blocks, so each query is polynomial in the
+size of the CFG and linear in k, however many paths the function has.
+"""
+from collections import OrderedDict
+from typing import List, Dict, Set, Tuple
+import heapq
+import threading
+
+from db.models import FunctionCFG
+from config import settings
+
+STRATEGIES = ("shortest", "diverse")
+
+
+def back_edges(successors: List[List[int]], entry: int) -> Set[Tuple[int, int]]:
+    """Find the edges that close a cycle in a depth-first search from the entry."""
+    on_stack = [False] * len(successors)
+    visited = [False] * len(successors)
+    found = set()
+    
+    visited[entry] = on_stack[entry] = True
+    stack = [(entry, iter(successors[entry]))]
+    while stack:
+        block, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            on_stack[block] = False
+            stack.pop()
+        elif on_stack[child]:
+            found.add((block, child))
+        elif not visited[child]:
+            visited[child] = on_stack[child] = True
+            stack.append((child, iter(successors[child])))
+    return found
+
+
+def natural_loop(predecessors: List[List[int]], source: int, header: int) -> Set[int]:
+    """Get the blocks of the loop closed by the back edge source -> header."""
+    loop = {header, source}
+    stack = [source] if source != header else []
+    while stack:
+        for predecessor in predecessors[stack.pop()]:
+            if predecessor not in loop:
+                loop.add(predecessor)
+                stack.append(predecessor)
+    return loop
+
+
+class CFGPaths:
+    """Acyclic path structure of one function's CFG."""
+    
+    def __init__(self, cfg: FunctionCFG):
+        """
+        Convert the CFG to a DAG and count its paths.
+        
+        Args:
+            cfg: Basic-block CFG
+        """
+        self.cfg = cfg
+        self.successors = self._acyclic_successors(cfg)
+        self.order = self._topological_order()
+        
+        # Number of paths from each block to the exit
+        self.counts = [0] * len(cfg.blocks)
+        for block in reversed(self.order):
+            if block == FunctionCFG.EXIT:
+                self.counts[block] = 1
+            else:
+                self.counts[block] = sum(self.counts[child] for child in self.successors[block])
+        
+        # Enumerated paths by (strategy, k)
+        self._paths: Dict[Tuple[str, int], List[List[int]]] = {}
+    
+    def count(self) -> int:
+        """Get the number of entry-to-exit paths."""
+        return self.counts[FunctionCFG.ENTRY]
+    
+    def paths(self, k: int, strategy: str) -> List[List[int]]:
+        """Get the paths of one strategy, enumerating them on first request."""
+        key = (strategy, k)
+        if key not in self._paths:
+            self._paths[key] = self.shortest(k) if strategy == "shortest" else self.diverse(k)
+        return self._paths[key]
+    
+    def shortest(self, k: int) -> List[List[int]]:
+        """
+        Get the k shortest entry-to-exit paths.
+        
+        Keeps the k best suffixes per block, so the cost is
+        O(edges * k log k) rather than proportional to the number of paths.
+        """
+        best: List[List[Tuple[int, Tuple[int, ...]]]] = [[] for _ in self.cfg.blocks]
+        for block in reversed(self.order):
+            if block == FunctionCFG.EXIT:
+                best[block] = [(1, (block,))]
+                continue
+            candidates = (
+                (length + 1, (block,) + path)
+                for child in self.successors[block]
+                for length, path in best[child]
+            )
+            best[block] = heapq.nsmallest(k, candidates)
+        return [list(path) for _, path in best[FunctionCFG.ENTRY]]
+    
+    def diverse(self, k: int) -> List[List[int]]:
+        """
+        Get up to k paths that together cover as many blocks as possible.
+        
+        Each round picks the path with the most blocks not covered by
+        earlier paths (the shortest among ties) with one pass over the DAG,
+        and stops early once no path adds a block.
+        """
+        covered = [False] * len(self.cfg.blocks)
+        paths = []
+        while len(paths) < k and self.count():
+            # (new blocks, -length) of the best path from each block, and its next block
+            score = [(0, 0)] * len(self.cfg.blocks)
+            choice = [-1] * len(self.cfg.blocks)
+            for block in reversed(self.order):
+                gain = 0 if covered[block] else 1
+                if block == FunctionCFG.EXIT:
+                    score[block] = (gain, -1)
+                    continue
+                reachable = [child for child in self.successors[block] if self.counts[child]]
+                if not reachable:
+                    continue
+                child = max(reachable, key=lambda c: score[c])
+                score[block] = (score[child][0] + gain, score[child][1] - 1)
+                choice[block] = child
+            
+            if paths and score[FunctionCFG.ENTRY][0] == 0:
+                break
+            
+            path = [FunctionCFG.ENTRY]
+            while path[-1] != FunctionCFG.EXIT:
+                path.append(choice[path[-1]])
+            for block in path:
+                covered[block] = True
+            paths.append(path)
+        return paths
+    
+    def _acyclic_successors(self, cfg: FunctionCFG) -> List[List[int]]:
+        """
+        Remove back edges, continuing from a back edge's source to the exits of its loop header.
+        
+        Outer loops are rewritten first, so an inner loop whose header
+        only exits through the outer loop inherits the outer loop's exits.
+        """
+        successors = [list(dict.fromkeys(children)) for children in cfg.successors()]
+        predecessors: List[List[int]] = [[] for _ in cfg.blocks]
+        for block, children in enumerate(successors):
+            for child in children:
+                predecessors[child].append(block)
+        
+        backs = back_edges(successors, FunctionCFG.ENTRY)
+        dag = [
+            [child for child in children if (block, child) not in backs]
+            for block, children in enumerate(successors)
+        ]
+        loops = sorted(
+            ((natural_loop(predecessors, source, header), source, header) for source, header in backs),
+            key=lambda item: -len(item[0])
+        )
+        for loop, source, header in loops:
+            for child in dag[header]:
+                if child not in loop and child not in dag[source]:
+                    dag[source].append(child)
+        
+        # Structured code is acyclic by now; drop anything that still closes a cycle
+        for block, child in back_edges(dag, FunctionCFG.ENTRY):
+            dag[block].remove(child)
+        return dag
+    
+    def _topological_order(self) -> List[int]:
+        """Order the blocks reachable from the entry so every edge points forward."""
+        visited = [False] * len(self.cfg.blocks)
+        postorder = []
+        visited[FunctionCFG.ENTRY] = True
+        stack = [(FunctionCFG.ENTRY, iter(self.successors[FunctionCFG.ENTRY]))]
+        while stack:
+            block, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                postorder.append(block)
+                stack.pop()
+            elif not visited[child]:
+                visited[child] = True
+                stack.append((child, iter(self.successors[child])))
+        return postorder[::-1]
+
+
+class CFGPathAnalyzer:
+    """Memoized path analysis of function CFGs."""
+    
+    def __init__(self, cache_size: int = 256):
+        """
+        Initialize path analyzer.
+        
+        Args:
+            cache_size: Number of analyzed CFGs kept (least recently used evicted)
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, bytes], CFGPaths]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def analyze(self, cfg: FunctionCFG) -> CFGPaths:
+        """
+        Get the path structure of a CFG, reusing it while the CFG is unchanged.
+        
+        Args:
+            cfg: Basic-block CFG
+        """
+        key = (cfg.function_id, cfg.to_bytes())
+        with self._lock:
+            analysis = self._cache.get(key)
+            if analysis is not None:
+                self._cache.move_to_end(key)
+                return analysis
+        
+        analysis = CFGPaths(cfg)
+        with self._lock:
+            self._cache[key] = analysis
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return analysis
+    
+    def paths(self, cfg: FunctionCFG, k: int, strategy: str = "shortest") -> List[List[str]]:
+        """
+        Enumerate at most k entry-to-exit paths.
+        
+        Args:
+            cfg: Basic-block CFG
+            k: Maximum number of paths
+            strategy: "shortest" (k shortest paths) or "diverse" (greedy block coverage)
+            
+        Returns:
+            Paths as lists of basic block IDs
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown path strategy '{strategy}', expected one of {STRATEGIES}")
+        
+        paths = self.analyze(cfg).paths(k, strategy)
+        return [[cfg.block_id(block) for block in path] for path in paths]
+    
+    def count(self, cfg: FunctionCFG) -> int:
+        """Count entry-to-exit paths (each loop body taken at most once)."""
+        return self.analyze(cfg).count()
+
+
+# Global CFG path analyzer
+cfg_path_analyzer = CFGPathAnalyzer(settings.cfg_path_cache_size)
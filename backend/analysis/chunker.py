@@ -4,7 +4,8 @@ Breaks code into manageable pieces while respecting token limits.
 """
 from typing import List
 from llm.token_counter import token_counter
-from db.models import CodeChunk
+from analysis.tree_sitter_parser import parser
+from db.models import CodeChunk, CodeNode, NodeType
 import hashlib
 
 
@@ -84,6 +85,61 @@ class CodeChunker:
         
         return chunks
     
+    def build_file_chunk(
+        self,
+        file_path: str,
+        content: str,
+        asg_nodes: List[CodeNode],
+        max_tokens: int = 512
+    ) -> CodeChunk:
+        """
+        Build a file-level summary chunk for the file index.
+        
+        The summary is made of the file's class names, function signatures
+        and docstrings, so its embedding describes what the file is about.
+        Files without symbols fall back to their first lines.
+        
+        Args:
+            file_path: Path to the file
+            content: File content
+            asg_nodes: ASG nodes extracted from the file
+            max_tokens: Maximum summary size in tokens
+            
+        Returns:
+            CodeChunk spanning the whole file, with the summary as its code
+        """
+        lines = content.split('\n')
+        parts = [f"File: {file_path}"]
+        
+        classes = [node.name for node in asg_nodes if node.type == NodeType.CLASS]
+        if classes:
+            parts.append(f"Classes: {', '.join(classes)}")
+        
+        # First line of each function is its signature
+        for node in asg_nodes:
+            if node.type in (NodeType.FUNCTION, NodeType.METHOD):
+                parts.append(node.code.split('\n', 1)[0].strip())
+        
+        tree = parser.parse_file(file_path, content)
+        if tree:
+            for doc in parser.extract_docstrings(tree, content):
+                parts.append(doc['text'].strip('"\'/* \n'))
+        
+        if len(parts) == 1:
+            parts.extend(lines[:50])
+        
+        summary = token_counter.truncate_to_limit('\n'.join(parts), max_tokens)
+        
+        return CodeChunk(
+            id=self._generate_chunk_id(file_path, 0, 0),
+            file_path=file_path,
+            start_line=1,
+            end_line=len(lines),
+            code=summary,
+            tokens=token_counter.count_tokens(summary),
+            metadata={"method": "file_summary"}
+        )
+    
     def _calculate_overlap_lines(self, lines: List[str]) -> List[str]:
         """Calculate overlap lines to include in next chunk."""
         if not lines or self.overlap <= 0:
@@ -0,0 +1,75 @@
+"""
+Compressed sparse row (CSR) adjacency over integer node indices.
+
+Shared by the embedded graph store and the call graph's reachability
+index; expanding a whole frontier is a handful of vectorized array
+operations instead of a per-node loop.
+"""
+from typing import Optional
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Immutable CSR adjacency built from edge arrays.
+    
+    Row u's neighbors are ``indices[indptr[u]:indptr[u + 1]]`` and the
+    matching relationship types are ``edge_types`` over the same slice.
+    """
+    
+    def __init__(self, num_nodes: int, src: np.ndarray, dst: np.ndarray, etype: np.ndarray):
+        """
+        Build CSR arrays.
+        
+        Args:
+            num_nodes: Number of nodes (rows)
+            src: Source node of each edge (int32)
+            dst: Target node of each edge (int32)
+            etype: Relationship type of each edge (int16)
+        """
+        order = np.argsort(src, kind="stable")
+        self.indices = dst[order].astype(np.int32)
+        self.edge_types = etype[order].astype(np.int16)
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=self.indptr[1:])
+    
+    def neighbors(self, node: int) -> np.ndarray:
+        """Get the neighbors of one node."""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+    
+    def expand(
+        self,
+        frontier: np.ndarray,
+        edge_types: Optional[np.ndarray] = None,
+        fanout: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Get the neighbors of every node in a frontier (with repeats).
+        
+        Args:
+            frontier: Node indices to expand
+            edge_types: Only follow edges of these types (all if None)
+            fanout: Keep at most this many neighbors per frontier node
+        """
+        starts, ends = self.indptr[frontier], self.indptr[frontier + 1]
+        counts = ends - starts
+        total = int(counts.sum())
+        if total == 0:
+            return self.indices[:0]
+        
+        # Positions of every neighbor: each row's start, offset by 0..count-1
+        row_starts = np.cumsum(counts) - counts
+        rows = np.repeat(np.arange(frontier.size), counts)
+        positions = starts[rows] + np.arange(total) - row_starts[rows]
+        
+        if edge_types is not None:
+            keep = np.isin(self.edge_types[positions], edge_types)
+            positions, rows = positions[keep], rows[keep]
+        
+        if fanout is not None and positions.size > fanout:
+            # Rank of each neighbor within its row; rows are sorted
+            rank = np.arange(rows.size) - np.searchsorted(rows, rows)
+            positions = positions[rank < fanout]
+        
+        return self.indices[positions]
@@ -0,0 +1,330 @@
+"""
+Reachability index over the call graph.
+
+Strongly connected components (mutually recursive functions) are
+condensed into single vertices, which leaves a DAG. Each DAG vertex gets
+an interval label [low, post] from its position in reverse topological
+order: a vertex can only reach vertices whose label lies inside its own,
+so most negative reachability checks are answered without a traversal.
+Transitive caller/callee queries are level-synchronous searches over the
+condensed DAG, bounded by depth and result count.
+"""
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import threading
+
+import numpy as np
+
+from analysis.call_graph import CallGraph, call_graph
+from analysis.csr import CSRGraph
+
+logger = logging.getLogger(__name__)
+
+
+def strongly_connected_components(num_nodes: int, graph: CSRGraph) -> Tuple[np.ndarray, int]:
+    """
+    Find strongly connected components with an iterative Tarjan search.
+    
+    Components are numbered in reverse topological order: every edge
+    between two components goes from a higher number to a lower one.
+    
+    Returns:
+        (component of each node, number of components)
+    """
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    index = [-1] * num_nodes
+    low = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    component = [-1] * num_nodes
+    stack: List[int] = []
+    counter = 0
+    num_components = 0
+    
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, indptr[root])]
+        
+        while work:
+            node, position = work[-1]
+            if position < indptr[node + 1]:
+                work[-1] = (node, position + 1)
+                successor = indices[position]
+                if index[successor] == -1:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, indptr[successor]))
+                elif on_stack[successor] and index[successor] < low[node]:
+                    low[node] = index[successor]
+                continue
+            
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+            
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = num_components
+                    if member == node:
+                        break
+                num_components += 1
+    
+    return np.asarray(component, dtype=np.int32), num_components
+
+
+def untyped_csr(num_rows: int, src: np.ndarray, dst: np.ndarray) -> CSRGraph:
+    """Build a CSRGraph whose edges carry no relationship type."""
+    return CSRGraph(num_rows, src, dst, np.zeros(len(src), dtype=np.int16))
+
+
+class ReachabilitySnapshot:
+    """Immutable reachability structures for one version of the call graph."""
+    
+    def __init__(
+        self,
+        node_ids: List[str],
+        names: List[str],
+        file_paths: List[str],
+        src: np.ndarray,
+        dst: np.ndarray
+    ):
+        """
+        Condense the call graph and label its DAG.
+        
+        Args:
+            node_ids: Node ID of each row
+            names: Node name of each row
+            file_paths: File of each row
+            src: Caller row of each edge
+            dst: Callee row of each edge
+        """
+        num_nodes = len(node_ids)
+        self.node_ids = node_ids
+        self.names = names
+        self.file_paths = file_paths
+        self.node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        
+        self.component, self.num_components = strongly_connected_components(
+            num_nodes, untyped_csr(num_nodes, src, dst)
+        )
+        self.members = untyped_csr(
+            self.num_components, self.component, np.arange(num_nodes, dtype=np.int32)
+        )
+        
+        # Condensed DAG edges, deduplicated, in both directions
+        width = max(self.num_components, 1)
+        component_src = self.component[src].astype(np.int64)
+        component_dst = self.component[dst].astype(np.int64)
+        between = component_src != component_dst
+        keys = np.unique(component_src[between] * width + component_dst[between])
+        dag_src = (keys // width).astype(np.int32)
+        dag_dst = (keys % width).astype(np.int32)
+        self.forward = untyped_csr(self.num_components, dag_src, dag_dst)
+        self.backward = untyped_csr(self.num_components, dag_dst, dag_src)
+        
+        # Interval labels: descendants always have lower component numbers,
+        # so a component's label is [lowest reachable number, own number]
+        low = list(range(self.num_components))
+        indptr = self.forward.indptr.tolist()
+        indices = self.forward.indices.tolist()
+        for c in range(self.num_components):
+            for child in indices[indptr[c]:indptr[c + 1]]:
+                if low[child] < low[c]:
+                    low[c] = low[child]
+        self.low = np.asarray(low, dtype=np.int32)
+    
+    def may_reach(self, source: int, target: int) -> bool:
+        """Interval test between components; False means unreachable."""
+        return target < source and self.low[source] <= self.low[target]
+    
+    def reaches(self, source: int, target: int) -> bool:
+        """Check whether one component reaches another."""
+        if source == target:
+            return True
+        if not self.may_reach(source, target):
+            return False
+        
+        # Depth-first search, descending only into components whose label contains the target
+        visited = {source}
+        stack = [source]
+        while stack:
+            for child in self.forward.neighbors(stack.pop()).tolist():
+                if child == target:
+                    return True
+                if child not in visited and self.may_reach(child, target):
+                    visited.add(child)
+                    stack.append(child)
+        return False
+    
+    def transitive(
+        self,
+        node: int,
+        graph: CSRGraph,
+        max_depth: Optional[int],
+        limit: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Collect the nodes reachable from a node, nearest first.
+        
+        Nodes in the same component (a call cycle) are reported at depth 0.
+        
+        Returns:
+            (node row, depth in condensed hops) pairs
+        """
+        start = self.component[node]
+        results = [(int(peer), 0) for peer in self.members.neighbors(start).tolist() if peer != node]
+        
+        visited = np.zeros(self.num_components, dtype=bool)
+        visited[start] = True
+        frontier = np.array([start], dtype=np.int32)
+        depth = 0
+        
+        while len(results) < limit and (max_depth is None or depth < max_depth):
+            candidates = graph.expand(frontier)
+            frontier = np.unique(candidates[~visited[candidates]])
+            if frontier.size == 0:
+                break
+            visited[frontier] = True
+            depth += 1
+            results.extend((int(member), depth) for member in self.members.expand(frontier).tolist())
+        
+        return results[:limit]
+
+
+class ReachabilityIndex:
+    """Transitive caller/callee queries over the shared call graph."""
+    
+    def __init__(self, source: CallGraph):
+        """
+        Initialize reachability index.
+        
+        Args:
+            source: Call graph the index is built from
+        """
+        self.source = source
+        self._snapshot: Optional[ReachabilitySnapshot] = None
+        self._build_lock = threading.Lock()
+    
+    def rebuild(self):
+        """Rebuild from the current call graph (after an indexing run)."""
+        with self._build_lock:
+            snapshot = ReachabilitySnapshot(*self.source.edges())
+            self._snapshot = snapshot
+        logger.info(
+            f"Built reachability index: {len(snapshot.node_ids)} nodes, "
+            f"{snapshot.num_components} components"
+        )
+    
+    def sync(self) -> bool:
+        """
+        Pick up a call graph another process saved, rebuilding if it changed.
+        
+        Only the indexing process rebuilds after its run; the other
+        workers call this periodically (see services.index_watcher).
+        
+        Returns:
+            Whether the index was rebuilt
+        """
+        if not self.source.sync():
+            return False
+        self.rebuild()
+        return True
+    
+    def _current(self) -> ReachabilitySnapshot:
+        """Get the current snapshot, building it on first use."""
+        if self._snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    self._snapshot = ReachabilitySnapshot(*self.source.edges())
+        return self._snapshot
+    
+    def callers(self, node_id: str, max_depth: Optional[int] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Get everything that transitively calls a node.
+        
+        Args:
+            node_id: Function or class node ID
+            max_depth: Maximum call depth (unbounded if None)
+            limit: Maximum nodes returned
+            
+        Returns:
+            Node dictionaries with "depth", nearest first
+        """
+        snapshot = self._current()
+        return self._query(snapshot, node_id, snapshot.backward, max_depth, limit)
+    
+    def callees(self, node_id: str, max_depth: Optional[int] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Get everything a node transitively calls.
+        
+        Args:
+            node_id: Function or class node ID
+            max_depth: Maximum call depth (unbounded if None)
+            limit: Maximum nodes returned
+            
+        Returns:
+            Node dictionaries with "depth", nearest first
+        """
+        snapshot = self._current()
+        return self._query(snapshot, node_id, snapshot.forward, max_depth, limit)
+    
+    def reaches(self, caller_id: str, callee_id: str) -> bool:
+        """Check whether one node transitively calls another."""
+        snapshot = self._current()
+        caller = snapshot.node_index.get(caller_id)
+        callee = snapshot.node_index.get(callee_id)
+        if caller is None or callee is None:
+            return False
+        if caller == callee:
+            return False
+        return snapshot.reaches(snapshot.component[caller], snapshot.component[callee])
+    
+    def get_stats(self) -> dict:
+        """Get reachability index statistics."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"built": False}
+        return {
+            "built": True,
+            "nodes": len(snapshot.node_ids),
+            "components": snapshot.num_components,
+            "dag_edges": int(snapshot.forward.indices.size)
+        }
+    
+    def _query(
+        self,
+        snapshot: ReachabilitySnapshot,
+        node_id: str,
+        graph: CSRGraph,
+        max_depth: Optional[int],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """Run a transitive query and describe the resulting nodes."""
+        node = snapshot.node_index.get(node_id)
+        if node is None:
+            return []
+        return [
+            {
+                "id": snapshot.node_ids[row],
+                "name": snapshot.names[row],
+                "file_path": snapshot.file_paths[row],
+                "depth": depth
+            }
+            for row, depth in snapshot.transitive(node, graph, max_depth, limit)
+        ]
+
+
+# Global reachability index over the shared call graph
+reachability_index = ReachabilityIndex(call_graph)
@@ -149,6 +149,49 @@ class TreeSitterParser:
         
         traverse(tree.root_node)
         return calls
+    
+    def extract_docstrings(self, tree: Any, content: str) -> List[Dict[str, Any]]:
+        """
+        Extract docstrings and doc comments from AST.
+        
+        Python docstrings are string statements at the top of a module,
+        class or function body; TypeScript doc comments are ``/** */`` blocks.
+        """
+        docstrings = []
+        
+        def first_string(body):
+            for child in body.children:
+                if child.type == 'comment':
+                    continue
+                if child.type == 'expression_statement' and child.children and child.children[0].type == 'string':
+                    return child.children[0]
+                return None
+            return None
+        
+        def traverse(node):
+            doc_node = None
+            if node.type == 'module':
+                doc_node = first_string(node)
+            elif node.type in ['function_definition', 'class_definition']:
+                body = node.child_by_field_name('body')
+                if body:
+                    doc_node = first_string(body)
+            elif node.type == 'comment' and node.text.startswith(b'/**'):
+                doc_node = node
+            
+            if doc_node:
+                docstrings.append({
+                    'text': doc_node.text.decode('utf8'),
+                    'start_line': doc_node.start_point[0] + 1,
+                    'end_line': doc_node.end_point[0] + 1,
+                    'type': 'docstring'
+                })
+            
+            for child in node.children:
+                traverse(child)
+        
+        traverse(tree.root_node)
+        return docstrings
 
 
 # Global parser instance
@@ -4,15 +4,21 @@ Chat API endpoints for codebase interaction.
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import logging
+import time
 
+from db.models import CodeChunk
+from retrieval.deadline import Deadline
 from retrieval.vector_search import vector_search
 from retrieval.graph_search import graph_search
 from retrieval.ranker import ranker
-from retrieval.context_packer import context_packer
+from retrieval.pipeline import build_context
+from services.answer_cache import answer_cache, CachedAnswer
 from llm.gemini_client import gemini_client
 from llm.prompts import build_chat_prompt
+from config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -31,29 +37,145 @@ class ChatResponse(BaseModel):
     context_stats: dict
 
 
+async def retrieve(
+    question: str,
+    deadline: Deadline,
+    question_embedding: Optional[List[float]] = None,
+    k: int = 20
+) -> Tuple[List[Tuple[CodeChunk, float]], List[Dict[str, Any]]]:
+    """
+    Vector search with graph expansion running alongside it.
+    
+    Expansion from code names in the question starts together with the
+    vector search; expansion from the top hits' ASG nodes starts as soon
+    as it returns. Once the vector results are in, ranking waits only for
+    the question expansion, for at most settings.graph_expand_budget_ms
+    from the start of retrieval (capped by the request deadline). The
+    chunk expansion is kept if it has finished by then and dropped
+    otherwise, so it never adds latency of its own.
+    
+    Args:
+        question: User question
+        deadline: Request latency budget
+        question_embedding: Question embedding, if already computed
+        k: Number of vector results
+        
+    Returns:
+        (vector results, graph nodes)
+    """
+    loop = asyncio.get_running_loop()
+    graph_deadline = min(loop.time() + settings.graph_expand_budget_ms / 1000, deadline.expires_at)
+    question_task = asyncio.create_task(graph_search.expand_question(question))
+    
+    try:
+        vector_results = await vector_search.search_within(
+            question, deadline, k=k, query_embedding=question_embedding
+        )
+    except Exception:
+        question_task.cancel()
+        raise
+    
+    chunk_tasks = []
+    top_chunks = [chunk for chunk, _ in vector_results[:settings.graph_seed_chunks]]
+    if top_chunks:
+        chunk_tasks.append(asyncio.create_task(graph_search.expand_chunks(top_chunks)))
+    
+    return vector_results, await collect_graph_nodes([question_task], chunk_tasks, graph_deadline, deadline)
+
+
+async def collect_graph_nodes(
+    required: List[asyncio.Task],
+    optional: List[asyncio.Task],
+    until: float,
+    deadline: Optional[Deadline] = None
+) -> List[Dict[str, Any]]:
+    """
+    Collect the nodes of graph expansions.
+    
+    Waits for the required expansions until a loop time; optional ones
+    are only kept if they have finished by the time the wait ends.
+    Expansions still running are cancelled, and dropped required ones
+    are recorded on the request deadline. Failed expansions are logged
+    and skipped, so graph problems never fail the request.
+    
+    Args:
+        required: Expansions worth waiting for
+        optional: Expansions kept only if already finished
+        until: Loop time the wait ends at
+        deadline: Request latency budget to record drops on
+        
+    Returns:
+        Graph nodes, deduplicated by ID
+    """
+    loop = asyncio.get_running_loop()
+    if required:
+        await asyncio.wait(required, timeout=max(0.0, until - loop.time()))
+    if optional:
+        # One pass of the event loop lets expansions that need no IO finish
+        await asyncio.sleep(0)
+    
+    done = [task for task in required + optional if task.done()]
+    dropped = [task for task in required if not task.done()]
+    for task in required + optional:
+        if not task.done():
+            task.cancel()
+    if dropped:
+        logger.info(f"Graph expansion over budget, dropped {len(dropped)} of {len(required)} stages")
+        if deadline is not None:
+            deadline.degrade("graph_expansion", f"dropped {len(dropped)} of {len(required)} expansions")
+    
+    nodes = {}
+    for task in done:
+        if task.cancelled():
+            continue
+        if task.exception() is not None:
+            logger.warning(f"Graph expansion failed: {task.exception()}")
+            continue
+        for node in task.result():
+            nodes.setdefault(node.get("id"), node)
+    return list(nodes.values())
+
+
+async def rank_candidates(
+    question: str,
+    deadline: Deadline,
+    question_embedding: Optional[List[float]] = None
+) -> List[Tuple[CodeChunk, float]]:
+    """Vector search with graph expansion, ranked together."""
+    vector_results, graph_nodes = await retrieve(question, deadline, question_embedding, k=20)
+    return ranker.rank(vector_results, graph_nodes)
+
+
 @router.post("/chat")
 async def chat_with_codebase(request: ChatRequest):
     """
     Chat with the entire codebase.
     
     Retrieves relevant code using hybrid search and generates response.
+    Retrieval runs under settings.retrieval_budget_ms; stages that did
+    not fit are listed in context_stats["deadline"]["degraded"].
     """
     try:
-        # 1. Vector search
-        vector_results = await vector_search.search(request.question, k=20)
-        
-        # 2. Graph expansion (get nodes from top results)
-        # For simplicity, we'll use vector results directly
-        graph_nodes = []
+        deadline = Deadline(settings.retrieval_budget_ms)
         
-        # 3. Rank results
-        ranked_chunks = ranker.rank(vector_results, graph_nodes)
-        ranked_chunks = ranker.deduplicate(ranked_chunks)
+        # Reuse the answer to the same question, or else to a near-identical one
+        generation = answer_cache.generation
+        cached = answer_cache.lookup_exact(request.question)
+        if cached is not None:
+            return cached_response(request, *cached)
+        question_embedding = await deadline.run("embedding", vector_search.embed_query(request.question))
+        cached = answer_cache.lookup_similar(question_embedding)
+        if cached is not None:
+            return cached_response(request, *cached)
         
-        # 4. Pack context
-        system_prompt = "You are a helpful code assistant."
-        user_prompt = build_chat_prompt("", request.question)
-        context, stats = context_packer.pack_context(ranked_chunks, user_prompt)
+        # 1-4. Retrieve, rank and pack context (or reuse a cached result)
+        context, stats, files = await build_context(
+            "chat",
+            request.question,
+            build_chat_prompt("", request.question),
+            deadline,
+            candidates=lambda: rank_candidates(request.question, deadline, question_embedding)
+        )
         
         # 5. Build final prompt
         final_prompt = build_chat_prompt(context, request.question)
@@ -67,13 +189,34 @@ async def chat_with_codebase(request: ChatRequest):
             return StreamingResponse(generate(), media_type="text/plain")
         else:
             answer = await gemini_client.generate_response(final_prompt)
-            return ChatResponse(answer=answer, context_stats=stats)
+            if not deadline.degraded:
+                answer_cache.store(request.question, answer, stats, files, question_embedding, generation)
+            return ChatResponse(answer=answer, context_stats={**stats, "answer_cache": {"hit": False}})
     
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def cached_response(request: ChatRequest, entry: CachedAnswer, match: str, similarity: float):
+    """Answer from the cache, reporting the match in context_stats."""
+    stats = {
+        **entry.context_stats,
+        "answer_cache": {
+            "hit": True,
+            "match": match,
+            "similarity": similarity,
+            "age_seconds": time.time() - entry.created_at
+        }
+    }
+    if request.stream:
+        async def replay():
+            yield entry.answer
+        
+        return StreamingResponse(replay(), media_type="text/plain")
+    return ChatResponse(answer=entry.answer, context_stats=stats)
+
+
 @router.post("/codebase/chat")
 async def chat_with_file(request: ChatRequest, file_path: Optional[str] = None):
     """
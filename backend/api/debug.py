@@ -6,10 +6,11 @@ from pydantic import BaseModel
 from typing import Optional
 import logging
 
-from retrieval.vector_search import vector_search
-from retrieval.context_packer import context_packer
+from retrieval.deadline import Deadline
+from retrieval.pipeline import build_context
 from llm.gemini_client import gemini_client
 from llm.prompts import build_debug_prompt
+from config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -41,15 +42,9 @@ async def debug_code(request: DebugRequest):
         # Build search query from error and file
         search_query = f"{request.file_path} {request.error_message}"
         
-        # 1. Search for relevant code
-        vector_results = await vector_search.search(search_query, k=15)
-        
-        # 2. Pack context
-        system_prompt = "Debug assistant"
-        context, stats = context_packer.pack_context(
-            vector_results,
-            system_prompt
-        )
+        # 1-2. Search for relevant code and pack context (or reuse a cached result)
+        deadline = Deadline(settings.retrieval_budget_ms)
+        context, stats, _ = await build_context("debug", search_query, "Debug assistant", deadline, k=15)
         
         # 3. Build debug prompt
         debug_prompt = build_debug_prompt(
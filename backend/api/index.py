@@ -7,6 +7,10 @@ from typing import Optional
 import logging
 
 from services.indexer import indexer
+from llm.embedding_cache import query_embedding_cache
+from services.answer_cache import answer_cache
+from services.retrieval_cache import retrieval_cache
+from retrieval.reranker import reranker
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +22,7 @@ class IndexStatsResponse(BaseModel):
     metrics: dict
     vector_store: dict
     graph_store: dict
+    caches: dict
 
 
 class IndexRequest(BaseModel):
@@ -31,8 +36,14 @@ async def get_index_stats():
     Get indexing statistics and coverage metrics.
     """
     try:
-        stats = indexer.get_stats()
-        return IndexStatsResponse(**stats)
+        stats = await indexer.get_stats()
+        caches = {
+            "answers": answer_cache.get_stats(),
+            "retrieval": retrieval_cache.get_stats(),
+            "query_embeddings": query_embedding_cache.get_stats(),
+            "rerank_scores": reranker.get_stats()
+        }
+        return IndexStatsResponse(**stats, caches=caches)
     
     except Exception as e:
         logger.error(f"Error getting index stats: {e}")
@@ -6,10 +6,11 @@ from pydantic import BaseModel
 from typing import Optional
 import logging
 
-from retrieval.vector_search import vector_search
-from retrieval.context_packer import context_packer
+from retrieval.deadline import Deadline
+from retrieval.pipeline import build_context
 from llm.gemini_client import gemini_client
 from llm.prompts import build_plan_prompt
+from config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -36,19 +37,13 @@ async def create_plan(request: PlanRequest):
     Analyzes the codebase and creates a structured plan.
     """
     try:
-        # 1. Search for relevant code
+        # 1-2. Search for relevant code and pack context (or reuse a cached result)
         search_query = request.goal
         if request.scope:
             search_query = f"{request.scope} {request.goal}"
         
-        vector_results = await vector_search.search(search_query, k=20)
-        
-        # 2. Pack context
-        system_prompt = "Planning assistant"
-        context, stats = context_packer.pack_context(
-            vector_results,
-            system_prompt
-        )
+        deadline = Deadline(settings.retrieval_budget_ms)
+        context, stats, _ = await build_context("plan", search_query, "Planning assistant", deadline, k=20)
         
         # 3. Build plan prompt
         plan_prompt = build_plan_prompt(context, request.goal)
@@ -16,6 +16,9 @@ class Settings(BaseSettings):
     # Embedding Configuration
     use_local_embeddings: bool = Field(default=True, description="Use local embeddings instead of Gemini API (free, no quota)")
     local_embedding_model: str = Field(default="all-MiniLM-L6-v2", description="Local embedding model name")
+    query_cache_size: int = Field(default=1024, description="Cached query embeddings")
+    query_cache_ttl_seconds: float = Field(default=3600.0, description="Seconds a cached query embedding stays valid")
+    query_cache_path: Optional[str] = Field(default=None, description="File the query embedding cache is persisted to (memory only if unset)")
     
     # Gemini Model Selection
     # Available models: gemini-2.5-flash, gemini-2.5-pro, gemini-2.5-flash-lite
@@ -33,22 +36,72 @@ class Settings(BaseSettings):
     pro_rate_limit_rpm: int = Field(default=3, description="Rate limit for Pro model (RPM)")
     lite_rate_limit_rpm: int = Field(default=3, description="Rate limit for Lite model (RPM)")
     embedding_rate_limit_rpm: int = Field(default=3, description="Rate limit for embeddings (RPM)")
+    rate_limit_burst: int = Field(default=1, description="Requests per model allowed back to back after an idle period")
+    rate_limit_tpm: int = Field(default=100000, description="Rate limit per generation model: tokens per minute (prompt plus output)")
+    rate_limit_output_reserve: int = Field(default=2048, description="Output tokens reserved per generation request until its actual usage is known")
     
     # Vector Database (FAISS)
     vector_db_path: str = Field(default="./data/vector_db", description="Path to FAISS vector database")
+    vector_search_workers: int = Field(default=4, description="Threads serving concurrent vector searches")
+    vector_shards: int = Field(default=1, description="Number of vector index shards")
+    vector_shard_strategy: str = Field(default="hash", description="Shard routing: 'hash' (file path) or 'directory'")
+    vector_shard_workers: bool = Field(default=False, description="Serve each shard from its own local worker process")
+    hierarchical_search: bool = Field(default=True, description="Select candidate files before searching chunks")
+    file_candidates: int = Field(default=20, description="Candidate files searched at chunk level per query")
     
-    # Graph Database (Neo4j)
+    # Graph Database
+    graph_backend: str = Field(default="neo4j", description="Graph backend: 'neo4j' or 'embedded' (in-process, no server)")
+    embedded_graph_path: str = Field(default="./data/graph", description="Path to the embedded graph store")
+    embedded_graph_flush_seconds: float = Field(default=5.0, description="Seconds between automatic flushes of the embedded graph while indexing")
     graph_db_url: str = Field(default="bolt://localhost:7687", description="Neo4j connection URL")
     graph_db_user: str = Field(default="neo4j", description="Neo4j username")
-    graph_db_password: str = Field(..., description="Neo4j password")
+    graph_db_password: str = Field(default="", description="Neo4j password (required for the neo4j backend)")
+    graph_batch_size: int = Field(default=500, description="Rows per UNWIND statement in bulk graph writes")
+    graph_expand_fanout: int = Field(default=20, description="Neighbors expanded per node per hop in graph expansion")
+    graph_expand_limit: int = Field(default=50, description="Maximum nodes returned by one graph expansion")
+    graph_expand_budget_ms: int = Field(default=150, description="Longest chat retrieval waits for graph expansion from question names, from the start of retrieval")
+    graph_seed_chunks: int = Field(default=5, description="Top vector hits whose ASG nodes seed graph expansion in chat")
+    cfg_path_limit: int = Field(default=10, description="Maximum CFG execution paths returned per function")
+    cfg_path_cache_size: int = Field(default=256, description="Function CFGs whose path analysis is memoized")
+    graph_db_async: bool = Field(default=True, description="Use the async Neo4j driver (false: blocking driver)")
+    graph_db_max_pool_size: int = Field(default=50, description="Maximum pooled Neo4j connections")
+    graph_db_connection_timeout: float = Field(default=15.0, description="Seconds to wait when opening a Neo4j connection")
+    graph_db_acquisition_timeout: float = Field(default=30.0, description="Seconds to wait for a pooled Neo4j connection")
+    
+    # Call Graph Centrality
+    call_graph_path: str = Field(default="./data/call_graph", description="Path to the call graph and centrality scores")
+    pagerank_damping: float = Field(default=0.85, description="PageRank damping factor for call graph centrality")
+    reachability_limit: int = Field(default=200, description="Default maximum nodes returned by transitive caller/callee queries")
+    
+    # Cross-encoder Re-ranking
+    rerank_enabled: bool = Field(default=False, description="Re-rank top candidates with a local cross-encoder")
+    rerank_model: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", description="Cross-encoder model name")
+    rerank_top_n: int = Field(default=30, description="First-stage candidates re-scored by the cross-encoder")
+    rerank_timeout_ms: int = Field(default=300, description="Re-ranking latency cap; first-stage order is kept past it")
+    rerank_cache_size: int = Field(default=4096, description="Cached (query, chunk) cross-encoder scores")
+    
+    # Retrieval Latency Budget
+    retrieval_budget_ms: int = Field(default=2000, description="Latency budget of the retrieval stages of one AI request; stages past it are skipped or cut short")
+    
+    # Answer Cache
+    answer_cache_enabled: bool = Field(default=True, description="Reuse chat answers for identical or near-identical questions")
+    answer_cache_size: int = Field(default=256, description="Cached chat answers")
+    answer_cache_similarity: float = Field(default=0.95, description="Minimum question embedding cosine similarity for a cached answer")
+    answer_cache_ttl_seconds: float = Field(default=3600.0, description="Age after which a cached chat answer is no longer reused")
+    retrieval_cache_enabled: bool = Field(default=True, description="Reuse ranked chunks and packed context for repeated queries")
+    retrieval_cache_max_mb: int = Field(default=64, description="Memory budget of the retrieval result cache in MB")
+    retrieval_cache_ttl_seconds: float = Field(default=3600.0, description="Age after which a cached retrieval result is no longer reused")
+    index_watch_seconds: float = Field(default=2.0, description="Seconds between checks for files re-indexed by other workers, which invalidate cached answers and retrieval results")
     
     # Token Management
     max_tokens_per_request: int = Field(default=70000, description="Maximum tokens per LLM request")
     system_prompt_reserve: int = Field(default=3000, description="Reserved tokens for system prompt")
+    context_file_share: float = Field(default=0.5, description="Maximum share of the context budget packed from one file")
+    context_compression: str = Field(default="strip,dedent", description="Context compression modes: strip, dedent, signatures (comma-separated) or none")
+    context_full_chunks: int = Field(default=5, description="Top-ranked chunks never reduced to signatures")
     
     # Legacy Rate Limiting (kept for backwards compatibility)
     rate_limit_rpm: int = Field(default=3, description="Global rate limit: requests per minute")
-    rate_limit_tpm: int = Field(default=100000, description="Rate limit: tokens per minute")
     
     # Server Configuration
     backend_host: str = Field(default="0.0.0.0", description="Backend server host")
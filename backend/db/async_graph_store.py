@@ -0,0 +1,194 @@
+"""
+Async graph database interface using the Neo4j async driver.
+
+Same surface as GraphStore, but every round trip is awaited, so graph
+queries don't stall the event loop and the requests in flight on it.
+"""
+from neo4j import AsyncGraphDatabase
+from typing import List, Dict, Any, Optional
+from db.models import CodeNode, CodeEdge, FunctionCFG
+from db.graph_stats import GraphStats
+from db.graph_store import (
+    INDEX_QUERIES,
+    CFG_QUERY,
+    SEARCH_BY_NAME_QUERY,
+    STATS_LOCK_QUERY,
+    STATS_READ_QUERY,
+    STATS_WRITE_QUERY,
+    STATS_BACKFILL_QUERIES,
+    CLEAR_QUERY,
+    apply_stats_delta,
+    created_count,
+    file_graph_statements,
+    neighbor_result,
+    neighbors_query,
+    stats_from_backfill,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGraphStore:
+    """Manages ASG and CFG in Neo4j through a pooled async driver."""
+    
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        batch_size: int = 500,
+        max_connection_pool_size: int = 100,
+        connection_timeout: float = 30.0,
+        connection_acquisition_timeout: float = 60.0
+    ):
+        """
+        Initialize the async Neo4j driver.
+        
+        No connection is opened until the first query; call ``initialize``
+        once the event loop is running to create indexes.
+        
+        Args:
+            uri: Neo4j connection URI (e.g., bolt://localhost:7687)
+            user: Database username
+            password: Database password
+            batch_size: Maximum rows sent per UNWIND statement in bulk writes
+            max_connection_pool_size: Maximum pooled connections
+            connection_timeout: Seconds to wait when opening a connection
+            connection_acquisition_timeout: Seconds to wait for a pooled connection
+        """
+        self.driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_timeout=connection_timeout,
+            connection_acquisition_timeout=connection_acquisition_timeout
+        )
+        self.batch_size = batch_size
+    
+    async def initialize(self):
+        """Create indexes for better query performance."""
+        async with self.driver.session() as session:
+            for query in INDEX_QUERIES:
+                await session.run(query)
+    
+    async def close(self):
+        """Close database connection."""
+        await self.driver.close()
+    
+    async def add_code_nodes(self, nodes: List[CodeNode]):
+        """Add code nodes to the ASG in one transaction."""
+        await self.add_file_graph(nodes, [], [])
+    
+    async def add_code_edges(self, edges: List[CodeEdge]):
+        """Add ASG edges in one transaction."""
+        await self.add_file_graph([], edges, [])
+    
+    async def add_cfgs(self, cfgs: List[FunctionCFG]):
+        """Add the CFGs of one or more functions in one transaction."""
+        await self.add_file_graph([], [], cfgs)
+    
+    async def add_file_graph(
+        self,
+        code_nodes: List[CodeNode],
+        code_edges: List[CodeEdge],
+        cfgs: List[FunctionCFG]
+    ):
+        """Write everything extracted from one file in a single transaction."""
+        statements = file_graph_statements(code_nodes, code_edges, cfgs, self.batch_size)
+        if not statements:
+            return
+        
+        async def work(tx):
+            # Count what MERGE actually created and update the counters in the same transaction
+            delta = GraphStats()
+            for query, rows, (kind, name, file_path) in statements:
+                result = await tx.run(query, rows=rows)
+                record = await result.single()
+                counters = (await result.consume()).counters
+                delta.add(kind, name, file_path, created_count(kind, record, counters))
+            
+            record = await (await tx.run(STATS_LOCK_QUERY)).single()
+            stats = apply_stats_delta(record["data"], delta)
+            if stats is None:
+                stats = await self._backfill_stats(tx)
+            await (await tx.run(STATS_WRITE_QUERY, data=stats.to_json())).consume()
+        
+        async with self.driver.session() as session:
+            await session.execute_write(work)
+    
+    async def get_neighbors(self, node_id: str, max_depth: int = 2) -> List[Dict[str, Any]]:
+        """Get neighboring nodes in the ASG."""
+        return await self.get_neighbors_multi([node_id], max_depth)
+    
+    async def get_neighbors_multi(
+        self,
+        node_ids: List[str],
+        max_depth: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        direction: str = "both",
+        fanout: int = 20,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Expand from many seed nodes at once with a bounded breadth-first search."""
+        query = neighbors_query(max_depth, relationship_types, direction)
+        async with self.driver.session() as session:
+            result = await session.run(
+                query,
+                {"node_ids": list(node_ids), "fanout": fanout, "limit": limit}
+            )
+            return [
+                neighbor_result(dict(record["neighbor"]), record["hop"])
+                async for record in result
+            ]
+    
+    async def get_cfg(self, function_id: str) -> Optional[FunctionCFG]:
+        """Load a function's CFG (None if the function has none)."""
+        async with self.driver.session() as session:
+            result = await session.run(CFG_QUERY, {"function_id": function_id})
+            record = await result.single()
+            if record is None:
+                return None
+            return FunctionCFG.from_bytes(function_id, record["data"])
+    
+    async def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search for code nodes by name."""
+        async with self.driver.session() as session:
+            result = await session.run(SEARCH_BY_NAME_QUERY, {"name": name, "limit": limit})
+            return [dict(record["n"]) async for record in result]
+    
+    async def get_stats(self) -> dict:
+        """Get statistics about the graph database from write-time counters (read on every call)."""
+        async def read(tx):
+            record = await (await tx.run(STATS_READ_QUERY)).single()
+            return record["data"] if record is not None else None
+        
+        async def backfill(tx):
+            record = await (await tx.run(STATS_LOCK_QUERY)).single()
+            if record["data"] is not None:
+                return GraphStats.from_json(record["data"])
+            stats = await self._backfill_stats(tx)
+            await (await tx.run(STATS_WRITE_QUERY, data=stats.to_json())).consume()
+            return stats
+        
+        async with self.driver.session() as session:
+            data = await session.execute_read(read)
+            if data is not None:
+                stats = GraphStats.from_json(data)
+            else:
+                stats = await session.execute_write(backfill)
+        
+        return stats.summary()
+    
+    async def _backfill_stats(self, tx) -> GraphStats:
+        """Count the whole graph once, for databases without counters."""
+        logger.info("Backfilling graph statistics")
+        results = {}
+        for key, query in STATS_BACKFILL_QUERIES.items():
+            results[key] = [record.data() async for record in await tx.run(query)]
+        return stats_from_backfill(results)
+    
+    async def clear(self):
+        """Clear all nodes and relationships."""
+        async with self.driver.session() as session:
+            await (await session.run(CLEAR_QUERY)).consume()
@@ -0,0 +1,407 @@
+"""
+Embedded in-process graph store for ASG/CFG storage.
+
+Keeps the graph in memory as compressed sparse row (CSR) arrays so that
+neighbor expansion is a few array slices instead of a network round trip,
+and persists it to disk. Exposes the same surface as GraphStore, so the
+whole system runs without an external database.
+
+Writes are flushed at most every flush_interval seconds (and by flush()).
+Readers check the persisted file's identity and reload it when another
+process has replaced it, unless they hold unflushed writes of their own.
+"""
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from analysis.csr import CSRGraph
+from db.models import CodeNode, CodeEdge, FunctionCFG
+from db.graph_store import DIRECTIONS, neighbor_result
+from db.graph_stats import GraphStats, LABEL, RELATIONSHIP, CODE_NODE_LABEL, CFG_BLOCK_LABEL
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddedGraphStore:
+    """Manages ASG and CFG in process with CSR adjacency, persisted to disk."""
+    
+    def __init__(self, db_path: str, batch_size: int = 500, flush_interval: float = 5.0):
+        """
+        Initialize embedded graph store.
+        
+        Args:
+            db_path: Directory holding the persisted graph
+            batch_size: Accepted for interface compatibility with GraphStore
+            flush_interval: Seconds between automatic flushes while writing
+        """
+        self.db_path = Path(db_path)
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        self.graph_path = self.db_path / "graph.pkl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        
+        # Identity of the graph file last loaded or written, and when
+        self._file_key: Optional[Tuple[int, int]] = None
+        self._flushed_at = time.monotonic()
+        
+        self._reset()
+        self._load()
+    
+    def _reset(self):
+        """Reset to an empty graph."""
+        # Nodes: string id <-> int32 index, properties as Neo4j would return them
+        self.node_index: Dict[str, int] = {}
+        self.nodes: List[Dict[str, Any]] = []
+        
+        # CFGs: function_id -> (file_path, block count, serialized CFG), decoded on request
+        self.cfgs: Dict[str, Tuple[Optional[str], int, bytes]] = {}
+        
+        # Edges: (source, target, type) -> properties; MERGE semantics
+        self.edge_type_ids: Dict[str, int] = {}
+        self.edge_type_names: List[str] = []
+        self.edges: Dict[Tuple[int, int, int], Dict[str, Any]] = {}
+        
+        # Counters maintained as nodes and edges are created
+        self.stats = GraphStats()
+        
+        # (undirected, outgoing, incoming CSR), rebuilt lazily after writes
+        self._snapshot: Optional[Tuple[CSRGraph, CSRGraph, CSRGraph]] = None
+        self._dirty = False
+    
+    def close(self):
+        """Persist pending changes."""
+        self.flush()
+    
+    def add_code_node(self, node: CodeNode):
+        """Add a code node to the ASG."""
+        self.add_code_nodes([node])
+    
+    def add_code_edge(self, edge: CodeEdge):
+        """Add an edge to the ASG."""
+        self.add_code_edges([edge])
+    
+    def add_code_nodes(self, nodes: List[CodeNode]):
+        """Add code nodes to the ASG."""
+        self.add_file_graph(nodes, [], [])
+    
+    def add_code_edges(self, edges: List[CodeEdge]):
+        """Add ASG edges."""
+        self.add_file_graph([], edges, [])
+    
+    def add_cfgs(self, cfgs: List[FunctionCFG]):
+        """Add the CFGs of one or more functions."""
+        self.add_file_graph([], [], cfgs)
+    
+    def add_file_graph(
+        self,
+        code_nodes: List[CodeNode],
+        code_edges: List[CodeEdge],
+        cfgs: List[FunctionCFG]
+    ):
+        """
+        Add everything extracted from one file.
+        
+        Nodes are upserted by id. Edges are merged by (source, target, type)
+        and, as with MATCH in Cypher, skipped if either endpoint is unknown.
+        CFGs replace the function's previous CFG. Changes are persisted by
+        flush(), which runs here once flush_interval has passed.
+        
+        Args:
+            code_nodes: ASG nodes
+            code_edges: ASG edges
+            cfgs: CFGs of the file's functions, stored serialized
+        """
+        with self._lock:
+            for node in code_nodes:
+                self._upsert_node(node.id, {
+                    "id": node.id,
+                    "type": node.type.value,
+                    "name": node.name,
+                    "file_path": node.file_path,
+                    "start_line": node.start_line,
+                    "end_line": node.end_line,
+                    "code": node.code,
+                    "metadata": str(node.metadata)
+                })
+            
+            for edge in code_edges:
+                self._merge_edge(edge.source_id, edge.target_id, edge.relationship.upper(),
+                                 {"metadata": str(edge.metadata)})
+            
+            for cfg in cfgs:
+                self._replace_cfg(cfg)
+            
+            self._invalidate()
+        
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+    
+    def _upsert_node(self, node_id: str, properties: Dict[str, Any]) -> int:
+        """Insert or update a node and return its index."""
+        index = self.node_index.get(node_id)
+        if index is None:
+            index = len(self.nodes)
+            self.node_index[node_id] = index
+            self.nodes.append(properties)
+            self.stats.add(LABEL, CODE_NODE_LABEL, properties["file_path"], 1)
+        else:
+            self.nodes[index].update(properties)
+        return index
+    
+    def _replace_cfg(self, cfg: FunctionCFG):
+        """Store a function's serialized CFG, counting the change in basic blocks."""
+        function = self.node_index.get(cfg.function_id)
+        file_path = self.nodes[function]["file_path"] if function is not None else None
+        _, previous_blocks, _ = self.cfgs.get(cfg.function_id, (None, 0, b""))
+        self.cfgs[cfg.function_id] = (file_path, len(cfg.blocks), cfg.to_bytes())
+        self.stats.add(LABEL, CFG_BLOCK_LABEL, file_path, len(cfg.blocks) - previous_blocks)
+    
+    def _merge_edge(self, source_id: str, target_id: str, relationship: str, properties: Dict[str, Any]):
+        """Insert or update an edge between two known nodes."""
+        source = self.node_index.get(source_id)
+        target = self.node_index.get(target_id)
+        if source is None or target is None:
+            return
+        
+        etype = self.edge_type_ids.get(relationship)
+        if etype is None:
+            etype = len(self.edge_type_names)
+            self.edge_type_ids[relationship] = etype
+            self.edge_type_names.append(relationship)
+        
+        key = (source, target, etype)
+        if key not in self.edges:
+            self.stats.add(RELATIONSHIP, relationship, self.nodes[source]["file_path"], 1)
+        self.edges[key] = properties
+    
+    def _invalidate(self):
+        """Drop the CSR arrays after a write; they are rebuilt on the next read."""
+        self._snapshot = None
+        self._dirty = True
+    
+    def _csr(self) -> Tuple[CSRGraph, CSRGraph, CSRGraph]:
+        """Get (undirected, outgoing, incoming), building them if stale."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        
+        with self._lock:
+            if self._snapshot is None:
+                num_nodes = len(self.nodes)
+                src, dst, etype = self._edge_arrays()
+                self._snapshot = (
+                    CSRGraph(
+                        num_nodes,
+                        np.concatenate([src, dst]),
+                        np.concatenate([dst, src]),
+                        np.concatenate([etype, etype])
+                    ),
+                    CSRGraph(num_nodes, src, dst, etype),
+                    CSRGraph(num_nodes, dst, src, etype)
+                )
+            return self._snapshot
+    
+    def _edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the edge list as (src, dst, etype) arrays."""
+        if not self.edges:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty.astype(np.int16)
+        keys = np.array(list(self.edges.keys()), dtype=np.int32)
+        return keys[:, 0], keys[:, 1], keys[:, 2].astype(np.int16)
+    
+    def get_neighbors(self, node_id: str, max_depth: int = 2) -> List[Dict[str, Any]]:
+        """
+        Get neighboring nodes in the ASG.
+        
+        Args:
+            node_id: Starting node ID
+            max_depth: Maximum traversal depth
+            
+        Returns:
+            List of neighboring node dictionaries
+        """
+        return self.get_neighbors_multi([node_id], max_depth)
+    
+    def get_neighbors_multi(
+        self,
+        node_ids: List[str],
+        max_depth: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        direction: str = "both",
+        fanout: int = 20,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Expand from many seed nodes at once with a bounded breadth-first search.
+        
+        Args:
+            node_ids: Seed node IDs
+            max_depth: Maximum number of hops
+            relationship_types: Relationship types to follow (all if None)
+            direction: "out", "in" or "both"
+            fanout: Maximum neighbors expanded per node per hop
+            limit: Maximum neighbors returned overall
+            
+        Returns:
+            Neighbor node dictionaries with "hop" and "score", nearest first
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction '{direction}', expected one of {DIRECTIONS}")
+        
+        self.sync()
+        undirected, outgoing, incoming = self._csr()
+        num_nodes = undirected.indptr.size - 1
+        graph = {"out": outgoing, "in": incoming, "both": undirected}[direction]
+        
+        edge_types = None
+        if relationship_types:
+            edge_types = np.array([
+                self.edge_type_ids[name.upper()]
+                for name in relationship_types
+                if name.upper() in self.edge_type_ids
+            ], dtype=np.int16)
+            if edge_types.size == 0:
+                return []
+        
+        seeds = [self.node_index.get(node_id) for node_id in node_ids]
+        seeds = [i for i in seeds if i is not None and i < num_nodes]
+        if not seeds:
+            return []
+        
+        visited = np.zeros(num_nodes, dtype=bool)
+        frontier = np.unique(np.array(seeds, dtype=np.int32))
+        visited[frontier] = True
+        results: List[Dict[str, Any]] = []
+        
+        for hop in range(1, max_depth + 1):
+            candidates = graph.expand(frontier, edge_types, fanout)
+            frontier = np.unique(candidates[~visited[candidates]])[:limit - len(results)]
+            if frontier.size == 0:
+                break
+            visited[frontier] = True
+            results.extend(neighbor_result(self.nodes[i], hop) for i in frontier.tolist())
+        
+        return results
+    
+    def get_cfg(self, function_id: str) -> Optional[FunctionCFG]:
+        """
+        Load a function's CFG.
+        
+        Args:
+            function_id: Function node ID
+            
+        Returns:
+            Basic-block CFG, or None if the function has none
+        """
+        self.sync()
+        entry = self.cfgs.get(function_id)
+        if entry is None:
+            return None
+        return FunctionCFG.from_bytes(function_id, entry[2])
+    
+    def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search for code nodes by name."""
+        self.sync()
+        results = []
+        for node in self.nodes:
+            if name in (node["name"] or ""):
+                results.append(dict(node))
+                if len(results) >= limit:
+                    break
+        return results
+    
+    def get_stats(self) -> dict:
+        """Get statistics about the graph from write-time counters."""
+        self.sync()
+        with self._lock:
+            return self.stats.summary()
+    
+    def clear(self):
+        """Clear all nodes and relationships, in memory and on disk."""
+        with self._lock:
+            self._reset()
+            self._file_key = None
+            shutil.rmtree(self.db_path, ignore_errors=True)
+            self.db_path.mkdir(parents=True, exist_ok=True)
+    
+    def flush(self):
+        """Persist the graph if it changed since the last flush."""
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if not self._dirty:
+                return
+            
+            src, dst, etype = self._edge_arrays()
+            data = {
+                "src": src,
+                "dst": dst,
+                "etype": etype,
+                "nodes": self.nodes,
+                "cfgs": self.cfgs,
+                "edge_type_names": self.edge_type_names,
+                "edge_properties": list(self.edges.values()),
+                "stats": self.stats.to_data()
+            }
+            
+            # Single file replaced atomically, so readers never see a partial graph
+            tmp_path = self.db_path / "graph.pkl.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.graph_path)
+            self._file_key = self._stat_graph()
+            self._dirty = False
+            logger.info(f"Embedded graph saved: {len(self.nodes)} nodes, {len(self.edges)} edges")
+    
+    def sync(self):
+        """Reload the graph if another process replaced the persisted file (unflushed writes win)."""
+        file_key = self._stat_graph()
+        if file_key is None or file_key == self._file_key or self._dirty:
+            return
+        
+        with self._lock:
+            if self._dirty or self._stat_graph() == self._file_key:
+                return
+            self._reset()
+            self._load()
+    
+    def _stat_graph(self) -> Optional[Tuple[int, int]]:
+        """Identify the persisted graph file (os.replace gives each one a new inode)."""
+        try:
+            stat = os.stat(self.graph_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+    
+    def _load(self):
+        """Load the persisted graph, if any."""
+        file_key = self._stat_graph()
+        if file_key is None:
+            return
+        
+        with open(self.graph_path, 'rb') as f:
+            data = pickle.load(f)
+        self._file_key = file_key
+        
+        if "cfgs" not in data:
+            logger.warning("Embedded graph was saved with line-level CFG nodes; re-index to rebuild it")
+            return
+        
+        self.nodes = data["nodes"]
+        self.node_index = {node["id"]: i for i, node in enumerate(self.nodes)}
+        self.cfgs = data["cfgs"]
+        self.edge_type_names = data["edge_type_names"]
+        self.edge_type_ids = {name: i for i, name in enumerate(self.edge_type_names)}
+        self.edges = dict(zip(
+            zip(data["src"].tolist(), data["dst"].tolist(), data["etype"].tolist()),
+            data["edge_properties"]
+        ))
+        self.stats = GraphStats(data["stats"])
+        logger.info(f"Loaded embedded graph: {len(self.nodes)} nodes, {len(self.edges)} edges")
@@ -0,0 +1,124 @@
+"""
+Graph statistics maintained at write time.
+
+Counts code nodes, CFG basic blocks and relationships per type, in total
+and per file, so stats can be served without scanning the graph.
+Relationships are attributed to the file of their source node; basic
+blocks to the file of their function.
+"""
+from typing import Dict, Any, Iterable, Optional
+import json
+
+CODE_NODE_LABEL = "CodeNode"
+CFG_BLOCK_LABEL = "BasicBlock"
+
+# Counter kinds
+LABEL = "label"
+RELATIONSHIP = "relationship"
+
+FILE_KEYS = {CODE_NODE_LABEL: "code_nodes", CFG_BLOCK_LABEL: "cfg_nodes"}
+
+
+class GraphStats:
+    """Node and relationship counters, in total and per file."""
+    
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        """
+        Initialize counters.
+        
+        Args:
+            data: Counters previously produced by to_data()
+        """
+        data = data or {}
+        self.version: int = data.get("version", 0)
+        self.labels: Dict[str, int] = data.get("labels", {})
+        self.relationships: Dict[str, int] = data.get("relationships", {})
+        self.files: Dict[str, Dict[str, int]] = data.get("files", {})
+    
+    def add(self, kind: str, name: str, file_path: Optional[str], count: int):
+        """
+        Count created (or, if negative, removed) nodes or relationships.
+        
+        Args:
+            kind: LABEL or RELATIONSHIP
+            name: Node label (or CFG_BLOCK_LABEL) or relationship type
+            file_path: File the entities belong to (None if unknown)
+            count: Change in the number of entities
+        """
+        if count == 0:
+            return
+        
+        totals = self.labels if kind == LABEL else self.relationships
+        totals[name] = totals.get(name, 0) + count
+        
+        if file_path is not None:
+            key = FILE_KEYS[name] if kind == LABEL else "relationships"
+            file_stats = self.files.setdefault(
+                file_path, {"code_nodes": 0, "cfg_nodes": 0, "relationships": 0}
+            )
+            file_stats[key] += count
+    
+    def merge(self, other: "GraphStats"):
+        """Add another set of counters to this one."""
+        for name, count in other.labels.items():
+            self.add(LABEL, name, None, count)
+        for name, count in other.relationships.items():
+            self.add(RELATIONSHIP, name, None, count)
+        for file_path, counts in other.files.items():
+            file_stats = self.files.setdefault(
+                file_path, {"code_nodes": 0, "cfg_nodes": 0, "relationships": 0}
+            )
+            for key, count in counts.items():
+                file_stats[key] += count
+    
+    def summary(self) -> dict:
+        """Get the stats reported by graph stores' get_stats()."""
+        return {
+            "code_nodes": self.labels.get(CODE_NODE_LABEL, 0),
+            "cfg_nodes": self.labels.get(CFG_BLOCK_LABEL, 0),
+            "relationships": sum(self.relationships.values()),
+            "relationship_types": dict(self.relationships),
+            "files": {path: dict(counts) for path, counts in self.files.items()}
+        }
+    
+    def to_data(self) -> Dict[str, Any]:
+        """Get the counters as plain data for persistence."""
+        return {
+            "version": self.version,
+            "labels": self.labels,
+            "relationships": self.relationships,
+            "files": self.files
+        }
+    
+    def to_json(self) -> str:
+        """Serialize counters to JSON."""
+        return json.dumps(self.to_data())
+    
+    @classmethod
+    def from_json(cls, data: str) -> "GraphStats":
+        """Deserialize counters from JSON."""
+        return cls(json.loads(data))
+    
+    @classmethod
+    def from_counts(
+        cls,
+        code_nodes: Iterable[tuple],
+        cfg_blocks: Iterable[tuple],
+        relationships: Iterable[tuple]
+    ) -> "GraphStats":
+        """
+        Build counters from grouped counts of an existing graph.
+        
+        Args:
+            code_nodes: (file_path, count) pairs
+            cfg_blocks: (file_path, count) pairs
+            relationships: (type, file_path, count) triples
+        """
+        stats = cls()
+        for file_path, count in code_nodes:
+            stats.add(LABEL, CODE_NODE_LABEL, file_path, count)
+        for file_path, count in cfg_blocks:
+            stats.add(LABEL, CFG_BLOCK_LABEL, file_path, count)
+        for name, file_path, count in relationships:
+            stats.add(RELATIONSHIP, name, file_path, count)
+        return stats
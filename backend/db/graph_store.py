@@ -3,16 +3,301 @@ Graph database interface using Neo4j for ASG/CFG storage.
 """
 from neo4j import GraphDatabase
 from typing import List, Dict, Any, Optional
-from db.models import CodeNode, CodeEdge, CFGNode, CFGEdge
+from db.models import CodeNode, CodeEdge, FunctionCFG
+from db.graph_stats import GraphStats, LABEL, RELATIONSHIP, CODE_NODE_LABEL, CFG_BLOCK_LABEL
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Cypher shared by the blocking and async graph stores
+
+INDEX_QUERIES = [
+    "CREATE INDEX IF NOT EXISTS FOR (n:CodeNode) ON (n.id)",
+    "CREATE INDEX IF NOT EXISTS FOR (c:CFG) ON (c.function_id)",
+    "CREATE INDEX IF NOT EXISTS FOR (n:CodeNode) ON (n.file_path)",
+]
+
+CODE_NODES_QUERY = """
+    UNWIND $rows AS row
+    MERGE (n:CodeNode {id: row.id})
+    SET n.type = row.type,
+        n.name = row.name,
+        n.file_path = row.file_path,
+        n.start_line = row.start_line,
+        n.end_line = row.end_line,
+        n.code = row.code,
+        n.metadata = row.metadata
+"""
+
+CODE_EDGES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (source:CodeNode {{id: row.source_id}})
+    MATCH (target:CodeNode {{id: row.target_id}})
+    MERGE (source)-[r:{relationship}]->(target)
+    SET r.metadata = row.metadata
+"""
+
+# One node per function holding its serialized basic-block CFG; returns
+# the change in block count, since MERGE counters only see the one node
+CFGS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (c:CFG {function_id: row.function_id})
+    WITH c, row, coalesce(c.blocks, 0) AS previous
+    SET c.file_path = row.file_path,
+        c.blocks = row.blocks,
+        c.data = row.data
+    RETURN sum(row.blocks - previous) AS created
+"""
+
+DIRECTIONS = ("out", "in", "both")
+
+RELATIONSHIP_TYPE_PATTERN = re.compile(r"^[A-Z_][A-Z0-9_]*$")
+
+# One BFS hop: expand every frontier node (at most $fanout neighbors each),
+# drop visited nodes and keep the frontier within the remaining budget
+NEIGHBORS_HOP_QUERY = """
+    UNWIND (CASE WHEN frontier = [] THEN [null] ELSE frontier END) AS node
+    CALL {{
+        WITH node
+        OPTIONAL MATCH (node){pattern}(neighbor:CodeNode)
+        RETURN neighbor
+        LIMIT $fanout
+    }}
+    WITH visited, found, collect(DISTINCT neighbor) AS reached
+    WITH visited, found, [n IN reached WHERE NOT n IN visited][..($limit - size(found))] AS frontier
+    WITH frontier, visited + frontier AS visited, found + [n IN frontier | {{node: n, hop: {hop}}}] AS found
+"""
+
+NEIGHBORS_QUERY = """
+    MATCH (seed:CodeNode) WHERE seed.id IN $node_ids
+    WITH collect(seed) AS frontier
+    WITH frontier, frontier AS visited, [] AS found
+    {hops}
+    UNWIND found AS hit
+    RETURN hit.node AS neighbor, hit.hop AS hop
+"""
+
+CFG_QUERY = "MATCH (c:CFG {function_id: $function_id}) RETURN c.data AS data"
+
+SEARCH_BY_NAME_QUERY = """
+    MATCH (n:CodeNode)
+    WHERE n.name CONTAINS $name
+    RETURN n
+    LIMIT $limit
+"""
+
+# Counters live on a single node; SET before reading takes its write lock,
+# so concurrent writers update it one at a time
+STATS_LOCK_QUERY = """
+    MERGE (s:GraphStats {id: 'graph'})
+    SET s.locked_at = timestamp()
+    RETURN s.data AS data
+"""
+
+STATS_WRITE_QUERY = "MATCH (s:GraphStats {id: 'graph'}) SET s.data = $data"
+
+STATS_READ_QUERY = "MATCH (s:GraphStats {id: 'graph'}) RETURN s.data AS data"
+
+# One-time full counts for graphs written before counters were maintained
+STATS_BACKFILL_QUERIES = {
+    "code_nodes": "MATCH (n:CodeNode) RETURN n.file_path AS file_path, count(n) AS count",
+    "cfg_blocks": "MATCH (c:CFG) RETURN c.file_path AS file_path, sum(c.blocks) AS count",
+    "relationships": """
+        MATCH (a:CodeNode)-[r]->()
+        RETURN type(r) AS type, a.file_path AS file_path, count(r) AS count
+    """,
+}
+
+CLEAR_QUERY = "MATCH (n) DETACH DELETE n"
+
+
+def relationship_pattern(relationship_types: Optional[List[str]], direction: str) -> str:
+    """
+    Build the relationship part of a one-hop Cypher pattern.
+    
+    Relationship types are interpolated into the query (they can't be
+    parameterized), so they are validated first.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction '{direction}', expected one of {DIRECTIONS}")
+    
+    types = ""
+    if relationship_types:
+        names = [name.upper() for name in relationship_types]
+        invalid = [name for name in names if not RELATIONSHIP_TYPE_PATTERN.match(name)]
+        if invalid:
+            raise ValueError(f"Invalid relationship types: {invalid}")
+        types = ":" + "|".join(names)
+    
+    if direction == "out":
+        return f"-[{types}]->"
+    if direction == "in":
+        return f"<-[{types}]-"
+    return f"-[{types}]-"
+
+
+def neighbors_query(max_depth: int, relationship_types: Optional[List[str]], direction: str) -> str:
+    """Build the multi-source bounded BFS query, one unrolled block per hop."""
+    pattern = relationship_pattern(relationship_types, direction)
+    hops = "".join(
+        NEIGHBORS_HOP_QUERY.format(pattern=pattern, hop=hop)
+        for hop in range(1, max_depth + 1)
+    )
+    return NEIGHBORS_QUERY.format(hops=hops)
+
+
+def hop_score(hop: int) -> float:
+    """Score a neighbor by its hop distance from the nearest seed."""
+    return 1.0 / hop
+
+
+def neighbor_result(node: Dict[str, Any], hop: int) -> Dict[str, Any]:
+    """Attach hop distance and score to a neighbor's properties."""
+    return {**node, "hop": hop, "score": hop_score(hop)}
+
+
+def code_node_rows(nodes: List[CodeNode]) -> List[Dict[str, Any]]:
+    """Convert ASG nodes to UNWIND rows."""
+    return [
+        {
+            "id": node.id,
+            "type": node.type.value,
+            "name": node.name,
+            "file_path": node.file_path,
+            "start_line": node.start_line,
+            "end_line": node.end_line,
+            "code": node.code,
+            "metadata": str(node.metadata)
+        }
+        for node in nodes
+    ]
+
+
+def code_edge_rows(edges: List[CodeEdge]) -> List[Dict[str, Any]]:
+    """Convert ASG edges to UNWIND rows."""
+    return [
+        {
+            "source_id": edge.source_id,
+            "target_id": edge.target_id,
+            "metadata": str(edge.metadata)
+        }
+        for edge in edges
+    ]
+
+
+def cfg_rows(cfgs: List[FunctionCFG], file_path: Optional[str]) -> List[Dict[str, Any]]:
+    """Convert function CFGs to UNWIND rows, one serialized blob per function."""
+    return [
+        {
+            "function_id": cfg.function_id,
+            "file_path": file_path,
+            "blocks": len(cfg.blocks),
+            "data": cfg.to_bytes()
+        }
+        for cfg in cfgs
+    ]
+
+
+def created_count(kind: str, record: Optional[Any], counters: Any) -> int:
+    """
+    Get how many entities a write statement created.
+    
+    Statements that return a "created" column report it themselves;
+    for the rest it comes from the summary counters.
+    """
+    if record is not None:
+        return record["created"]
+    return counters.nodes_created if kind == LABEL else counters.relationships_created
+
+
+def group_by(items: list, key) -> Dict[Any, list]:
+    """Group items by key, keeping first-seen order."""
+    groups: Dict[Any, list] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return groups
+
+
+def file_graph_statements(
+    code_nodes: List[CodeNode],
+    code_edges: List[CodeEdge],
+    cfgs: List[FunctionCFG],
+    batch_size: int
+) -> List[tuple]:
+    """
+    Build the statements that write one file's graph.
+    
+    Returns (query, rows, counter) triples, where counter is the
+    (kind, name, file_path) that the statement's created nodes,
+    relationships or CFG basic blocks are counted under. Rows are grouped
+    by file so each statement belongs to one file, and split into batches
+    of at most batch_size rows.
+    """
+    # Resolve files from the nodes in this write; unknown files are None
+    node_files = {node.id: node.file_path for node in code_nodes}
+    
+    statements = []
+    for file_path, nodes in group_by(code_nodes, lambda n: n.file_path).items():
+        statements.append((CODE_NODES_QUERY, code_node_rows(nodes), (LABEL, CODE_NODE_LABEL, file_path)))
+    
+    edge_groups = group_by(code_edges, lambda e: (e.relationship.upper(), node_files.get(e.source_id)))
+    for (relationship, file_path), edges in edge_groups.items():
+        statements.append((
+            CODE_EDGES_QUERY.format(relationship=relationship),
+            code_edge_rows(edges),
+            (RELATIONSHIP, relationship, file_path)
+        ))
+    
+    for file_path, file_cfgs in group_by(cfgs, lambda cfg: node_files.get(cfg.function_id)).items():
+        statements.append((CFGS_QUERY, cfg_rows(file_cfgs, file_path), (LABEL, CFG_BLOCK_LABEL, file_path)))
+    
+    return [
+        (query, rows[i:i + batch_size], counter)
+        for query, rows, counter in statements
+        for i in range(0, len(rows), batch_size)
+    ]
+
+
+def apply_stats_delta(data: Optional[str], delta: GraphStats) -> Optional[GraphStats]:
+    """
+    Apply a write's counters to the persisted counters.
+    
+    Returns None if no counters were persisted yet, in which case the
+    caller backfills them from full counts.
+    """
+    if data is None:
+        return None
+    stats = GraphStats.from_json(data)
+    stats.merge(delta)
+    stats.version += 1
+    return stats
+
+
+def stats_from_backfill(results: Dict[str, List[Dict[str, Any]]]) -> GraphStats:
+    """Build counters from the rows returned by STATS_BACKFILL_QUERIES."""
+    stats = GraphStats.from_counts(
+        [(row["file_path"], row["count"]) for row in results["code_nodes"]],
+        [(row["file_path"], row["count"]) for row in results["cfg_blocks"]],
+        [(row["type"], row["file_path"], row["count"]) for row in results["relationships"]]
+    )
+    stats.version = 1
+    return stats
+
 
 class GraphStore:
     """Manages ASG and CFG using Neo4j graph database."""
     
-    def __init__(self, uri: str, user: str, password: str):
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        batch_size: int = 500,
+        max_connection_pool_size: int = 100,
+        connection_timeout: float = 30.0,
+        connection_acquisition_timeout: float = 60.0
+    ):
         """
         Initialize Neo4j connection.
         
@@ -20,8 +305,19 @@ class GraphStore:
             uri: Neo4j connection URI (e.g., bolt://localhost:7687)
             user: Database username
             password: Database password
+            batch_size: Maximum rows sent per UNWIND statement in bulk writes
+            max_connection_pool_size: Maximum pooled connections
+            connection_timeout: Seconds to wait when opening a connection
+            connection_acquisition_timeout: Seconds to wait for a pooled connection
         """
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_timeout=connection_timeout,
+            connection_acquisition_timeout=connection_acquisition_timeout
+        )
+        self.batch_size = batch_size
         self._create_indexes()
     
     def close(self):
@@ -31,78 +327,62 @@ class GraphStore:
     def _create_indexes(self):
         """Create indexes for better query performance."""
         with self.driver.session() as session:
-            # Index on node IDs
-            session.run("CREATE INDEX IF NOT EXISTS FOR (n:CodeNode) ON (n.id)")
-            session.run("CREATE INDEX IF NOT EXISTS FOR (n:CFGNode) ON (n.id)")
-            session.run("CREATE INDEX IF NOT EXISTS FOR (n:CodeNode) ON (n.file_path)")
+            for query in INDEX_QUERIES:
+                session.run(query)
     
     def add_code_node(self, node: CodeNode):
         """Add a code node to the ASG."""
-        with self.driver.session() as session:
-            session.run("""
-                MERGE (n:CodeNode {id: $id})
-                SET n.type = $type,
-                    n.name = $name,
-                    n.file_path = $file_path,
-                    n.start_line = $start_line,
-                    n.end_line = $end_line,
-                    n.code = $code,
-                    n.metadata = $metadata
-            """, {
-                "id": node.id,
-                "type": node.type.value,
-                "name": node.name,
-                "file_path": node.file_path,
-                "start_line": node.start_line,
-                "end_line": node.end_line,
-                "code": node.code,
-                "metadata": str(node.metadata)
-            })
+        self.add_code_nodes([node])
     
     def add_code_edge(self, edge: CodeEdge):
         """Add an edge to the ASG."""
+        self.add_code_edges([edge])
+    
+    def add_code_nodes(self, nodes: List[CodeNode]):
+        """Add code nodes to the ASG in one transaction."""
+        self.add_file_graph(nodes, [], [])
+    
+    def add_code_edges(self, edges: List[CodeEdge]):
+        """Add ASG edges in one transaction."""
+        self.add_file_graph([], edges, [])
+    
+    def add_cfgs(self, cfgs: List[FunctionCFG]):
+        """Add the CFGs of one or more functions in one transaction."""
+        self.add_file_graph([], [], cfgs)
+    
+    def add_file_graph(
+        self,
+        code_nodes: List[CodeNode],
+        code_edges: List[CodeEdge],
+        cfgs: List[FunctionCFG]
+    ):
+        """
+        Write everything extracted from one file in a single transaction.
+        
+        Args:
+            code_nodes: ASG nodes
+            code_edges: ASG edges
+            cfgs: CFGs of the file's functions, stored as one node each
+        """
+        statements = file_graph_statements(code_nodes, code_edges, cfgs, self.batch_size)
+        if not statements:
+            return
+        
+        def work(tx):
+            # Count what MERGE actually created and update the counters in the same transaction
+            delta = GraphStats()
+            for query, rows, (kind, name, file_path) in statements:
+                result = tx.run(query, rows=rows)
+                record = result.single()
+                delta.add(kind, name, file_path, created_count(kind, record, result.consume().counters))
+            
+            stats = apply_stats_delta(tx.run(STATS_LOCK_QUERY).single()["data"], delta)
+            if stats is None:
+                stats = self._backfill_stats(tx)
+            tx.run(STATS_WRITE_QUERY, data=stats.to_json()).consume()
+        
         with self.driver.session() as session:
-            session.run(f"""
-                MATCH (source:CodeNode {{id: $source_id}})
-                MATCH (target:CodeNode {{id: $target_id}})
-                MERGE (source)-[r:{edge.relationship.upper()}]->(target)
-                SET r.metadata = $metadata
-            """, {
-                "source_id": edge.source_id,
-                "target_id": edge.target_id,
-                "metadata": str(edge.metadata)
-            })
-    
-    def add_cfg_node(self, node: CFGNode):
-        """Add a node to the CFG."""
-        with self.driver.session() as session:
-            session.run("""
-                MERGE (n:CFGNode {id: $id})
-                SET n.function_id = $function_id,
-                    n.code = $code,
-                    n.line_number = $line_number,
-                    n.type = $type
-            """, {
-                "id": node.id,
-                "function_id": node.function_id,
-                "code": node.code,
-                "line_number": node.line_number,
-                "type": node.type
-            })
-    
-    def add_cfg_edge(self, edge: CFGEdge):
-        """Add an edge to the CFG."""
-        with self.driver.session() as session:
-            session.run("""
-                MATCH (source:CFGNode {id: $source_id})
-                MATCH (target:CFGNode {id: $target_id})
-                MERGE (source)-[r:FLOWS_TO]->(target)
-                SET r.condition = $condition
-            """, {
-                "source_id": edge.source_id,
-                "target_id": edge.target_id,
-                "condition": edge.condition
-            })
+            session.execute_write(work)
     
     def get_neighbors(self, node_id: str, max_depth: int = 2) -> List[Dict[str, Any]]:
         """
@@ -115,62 +395,99 @@ class GraphStore:
         Returns:
             List of neighboring node dictionaries
         """
+        return self.get_neighbors_multi([node_id], max_depth)
+    
+    def get_neighbors_multi(
+        self,
+        node_ids: List[str],
+        max_depth: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        direction: str = "both",
+        fanout: int = 20,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Expand from many seed nodes at once with a bounded breadth-first search.
+        
+        Args:
+            node_ids: Seed node IDs
+            max_depth: Maximum number of hops
+            relationship_types: Relationship types to follow (all if None)
+            direction: "out", "in" or "both"
+            fanout: Maximum neighbors expanded per node per hop
+            limit: Maximum neighbors returned overall
+            
+        Returns:
+            Neighbor node dictionaries with "hop" and "score", nearest first
+        """
+        query = neighbors_query(max_depth, relationship_types, direction)
         with self.driver.session() as session:
-            result = session.run(f"""
-                MATCH (start:CodeNode {{id: $node_id}})
-                MATCH (start)-[*1..{max_depth}]-(neighbor:CodeNode)
-                RETURN DISTINCT neighbor
-                LIMIT 50
-            """, {"node_id": node_id})
+            result = session.run(
+                query,
+                {"node_ids": list(node_ids), "fanout": fanout, "limit": limit}
+            )
             
-            return [dict(record["neighbor"]) for record in result]
+            return [neighbor_result(dict(record["neighbor"]), record["hop"]) for record in result]
     
-    def get_cfg_paths(self, function_id: str) -> List[List[str]]:
+    def get_cfg(self, function_id: str) -> Optional[FunctionCFG]:
         """
-        Get execution paths in the CFG for a function.
+        Load a function's CFG.
         
         Args:
             function_id: Function node ID
             
         Returns:
-            List of paths (each path is a list of node IDs)
+            Basic-block CFG, or None if the function has none
         """
         with self.driver.session() as session:
-            result = session.run("""
-                MATCH path = (entry:CFGNode {function_id: $function_id, type: 'entry'})
-                             -[:FLOWS_TO*]->(exit:CFGNode {type: 'exit'})
-                RETURN [node in nodes(path) | node.id] as path_ids
-                LIMIT 10
-            """, {"function_id": function_id})
+            record = session.run(CFG_QUERY, {"function_id": function_id}).single()
             
-            return [record["path_ids"] for record in result]
+            if record is None:
+                return None
+            return FunctionCFG.from_bytes(function_id, record["data"])
     
     def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search for code nodes by name."""
         with self.driver.session() as session:
-            result = session.run("""
-                MATCH (n:CodeNode)
-                WHERE n.name CONTAINS $name
-                RETURN n
-                LIMIT $limit
-            """, {"name": name, "limit": limit})
+            result = session.run(SEARCH_BY_NAME_QUERY, {"name": name, "limit": limit})
             
             return [dict(record["n"]) for record in result]
     
     def get_stats(self) -> dict:
-        """Get statistics about the graph database."""
+        """
+        Get statistics about the graph database.
+        
+        Served from counters maintained at write time, read from their
+        single node on every call so all workers see each other's writes.
+        They are backfilled by full counts only if the node is missing.
+        """
+        def read(tx):
+            record = tx.run(STATS_READ_QUERY).single()
+            return record["data"] if record is not None else None
+        
+        def backfill(tx):
+            data = tx.run(STATS_LOCK_QUERY).single()["data"]
+            if data is not None:
+                return GraphStats.from_json(data)
+            stats = self._backfill_stats(tx)
+            tx.run(STATS_WRITE_QUERY, data=stats.to_json()).consume()
+            return stats
+        
         with self.driver.session() as session:
-            code_nodes = session.run("MATCH (n:CodeNode) RETURN count(n) as count").single()["count"]
-            cfg_nodes = session.run("MATCH (n:CFGNode) RETURN count(n) as count").single()["count"]
-            relationships = session.run("MATCH ()-[r]->() RETURN count(r) as count").single()["count"]
-            
-            return {
-                "code_nodes": code_nodes,
-                "cfg_nodes": cfg_nodes,
-                "relationships": relationships
-            }
+            data = session.execute_read(read)
+            stats = GraphStats.from_json(data) if data is not None else session.execute_write(backfill)
+        
+        return stats.summary()
+    
+    def _backfill_stats(self, tx) -> GraphStats:
+        """Count the whole graph once, for databases without counters."""
+        logger.info("Backfilling graph statistics")
+        return stats_from_backfill({
+            key: [record.data() for record in tx.run(query)]
+            for key, query in STATS_BACKFILL_QUERIES.items()
+        })
     
     def clear(self):
         """Clear all nodes and relationships."""
         with self.driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
+            session.run(CLEAR_QUERY).consume()
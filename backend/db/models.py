@@ -1,9 +1,10 @@
 """
 Data models for storing code analysis results.
 """
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
 from enum import Enum
+import struct
 
 
 class NodeType(str, Enum):
@@ -38,22 +39,72 @@ class CodeEdge:
     metadata: Dict[str, Any]
 
 
+# Codes used when serializing basic-block CFGs
+BLOCK_KINDS = ("entry", "exit", "block", "condition", "loop")
+EDGE_LABELS = ("", "true", "false", "loop", "back", "break", "continue", "return", "raise", "exception", "case")
+CFG_HEADER = struct.Struct("<4sII")
+CFG_MAGIC = b"CFG1"
+
+
 @dataclass
-class CFGNode:
-    """Represents a node in the Control Flow Graph."""
-    id: str
-    function_id: str
-    code: str
-    line_number: int
-    type: str  # e.g., "entry", "exit", "statement", "condition", "loop"
+class BasicBlock:
+    """A maximal run of statements in a function that execute in sequence."""
+    kind: str  # One of BLOCK_KINDS
+    start_line: int
+    end_line: int
 
 
 @dataclass
-class CFGEdge:
-    """Represents an edge in the CFG (control flow)."""
-    source_id: str
-    target_id: str
-    condition: Optional[str] = None  # For conditional branches
+class FunctionCFG:
+    """
+    Basic-block Control Flow Graph of one function.
+    
+    Block 0 is the entry and block 1 the exit; edges are
+    (source block, target block, label) with labels from EDGE_LABELS.
+    """
+    function_id: str
+    blocks: List[BasicBlock]
+    edges: List[Tuple[int, int, str]] = field(default_factory=list)
+    
+    ENTRY = 0
+    EXIT = 1
+    
+    def block_id(self, index: int) -> str:
+        """Get the global ID of a block."""
+        return f"{self.function_id}_block_{index}"
+    
+    def successors(self) -> List[List[int]]:
+        """Get the successor blocks of every block."""
+        successors: List[List[int]] = [[] for _ in self.blocks]
+        for source, target, _ in self.edges:
+            successors[source].append(target)
+        return successors
+    
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact blob: a header, then int32 triples for blocks and edges."""
+        values = []
+        for block in self.blocks:
+            values.extend((BLOCK_KINDS.index(block.kind), block.start_line, block.end_line))
+        for source, target, label in self.edges:
+            values.extend((source, target, EDGE_LABELS.index(label)))
+        return CFG_HEADER.pack(CFG_MAGIC, len(self.blocks), len(self.edges)) + struct.pack(f"<{len(values)}i", *values)
+    
+    @classmethod
+    def from_bytes(cls, function_id: str, data: bytes) -> "FunctionCFG":
+        """Deserialize a blob produced by to_bytes()."""
+        magic, num_blocks, num_edges = CFG_HEADER.unpack_from(data)
+        if magic != CFG_MAGIC:
+            raise ValueError(f"Unknown CFG encoding for {function_id}")
+        values = struct.unpack_from(f"<{3 * (num_blocks + num_edges)}i", data, CFG_HEADER.size)
+        blocks = [
+            BasicBlock(BLOCK_KINDS[values[i]], values[i + 1], values[i + 2])
+            for i in range(0, 3 * num_blocks, 3)
+        ]
+        edges = [
+            (values[i], values[i + 1], EDGE_LABELS[values[i + 2]])
+            for i in range(3 * num_blocks, len(values), 3)
+        ]
+        return cls(function_id, blocks, edges)
 
 
 @dataclass
@@ -0,0 +1,71 @@
+"""
+Reader-writer lock for in-memory indexes shared between threads.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring reader-writer lock.
+    
+    Any number of readers may hold the lock at once. A writer waits for
+    active readers to drain and blocks new readers while it is waiting,
+    so a steady stream of searches cannot starve index updates.
+    """
+    
+    def __init__(self):
+        """Initialize lock state."""
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    def acquire_read(self):
+        """Acquire the lock for shared (read) access."""
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        """Release shared (read) access."""
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        """Acquire the lock for exclusive (write) access."""
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+    
+    def release_write(self):
+        """Release exclusive (write) access."""
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+    
+    @contextmanager
+    def read_locked(self):
+        """Context manager for shared access."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write_locked(self):
+        """Context manager for exclusive access."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
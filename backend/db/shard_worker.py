@@ -0,0 +1,57 @@
+"""
+Worker process serving one vector store shard over a local connection.
+
+Started by ShardedVectorStore as ``python -m db.shard_worker <db_path> <dimension>``.
+The worker prints its listener address on stdout, accepts a single
+connection from the parent and serves requests until it is closed.
+"""
+from multiprocessing.connection import Listener
+import logging
+import os
+import sys
+
+from db.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# VectorStore methods the parent may call remotely
+ALLOWED_METHODS = {"add_embeddings", "search", "search_files", "refresh", "get_stats", "clear"}
+
+
+def serve(db_path: str, dimension: int):
+    """
+    Serve a shard until the parent closes the connection.
+    
+    Args:
+        db_path: Path of the shard's vector store
+        dimension: Embedding dimension
+    """
+    store = VectorStore(db_path, dimension)
+    authkey = bytes.fromhex(os.environ["SHARD_WORKER_AUTHKEY"])
+    
+    with Listener(("127.0.0.1", 0), authkey=authkey) as listener:
+        host, port = listener.address
+        print(f"{host}:{port}", flush=True)
+        
+        with listener.accept() as conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except EOFError:
+                    break
+                
+                if method == "close":
+                    break
+                
+                try:
+                    if method not in ALLOWED_METHODS:
+                        raise ValueError(f"Unsupported shard method: {method}")
+                    conn.send(("ok", getattr(store, method)(*args)))
+                except Exception as e:
+                    logger.error(f"Shard worker error in {method}: {e}")
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    serve(sys.argv[1], int(sys.argv[2]))
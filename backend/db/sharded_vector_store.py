@@ -0,0 +1,331 @@
+"""
+Sharded vector store with scatter-gather search.
+
+Chunks are routed to one of N shards by file path (or by directory, to
+keep a directory's files together). Each shard is a regular VectorStore,
+either in this process or served by its own local worker process.
+Queries fan out to all shards in parallel and the per-shard top-k lists
+are merged in one vectorized pass.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+from pathlib import Path
+from typing import List, Tuple, Dict, Any
+import atexit
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+from db.models import CodeChunk
+from db.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+SHARD_STRATEGIES = ("hash", "directory")
+
+
+class ShardWorkerClient:
+    """Proxy for a vector store shard served by a local worker process."""
+    
+    def __init__(self, db_path: Path, dimension: int):
+        """
+        Start a worker process for a shard and connect to it.
+        
+        Args:
+            db_path: Path of the shard's vector store
+            dimension: Embedding dimension
+        """
+        self.db_path = db_path
+        authkey = os.urandom(16)
+        
+        # The worker imports the db package from the backend directory
+        backend_dir = str(Path(__file__).resolve().parent.parent)
+        python_path = os.pathsep.join(filter(None, [backend_dir, os.environ.get("PYTHONPATH")]))
+        env = {**os.environ, "SHARD_WORKER_AUTHKEY": authkey.hex(), "PYTHONPATH": python_path}
+        
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "db.shard_worker", str(db_path), str(dimension)],
+            stdout=subprocess.PIPE,
+            env=env
+        )
+        
+        address = self.process.stdout.readline().decode().strip()
+        if not address:
+            self.process.kill()
+            raise RuntimeError(f"Shard worker for {db_path} failed to start")
+        
+        host, port = address.rsplit(":", 1)
+        self.conn = Client((host, int(port)), authkey=authkey)
+        self.lock = threading.Lock()
+    
+    def _call(self, method: str, *args) -> Any:
+        """Send one request to the worker and wait for its reply."""
+        with self.lock:
+            self.conn.send((method, args))
+            status, result = self.conn.recv()
+        
+        if status == "error":
+            raise RuntimeError(f"Shard worker {self.db_path} failed in {method}: {result}")
+        return result
+    
+    def add_embeddings(self, chunks: List[CodeChunk]):
+        """Add chunks to the worker's shard."""
+        self._call("add_embeddings", chunks)
+    
+    def search(self, query_embedding: List[float], k: int = 10) -> List[Tuple[CodeChunk, float]]:
+        """Search the worker's shard."""
+        return self._call("search", query_embedding, k)
+    
+    def search_files(
+        self,
+        query_embedding: List[float],
+        file_paths: List[str],
+        k: int = 10
+    ) -> List[Tuple[CodeChunk, float]]:
+        """Search the given files' chunks in the worker's shard."""
+        return self._call("search_files", query_embedding, file_paths, k)
+    
+    def refresh(self, blocking: bool = True) -> bool:
+        """Have the worker load new generations of its shard."""
+        return self._call("refresh", blocking)
+    
+    def get_stats(self) -> dict:
+        """Get the worker's shard statistics."""
+        return self._call("get_stats")
+    
+    def file_versions(self) -> Dict[str, int]:
+        """Get the versions of the worker's shard's files."""
+        return self._call("file_versions")
+    
+    def clear(self):
+        """Clear the worker's shard."""
+        self._call("clear")
+    
+    def close(self):
+        """Stop the worker process."""
+        if self.process.poll() is not None:
+            return
+        try:
+            with self.lock:
+                self.conn.send(("close", ()))
+            self.conn.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class ShardedVectorStore:
+    """Vector store split across N shards with scatter-gather search."""
+    
+    def __init__(
+        self,
+        db_path: str,
+        num_shards: int,
+        strategy: str = "hash",
+        use_workers: bool = False,
+        dimension: int = 768
+    ):
+        """
+        Initialize sharded vector store.
+        
+        Args:
+            db_path: Root path; shard N lives in ``shard_NNN`` below it
+            num_shards: Number of shards
+            strategy: "hash" (by file path) or "directory" (by parent directory)
+            use_workers: Serve each shard from its own local worker process
+            dimension: Embedding dimension
+        """
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"Unknown shard strategy '{strategy}', expected one of {SHARD_STRATEGIES}")
+        
+        self.db_path = Path(db_path).resolve()
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        self.num_shards = num_shards
+        self.strategy = strategy
+        self.dimension = dimension
+        self._check_layout()
+        
+        shard_paths = [self.db_path / f"shard_{i:03d}" for i in range(num_shards)]
+        if use_workers:
+            self.shards = [ShardWorkerClient(path, dimension) for path in shard_paths]
+            atexit.register(self.close)
+        else:
+            self.shards = [VectorStore(str(path), dimension) for path in shard_paths]
+        
+        self.executor = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="vector-shard")
+        logger.info(
+            f"Vector store sharded {num_shards} ways by {strategy}"
+            f"{' (worker processes)' if use_workers else ''}"
+        )
+    
+    def shard_for(self, file_path: str) -> int:
+        """
+        Get the shard a file's chunks belong to.
+        
+        Uses CRC32 rather than hash() so routing is stable across processes.
+        """
+        key = os.path.normpath(file_path)
+        if self.strategy == "directory":
+            key = os.path.dirname(key)
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+    
+    def add_embeddings(self, chunks: List[CodeChunk]):
+        """
+        Route chunks to their shards and add them.
+        
+        Args:
+            chunks: List of CodeChunk objects with embeddings
+        """
+        by_shard: Dict[int, List[CodeChunk]] = {}
+        for chunk in chunks:
+            by_shard.setdefault(self.shard_for(chunk.file_path), []).append(chunk)
+        
+        futures = [
+            self.executor.submit(self.shards[shard].add_embeddings, shard_chunks)
+            for shard, shard_chunks in by_shard.items()
+        ]
+        for future in futures:
+            future.result()
+    
+    def search(self, query_embedding: List[float], k: int = 10) -> List[Tuple[CodeChunk, float]]:
+        """
+        Search all shards in parallel and merge their top-k lists.
+        
+        Args:
+            query_embedding: Query embedding vector
+            k: Number of results to return
+            
+        Returns:
+            List of (CodeChunk, distance) tuples
+        """
+        futures = [self.executor.submit(shard.search, query_embedding, k) for shard in self.shards]
+        return self._merge([future.result() for future in futures], k)
+    
+    def search_files(
+        self,
+        query_embedding: List[float],
+        file_paths: List[str],
+        k: int = 10
+    ) -> List[Tuple[CodeChunk, float]]:
+        """
+        Search only the given files, asking just the shards that hold them.
+        
+        Args:
+            query_embedding: Query embedding vector
+            file_paths: Files whose chunks should be searched
+            k: Number of results to return
+            
+        Returns:
+            List of (CodeChunk, distance) tuples
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for file_path in file_paths:
+            by_shard.setdefault(self.shard_for(file_path), []).append(file_path)
+        
+        futures = [
+            self.executor.submit(self.shards[shard].search_files, query_embedding, shard_files, k)
+            for shard, shard_files in by_shard.items()
+        ]
+        return self._merge([future.result() for future in futures], k)
+    
+    def _merge(self, shard_results: List[List[Tuple[CodeChunk, float]]], k: int) -> List[Tuple[CodeChunk, float]]:
+        """
+        K-way merge of per-shard result lists by distance.
+        
+        Distances are laid out as a (shards x k) matrix padded with +inf,
+        so the global top-k is a single argpartition/argsort over it.
+        """
+        width = max((len(results) for results in shard_results), default=0)
+        if width == 0:
+            return []
+        
+        distances = np.full((len(shard_results), width), np.inf, dtype=np.float32)
+        for shard, results in enumerate(shard_results):
+            distances[shard, :len(results)] = [distance for _, distance in results]
+        
+        flat = distances.ravel()
+        top = min(k, int(np.isfinite(flat).sum()))
+        if top == 0:
+            return []
+        candidates = np.argpartition(flat, top - 1)[:top] if top < flat.size else np.arange(flat.size)
+        order = candidates[np.argsort(flat[candidates], kind="stable")][:top]
+        
+        shard_ids, positions = np.divmod(order, width)
+        return [shard_results[s][p] for s, p in zip(shard_ids.tolist(), positions.tolist())]
+    
+    def refresh(self, blocking: bool = True) -> bool:
+        """Load new generations on every shard."""
+        futures = [self.executor.submit(shard.refresh, blocking) for shard in self.shards]
+        return any([future.result() for future in futures])
+    
+    @property
+    def generation(self) -> int:
+        """Combined generation; increases whenever any shard publishes."""
+        return sum(stats["generation"] for stats in self._shard_stats())
+    
+    def get_stats(self) -> dict:
+        """Get aggregated and per-shard statistics."""
+        shard_stats = self._shard_stats()
+        return {
+            "total_embeddings": sum(s["total_embeddings"] for s in shard_stats),
+            "dimension": shard_stats[0]["dimension"],
+            "total_chunks": sum(s["total_chunks"] for s in shard_stats),
+            "generation": sum(s["generation"] for s in shard_stats),
+            "segments": sum(s["segments"] for s in shard_stats),
+            "num_shards": self.num_shards,
+            "shard_strategy": self.strategy,
+            "shards": shard_stats
+        }
+    
+    def file_versions(self) -> Dict[str, int]:
+        """Get the versions of every shard's files (each file lives in one shard)."""
+        versions = {}
+        for future in [self.executor.submit(shard.file_versions) for shard in self.shards]:
+            versions.update(future.result())
+        return versions
+    
+    def clear(self):
+        """Clear all shards."""
+        for future in [self.executor.submit(shard.clear) for shard in self.shards]:
+            future.result()
+    
+    def close(self):
+        """Stop shard worker processes, if any."""
+        for shard in self.shards:
+            if isinstance(shard, ShardWorkerClient):
+                shard.close()
+    
+    def _shard_stats(self) -> List[dict]:
+        """Collect statistics from every shard in parallel."""
+        futures = [self.executor.submit(shard.get_stats) for shard in self.shards]
+        return [future.result() for future in futures]
+    
+    def _check_layout(self):
+        """Record the shard layout and refuse to reopen it with a different one."""
+        layout_path = self.db_path / "shards.json"
+        layout = {"num_shards": self.num_shards, "strategy": self.strategy}
+        
+        if layout_path.exists():
+            with open(layout_path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            if existing != layout:
+                raise ValueError(
+                    f"Vector store at {self.db_path} is sharded as {existing}, not {layout}; "
+                    "clear it and re-index to change the shard layout"
+                )
+            return
+        
+        if (self.db_path / "manifest.json").exists():
+            logger.warning(
+                f"Unsharded vector store found at {self.db_path}; "
+                "it is ignored by the sharded store until the repository is re-indexed"
+            )
+        
+        with open(layout_path, 'w', encoding='utf-8') as f:
+            json.dump(layout, f)
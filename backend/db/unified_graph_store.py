@@ -0,0 +1,134 @@
+"""
+Unified graph store shared by the indexer and retrieval.
+"""
+from typing import List, Dict, Any, Optional
+import asyncio
+from config import settings
+from db.models import CodeNode, CodeEdge, FunctionCFG
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UnifiedGraphStore:
+    """
+    Graph store with an awaitable interface, backed by one of:
+    - AsyncGraphStore (default): async Neo4j driver, never blocks the event loop
+    - GraphStore (GRAPH_DB_ASYNC=false): the blocking driver, called inline
+    - EmbeddedGraphStore (GRAPH_BACKEND=embedded): in-process CSR graph, no server
+    
+    Writes to the blocking backends run on a thread, so a flush of the
+    embedded graph does not stall the event loop. One instance (and so
+    one connection pool) is shared by every caller.
+    """
+    
+    def __init__(self):
+        """Initialize the configured graph store backend."""
+        if settings.graph_backend == "embedded":
+            logger.info(f"🔌 Using embedded graph store at {settings.embedded_graph_path}")
+            from db.embedded_graph_store import EmbeddedGraphStore
+            self.use_async = False
+            self.store = EmbeddedGraphStore(
+                settings.embedded_graph_path,
+                settings.graph_batch_size,
+                flush_interval=settings.embedded_graph_flush_seconds
+            )
+            return
+        
+        if settings.graph_backend != "neo4j":
+            raise ValueError(f"Unknown graph backend '{settings.graph_backend}', expected 'neo4j' or 'embedded'")
+        
+        self.use_async = settings.graph_db_async
+        options = dict(
+            uri=settings.graph_db_url,
+            user=settings.graph_db_user,
+            password=settings.graph_db_password,
+            batch_size=settings.graph_batch_size,
+            max_connection_pool_size=settings.graph_db_max_pool_size,
+            connection_timeout=settings.graph_db_connection_timeout,
+            connection_acquisition_timeout=settings.graph_db_acquisition_timeout
+        )
+        
+        if self.use_async:
+            logger.info("🔌 Using async Neo4j driver")
+            from db.async_graph_store import AsyncGraphStore
+            self.store = AsyncGraphStore(**options)
+        else:
+            logger.info("🔌 Using blocking Neo4j driver")
+            from db.graph_store import GraphStore
+            self.store = GraphStore(**options)
+    
+    # Methods of blocking backends that can write to disk (the embedded
+    # store pickles the whole graph when it flushes), run on a thread
+    _WRITE_METHODS = {"add_file_graph", "clear", "close"}
+    
+    async def _call(self, method: str, *args) -> Any:
+        """Call a backend method, awaiting it if the backend is async."""
+        if self.use_async:
+            return await getattr(self.store, method)(*args)
+        if method in self._WRITE_METHODS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, getattr(self.store, method), *args)
+        return getattr(self.store, method)(*args)
+    
+    async def initialize(self):
+        """Prepare the backend (creates indexes for the async driver)."""
+        if self.use_async:
+            await self.store.initialize()
+    
+    async def close(self):
+        """Close the backend's connections."""
+        await self._call("close")
+    
+    async def flush(self):
+        """Persist pending writes (embedded backend; Neo4j commits per transaction)."""
+        if hasattr(self.store, "flush"):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.store.flush)
+    
+    async def add_file_graph(
+        self,
+        code_nodes: List[CodeNode],
+        code_edges: List[CodeEdge],
+        cfgs: List[FunctionCFG]
+    ):
+        """Write everything extracted from one file in a single transaction."""
+        await self._call("add_file_graph", code_nodes, code_edges, cfgs)
+    
+    async def get_neighbors(self, node_id: str, max_depth: int = 2) -> List[Dict[str, Any]]:
+        """Get neighboring nodes in the ASG."""
+        return await self._call("get_neighbors", node_id, max_depth)
+    
+    async def get_neighbors_multi(
+        self,
+        node_ids: List[str],
+        max_depth: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        direction: str = "both",
+        fanout: int = 20,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Expand from many seed nodes at once with a bounded breadth-first search."""
+        return await self._call(
+            "get_neighbors_multi", node_ids, max_depth, relationship_types, direction, fanout, limit
+        )
+    
+    async def get_cfg(self, function_id: str) -> Optional[FunctionCFG]:
+        """Load a function's basic-block CFG."""
+        return await self._call("get_cfg", function_id)
+    
+    async def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search for code nodes by name."""
+        return await self._call("search_by_name", name, limit)
+    
+    async def get_stats(self) -> dict:
+        """Get statistics about the graph database."""
+        return await self._call("get_stats")
+    
+    async def clear(self):
+        """Clear all nodes and relationships."""
+        await self._call("clear")
+
+
+# Global unified graph store
+unified_graph_store = UnifiedGraphStore()
@@ -1,17 +1,50 @@
 """
 Vector database interface using FAISS for local embedding storage.
+
+The store is persisted as a list of immutable segments plus a small
+manifest naming them. Each write adds a segment and atomically replaces
+the manifest, bumping the index generation, so other readers (in this
+process or in other workers) catch up by loading only the new segments.
+Publishing holds an exclusive lock on the store directory, so workers
+indexing at the same time never write the same generation; loading
+holds it shared, so segments are not deleted while being read. Once
+there are more than COMPACT_SEGMENTS segments, the newest ones are
+merged into one, keeping segment sizes roughly geometric.
 """
 import faiss
 import numpy as np
 import pickle
+import json
 import os
+import threading
+from contextlib import contextmanager
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict, Iterator
 from db.models import CodeChunk
+from db.rwlock import ReadWriteLock
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing is only serialized within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Segment count above which the newest segments are merged
+COMPACT_SEGMENTS = 8
 
 
 class VectorStore:
-    """Manages code embeddings using FAISS."""
+    """
+    Manages code embeddings using FAISS.
+    
+    Searches hold a shared read lock while FAISS scans the index (FAISS
+    releases the GIL, so searches from a thread pool run in parallel).
+    Index and metadata updates hold the exclusive write lock, so a search
+    never sees index rows whose chunk metadata is not there yet.
+    """
     
     def __init__(self, db_path: str, dimension: int = 768):
         """
@@ -25,45 +58,79 @@ class VectorStore:
         self.db_path.mkdir(parents=True, exist_ok=True)
         
         self.dimension = dimension
+        self.manifest_path = self.db_path / "manifest.json"
+        self.lock_path = self.db_path / ".publish.lock"
+        
+        # Legacy single-file layout, migrated to a segment on first load
         self.index_path = self.db_path / "faiss.index"
         self.metadata_path = self.db_path / "metadata.pkl"
         
-        # Initialize or load index
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-            with open(self.metadata_path, 'rb') as f:
-                self.chunk_metadata = pickle.load(f)
-        else:
-            # Create a new index (IndexFlatL2 for exact search)
-            self.index = faiss.IndexFlatL2(dimension)
-            self.chunk_metadata: List[CodeChunk] = []
+        # Published state: generation number and the segments it contains
+        self.generation = 0
+        self.segments: List[str] = []
+        self.segment_rows: List[int] = []
+        self._manifest_key: Optional[Tuple[int, int]] = None
+        
+        # Serializes publishing and loading of generations in this process
+        # (the store directory's lock file does so across processes)
+        self._publish_lock = threading.Lock()
+        # Guards the in-memory index and chunk metadata
+        self._rwlock = ReadWriteLock()
+        
+        # Create an empty index (IndexFlatL2 for exact search)
+        self.index = faiss.IndexFlatL2(dimension)
+        self.chunk_metadata: List[CodeChunk] = []
+        # file_path -> [(first_row, end_row)]; a file's chunks are added together
+        self.file_rows: Dict[str, List[Tuple[int, int]]] = {}
+        
+        if not self.manifest_path.exists() and self.index_path.exists():
+            with self._publishing() as locked:
+                if locked and not self.manifest_path.exists():
+                    self._migrate_legacy_index()
+        
+        self.refresh()
     
     def add_embeddings(self, chunks: List[CodeChunk]):
         """
         Add code chunks with embeddings to the vector store.
         
+        The chunks are written as a new segment and published by swapping
+        the manifest, so readers never observe a partially written index.
+        
         Args:
             chunks: List of CodeChunk objects with embeddings
         """
         if not chunks:
             return
         
-        # Extract embeddings
+        # Extract embeddings; metadata doesn't need a second copy of them
         embeddings = np.array([chunk.embedding for chunk in chunks], dtype=np.float32)
+        chunks = [replace(chunk, embedding=None) for chunk in chunks]
         
-        # Add to FAISS index
-        self.index.add(embeddings)
-        
-        # Store metadata
-        self.chunk_metadata.extend(chunks)
-        
-        # Save to disk
-        self._save()
+        with self._publishing():
+            # Catch up with writers in other processes before publishing
+            self._refresh_locked()
+            
+            generation = self.generation + 1
+            segment = f"segment_{generation:08d}"
+            self._write_segment(segment, embeddings, chunks)
+            self._write_manifest(generation, self.segments + [segment])
+            
+            with self._rwlock.write_locked():
+                self._apply_segment(segment, embeddings, chunks)
+                self.generation = generation
+            self._manifest_key = self._stat_manifest()
+            
+            if len(self.segments) > COMPACT_SEGMENTS:
+                self._compact_locked()
     
     def search(self, query_embedding: List[float], k: int = 10) -> List[Tuple[CodeChunk, float]]:
         """
         Search for similar code chunks.
         
+        Safe to call from many threads at once, including while a writer
+        is adding embeddings.
+        
         Args:
             query_embedding: Query embedding vector
             k: Number of results to return
@@ -71,39 +138,432 @@ class VectorStore:
         Returns:
             List of (CodeChunk, distance) tuples
         """
-        if self.index.ntotal == 0:
-            return []
+        # Don't queue behind a writer; search the current generation instead
+        self.refresh(blocking=False)
         
         # Convert query to numpy array
         query = np.array([query_embedding], dtype=np.float32)
         
-        # Search
-        distances, indices = self.index.search(query, min(k, self.index.ntotal))
-        
-        # Return chunks with distances
-        results = []
-        for distance, idx in zip(distances[0], indices[0]):
-            if idx < len(self.chunk_metadata):
-                results.append((self.chunk_metadata[idx], float(distance)))
+        with self._rwlock.read_locked():
+            if self.index.ntotal == 0:
+                return []
+            
+            # Search
+            distances, indices = self.index.search(query, min(k, self.index.ntotal))
+            
+            # Return chunks with distances
+            results = []
+            for distance, idx in zip(distances[0], indices[0]):
+                if 0 <= idx < len(self.chunk_metadata):
+                    results.append((self.chunk_metadata[idx], float(distance)))
         
         return results
     
+    def search_files(
+        self,
+        query_embedding: List[float],
+        file_paths: List[str],
+        k: int = 10
+    ) -> List[Tuple[CodeChunk, float]]:
+        """
+        Search only the chunks belonging to the given files.
+        
+        Only the candidate files' vectors are read and compared, so the
+        cost scales with the size of those files rather than the index.
+        
+        Args:
+            query_embedding: Query embedding vector
+            file_paths: Files whose chunks should be searched
+            k: Number of results to return
+            
+        Returns:
+            List of (CodeChunk, distance) tuples
+        """
+        self.refresh(blocking=False)
+        
+        query = np.array(query_embedding, dtype=np.float32)
+        
+        with self._rwlock.read_locked():
+            ranges = [r for path in file_paths for r in self.file_rows.get(path, [])]
+            if not ranges:
+                return []
+            
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            vectors = np.vstack([self.index.reconstruct_n(start, end - start) for start, end in ranges])
+            distances = np.sum((vectors - query) ** 2, axis=1)
+            
+            top = min(k, len(rows))
+            best = np.argpartition(distances, top - 1)[:top]
+            best = best[np.argsort(distances[best], kind="stable")]
+            
+            logger.debug(f"Scanned {len(rows)} of {self.index.ntotal} vectors in {len(file_paths)} files")
+            return [(self.chunk_metadata[rows[i]], float(distances[i])) for i in best]
+    
+    def refresh(self, blocking: bool = True) -> bool:
+        """
+        Load any generations published since the last refresh.
+        
+        Only segments that are not yet in memory are read. If the manifest
+        no longer extends the loaded segment list (e.g. after ``clear``),
+        the index is rebuilt from the published segments.
+        
+        Args:
+            blocking: Wait for a refresh already running in another thread
+            
+        Returns:
+            True if new state was loaded, False if already up to date
+        """
+        if self._stat_manifest() == self._manifest_key:
+            return False
+        
+        with self._publishing(shared=True, blocking=blocking) as locked:
+            return locked and self._refresh_locked()
+    
     def get_stats(self) -> dict:
         """Get statistics about the vector store."""
-        return {
-            "total_embeddings": self.index.ntotal,
-            "dimension": self.dimension,
-            "total_chunks": len(self.chunk_metadata)
-        }
+        self.refresh(blocking=False)
+        with self._rwlock.read_locked():
+            return {
+                "total_embeddings": self.index.ntotal,
+                "dimension": self.dimension,
+                "total_chunks": len(self.chunk_metadata),
+                "generation": self.generation,
+                "segments": len(self.segments)
+            }
+    
+    def file_versions(self) -> Dict[str, int]:
+        """
+        Get a version of every indexed file, without loading new generations.
+        
+        A file's version is the end row of its newest chunks. Rows are
+        numbered the same in every process, so the version changes when
+        any worker re-indexes the file (once refresh() has loaded it).
+        """
+        with self._rwlock.read_locked():
+            return {path: ranges[-1][1] for path, ranges in self.file_rows.items()}
     
     def clear(self):
         """Clear all embeddings and metadata."""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.chunk_metadata = []
-        self._save()
-    
-    def _save(self):
-        """Save index and metadata to disk."""
-        faiss.write_index(self.index, str(self.index_path))
-        with open(self.metadata_path, 'wb') as f:
-            pickle.dump(self.chunk_metadata, f)
+        with self._publishing():
+            self._refresh_locked()
+            
+            old_segments = self.segments
+            generation = self.generation + 1
+            self._write_manifest(generation, [])
+            self._swap(*self._build([], self.dimension), generation)
+            self._manifest_key = self._stat_manifest()
+            self._delete_segments(old_segments)
+    
+    @contextmanager
+    def _publishing(self, shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the publish lock of this process and of the store directory.
+        
+        Args:
+            shared: Lock the directory shared (loading) rather than exclusive (publishing)
+            blocking: Wait for the locks; if False, yields False when either is taken
+            
+        Yields:
+            Whether the locks are held
+        """
+        if not self._publish_lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            with open(self.lock_path, 'a+b') as lock_file:
+                locked = True
+                if fcntl is not None:
+                    flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+                    try:
+                        fcntl.flock(lock_file, flags if blocking else flags | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        locked = False
+                # Closing the file releases the directory lock
+                yield locked
+        finally:
+            self._publish_lock.release()
+    
+    def _compact_locked(self):
+        """
+        Merge the newest segments into one and publish it as a new generation.
+        
+        Going back from the newest segment, older segments join the merge
+        while they are no larger than everything newer combined (always
+        at least two), so each row is rewritten O(log n) times. The
+        caller holds the publish lock exclusively and is up to date.
+        """
+        start = len(self.segments) - 1
+        merged_rows = self.segment_rows[start]
+        while start > 0 and (
+            start == len(self.segments) - 1 or self.segment_rows[start - 1] <= merged_rows
+        ):
+            start -= 1
+            merged_rows += self.segment_rows[start]
+        
+        first_row = sum(self.segment_rows[:start])
+        with self._rwlock.read_locked():
+            embeddings = self.index.reconstruct_n(first_row, merged_rows)
+            chunks = self.chunk_metadata[first_row:first_row + merged_rows]
+        
+        generation = self.generation + 1
+        segment = f"segment_{generation:08d}"
+        old_segments = self.segments[start:]
+        self._write_segment(segment, embeddings, chunks)
+        self._write_manifest(generation, self.segments[:start] + [segment])
+        
+        with self._rwlock.write_locked():
+            self.segments = self.segments[:start] + [segment]
+            self.segment_rows = self.segment_rows[:start] + [merged_rows]
+            self.generation = generation
+        self._manifest_key = self._stat_manifest()
+        self._delete_segments(old_segments)
+        logger.info(f"Compacted {len(old_segments)} vector store segments ({merged_rows} embeddings)")
+    
+    def _delete_segments(self, segments: List[str]):
+        """Delete unpublished segment files; the caller holds the publish lock exclusively."""
+        for segment in segments:
+            for suffix in (".npy", ".pkl"):
+                (self.db_path / f"{segment}{suffix}").unlink(missing_ok=True)
+    
+    def _refresh_locked(self) -> bool:
+        """Load new generations; the caller holds the publish lock."""
+        manifest_key = self._stat_manifest()
+        if manifest_key is None or manifest_key == self._manifest_key:
+            return False
+        
+        manifest = self._read_manifest()
+        if manifest["generation"] <= self.generation and self._manifest_key is not None:
+            self._manifest_key = manifest_key
+            return False
+        
+        segments = manifest["segments"]
+        kept = _common_prefix(segments, self.segments)
+        try:
+            if kept > 0 or not self.segments:
+                # Read new segments without blocking searches, then drop
+                # compacted ones and append (the shared prefix stays loaded)
+                loaded = [
+                    (segment, *self._read_segment(segment))
+                    for segment in segments[kept:]
+                ]
+                with self._rwlock.write_locked():
+                    self._truncate(kept)
+                    for segment, embeddings, chunks in loaded:
+                        self._apply_segment(segment, embeddings, chunks)
+                    self.generation = manifest["generation"]
+            else:
+                built = self._build(segments, manifest.get("dimension", self.dimension))
+                self._swap(*built, manifest["generation"])
+        except FileNotFoundError as e:
+            # A newer manifest replaced this one mid-load; retry on next refresh
+            logger.warning(f"Vector store segment disappeared during refresh: {e}")
+            return False
+        
+        self._manifest_key = manifest_key
+        logger.info(f"Vector store at generation {self.generation} ({self.index.ntotal} embeddings)")
+        return True
+    
+    def _stat_manifest(self) -> Optional[Tuple[int, int]]:
+        """Identify the published manifest (os.replace gives each one a new inode)."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+    
+    def _truncate(self, kept: int):
+        """Drop all but the first kept segments from memory (write lock held)."""
+        if kept == len(self.segments):
+            return
+        rows = sum(self.segment_rows[:kept])
+        self.index.remove_ids(faiss.IDSelectorRange(rows, self.index.ntotal))
+        del self.chunk_metadata[rows:]
+        file_rows = {}
+        for path, ranges in self.file_rows.items():
+            kept_ranges = [r for r in ranges if r[1] <= rows]
+            if kept_ranges:
+                file_rows[path] = kept_ranges
+        self.file_rows = file_rows
+        del self.segments[kept:]
+        del self.segment_rows[kept:]
+    
+    def _apply_segment(self, segment: str, embeddings: np.ndarray, chunks: List[CodeChunk]):
+        """Append a loaded segment to the in-memory index (write lock held)."""
+        if self.index.ntotal == 0 and embeddings.shape[1] != self.index.d:
+            self.dimension = embeddings.shape[1]
+            self.index = faiss.IndexFlatL2(self.dimension)
+        
+        _add_file_rows(self.file_rows, chunks, self.index.ntotal)
+        self.chunk_metadata.extend(chunks)
+        self.index.add(embeddings)
+        self.segments.append(segment)
+        self.segment_rows.append(len(chunks))
+    
+    def _build(
+        self,
+        segments: List[str],
+        dimension: int
+    ) -> Tuple[faiss.Index, List[CodeChunk], Dict, List[str], List[int]]:
+        """Build a fresh index from a list of segments, off to the side."""
+        index = faiss.IndexFlatL2(dimension)
+        chunk_metadata: List[CodeChunk] = []
+        file_rows: Dict[str, List[Tuple[int, int]]] = {}
+        segment_rows: List[int] = []
+        
+        for segment in segments:
+            embeddings, chunks = self._read_segment(segment)
+            if index.ntotal == 0 and embeddings.shape[1] != index.d:
+                index = faiss.IndexFlatL2(embeddings.shape[1])
+            _add_file_rows(file_rows, chunks, index.ntotal)
+            chunk_metadata.extend(chunks)
+            index.add(embeddings)
+            segment_rows.append(len(chunks))
+        
+        return index, chunk_metadata, file_rows, list(segments), segment_rows
+    
+    def _swap(
+        self,
+        index: faiss.Index,
+        chunk_metadata: List[CodeChunk],
+        file_rows: Dict[str, List[Tuple[int, int]]],
+        segments: List[str],
+        segment_rows: List[int],
+        generation: int
+    ):
+        """Replace the in-memory state with a freshly built one."""
+        with self._rwlock.write_locked():
+            self.index = index
+            self.dimension = index.d
+            self.chunk_metadata = chunk_metadata
+            self.file_rows = file_rows
+            self.segments = segments
+            self.segment_rows = segment_rows
+            self.generation = generation
+    
+    def _read_manifest(self) -> Dict:
+        """Read the published manifest."""
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_manifest(self, generation: int, segments: List[str]):
+        """Atomically publish a new manifest."""
+        manifest = {
+            "generation": generation,
+            "dimension": self.dimension,
+            "segments": segments
+        }
+        self._atomic_write(
+            self.manifest_path,
+            json.dumps(manifest, indent=2).encode('utf-8')
+        )
+    
+    def _read_segment(self, segment: str) -> Tuple[np.ndarray, List[CodeChunk]]:
+        """Read a segment's embeddings and chunk metadata."""
+        embeddings = np.load(self.db_path / f"{segment}.npy")
+        with open(self.db_path / f"{segment}.pkl", 'rb') as f:
+            chunks = pickle.load(f)
+        return embeddings.astype(np.float32, copy=False), chunks
+    
+    def _write_segment(self, segment: str, embeddings: np.ndarray, chunks: List[CodeChunk]):
+        """Write a segment to disk (not visible until a manifest names it)."""
+        vectors_path = self.db_path / f"{segment}.npy"
+        tmp_path = vectors_path.with_suffix(".npy.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, embeddings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, vectors_path)
+        
+        self._atomic_write(self.db_path / f"{segment}.pkl", pickle.dumps(chunks))
+    
+    def _atomic_write(self, path: Path, data: bytes):
+        """Write a file via a temporary file and an atomic rename."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _migrate_legacy_index(self):
+        """Convert a single-file faiss.index/metadata.pkl store into a segment."""
+        logger.info(f"Migrating legacy vector store at {self.db_path}")
+        index = faiss.read_index(str(self.index_path))
+        with open(self.metadata_path, 'rb') as f:
+            chunks = pickle.load(f)
+        
+        if index.ntotal > 0:
+            self.dimension = index.d
+            embeddings = index.reconstruct_n(0, index.ntotal)
+            self._write_segment("segment_00000001", embeddings, chunks)
+            self._write_manifest(1, ["segment_00000001"])
+        else:
+            self._write_manifest(1, [])
+
+
+def _common_prefix(a: List[str], b: List[str]) -> int:
+    """Length of the common prefix of two segment lists."""
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _add_file_rows(file_rows: Dict[str, List[Tuple[int, int]]], chunks: List[CodeChunk], base: int):
+    """Record the row ranges of appended chunks, grouped by file."""
+    start = 0
+    for i in range(1, len(chunks) + 1):
+        if i == len(chunks) or chunks[i].file_path != chunks[start].file_path:
+            file_rows.setdefault(chunks[start].file_path, []).append((base + start, base + i))
+            start = i
+
+
+# Shared vector stores, one per database path
+_vector_stores: Dict[str, VectorStore] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_vector_store(
+    db_path: str,
+    dimension: int = 768,
+    num_shards: int = 1,
+    strategy: str = "hash",
+    use_workers: bool = False
+):
+    """
+    Get or create the shared vector store for a database path.
+    
+    The indexer and the query path use the same instance, so vectors
+    added during indexing are searchable immediately. With more than one
+    shard a ShardedVectorStore is returned; it has the same interface.
+    
+    Args:
+        db_path: Path to store FAISS index and metadata
+        dimension: Embedding dimension
+        num_shards: Number of shards (1 for a single unsharded store)
+        strategy: Shard routing strategy, "hash" or "directory"
+        use_workers: Serve each shard from a local worker process
+    """
+    key = str(Path(db_path).resolve())
+    with _vector_stores_lock:
+        if key not in _vector_stores:
+            if num_shards > 1:
+                from db.sharded_vector_store import ShardedVectorStore
+                _vector_stores[key] = ShardedVectorStore(
+                    db_path, num_shards, strategy, use_workers, dimension
+                )
+            else:
+                _vector_stores[key] = VectorStore(db_path, dimension)
+        return _vector_stores[key]
+
+
+def get_file_vector_store(db_path: str, dimension: int = 768) -> VectorStore:
+    """
+    Get the shared file-level store kept alongside a chunk store.
+    
+    It holds one summary embedding per file and is used to pick candidate
+    files before searching their chunks.
+    """
+    return get_vector_store(str(Path(db_path) / "files"), dimension)
@@ -0,0 +1,156 @@
+"""
+Cache of query embeddings.
+
+Users retry and rephrase the same questions, and each query embedding
+is a rate-limited API call (or a model forward pass). Embeddings are
+kept per (embedding model, normalized query) in a bounded LRU with a
+TTL, and optionally persisted so they survive restarts.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+import logging
+import os
+import pickle
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace; case is kept since code identifiers are case-sensitive."""
+    return ' '.join(query.split())
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings with a time-to-live."""
+    
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600, path: Optional[str] = None):
+        """
+        Initialize query embedding cache.
+        
+        Args:
+            max_size: Maximum number of cached embeddings
+            ttl_seconds: Seconds an embedding stays valid
+            path: File the cache is persisted to (in memory only if None)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        
+        # (model, normalized query) -> (embedding, stored at)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        
+        self._load()
+    
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """
+        Get a cached query embedding.
+        
+        Args:
+            model: Embedding model name
+            query: Query text
+            
+        Returns:
+            Embedding, or None if missing or expired
+        """
+        key = (model, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, model: str, query: str, embedding: List[float]):
+        """
+        Cache a query embedding.
+        
+        All-zero embeddings (the generators' error fallback) are not cached.
+        
+        Args:
+            model: Embedding model name
+            query: Query text
+            embedding: Query embedding
+        """
+        if not any(embedding):
+            return
+        
+        key = (model, normalize_query(query))
+        with self._lock:
+            self._entries[key] = (embedding, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+    
+    def clear(self):
+        """Remove all cached embeddings."""
+        with self._lock:
+            self._entries.clear()
+    
+    def save(self):
+        """Persist cached embeddings, if a path is configured (expired ones are dropped on load)."""
+        if self.path is None:
+            return
+        
+        with self._lock:
+            entries = list(self._entries.items())
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(entries)} query embeddings")
+    
+    def _load(self):
+        """Load persisted embeddings, dropping expired ones."""
+        if self.path is None or not self.path.exists():
+            return
+        
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading query embedding cache: {e}")
+            return
+        
+        now = time.time()
+        for key, (embedding, stored_at) in entries[-self.max_size:]:
+            if now - stored_at <= self.ttl_seconds:
+                self._entries[key] = (embedding, stored_at)
+        logger.info(f"Loaded {len(self._entries)} query embeddings")
+
+
+# Global query embedding cache instance
+query_embedding_cache = QueryEmbeddingCache(
+    settings.query_cache_size,
+    ttl_seconds=settings.query_cache_ttl_seconds,
+    path=settings.query_cache_path
+)
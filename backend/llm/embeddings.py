@@ -6,8 +6,8 @@ from google.api_core import exceptions as google_exceptions
 from typing import List
 from config import settings
 from llm.rate_limiter import rate_limiter
+import asyncio
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,7 @@ logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.gemini_api_key)
 
 # Initialize rate limiter for embeddings
-rate_limiter.add_model("embeddings", settings.embedding_rate_limit_rpm)
+rate_limiter.add_model("embeddings", settings.embedding_rate_limit_rpm, settings.rate_limit_burst)
 
 
 class EmbeddingGenerator:
@@ -44,11 +44,13 @@ class EmbeddingGenerator:
         base_delay = 2
         
         # Apply rate limiting
-        rate_limiter.wait_if_needed("embeddings")
+        await rate_limiter.acquire("embeddings")
         
         for attempt in range(max_retries):
             try:
-                result = genai.embed_content(
+                # Network call runs on a thread, keeping the event loop free (and the wait cancellable)
+                result = await asyncio.to_thread(
+                    genai.embed_content,
                     model=self.model,
                     content=text,
                     task_type="retrieval_document"
@@ -67,7 +69,7 @@ class EmbeddingGenerator:
                     if attempt < max_retries - 1:
                         delay = base_delay * (2 ** attempt)
                         logger.warning(f"Resource exhausted, retrying in {delay}s...")
-                        time.sleep(delay)
+                        await asyncio.sleep(delay)
                     else:
                         logger.error(f"Error generating embedding after {max_retries} attempts: {e}")
                         return [0.0] * 768
@@ -104,14 +106,16 @@ class EmbeddingGenerator:
             Query embedding vector
         """
         # Apply rate limiting
-        rate_limiter.wait_if_needed("embeddings")
+        await rate_limiter.acquire("embeddings")
         
         max_retries = 3
         base_delay = 2
         
         for attempt in range(max_retries):
             try:
-                result = genai.embed_content(
+                # Network call runs on a thread, keeping the event loop free (and the wait cancellable)
+                result = await asyncio.to_thread(
+                    genai.embed_content,
                     model=self.model,
                     content=query,
                     task_type="retrieval_query"
@@ -128,7 +132,7 @@ class EmbeddingGenerator:
                     if attempt < max_retries - 1:
                         delay = base_delay * (2 ** attempt)
                         logger.warning(f"Resource exhausted, retrying in {delay}s...")
-                        time.sleep(delay)
+                        await asyncio.sleep(delay)
                     else:
                         logger.error(f"Error generating query embedding after {max_retries} attempts: {e}")
                         return [0.0] * 768
@@ -1,11 +1,16 @@
 """
 Gemini API client with streaming support and rate limiting.
+
+The SDK's calls block on the network, so they run on worker threads
+(as embedding calls do) and a slow response never stalls the event loop.
 """
 import google.generativeai as genai
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Optional, Tuple
 from config import settings
 from tenacity import retry, stop_after_attempt, wait_exponential
 from llm.rate_limiter import rate_limiter
+from llm.token_counter import token_counter
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,10 +18,10 @@ logger = logging.getLogger(__name__)
 # Configure Gemini API
 genai.configure(api_key=settings.gemini_api_key)
 
-# Initialize rate limiters for each model
-rate_limiter.add_model(settings.gemini_flash_model, settings.flash_rate_limit_rpm)
-rate_limiter.add_model(settings.gemini_pro_model, settings.pro_rate_limit_rpm)
-rate_limiter.add_model(settings.gemini_lite_model, settings.lite_rate_limit_rpm)
+# Initialize rate limiters for each model (requests and tokens per minute)
+rate_limiter.add_model(settings.gemini_flash_model, settings.flash_rate_limit_rpm, settings.rate_limit_burst, settings.rate_limit_tpm)
+rate_limiter.add_model(settings.gemini_pro_model, settings.pro_rate_limit_rpm, settings.rate_limit_burst, settings.rate_limit_tpm)
+rate_limiter.add_model(settings.gemini_lite_model, settings.lite_rate_limit_rpm, settings.rate_limit_burst, settings.rate_limit_tpm)
 
 
 class GeminiClient:
@@ -54,16 +59,21 @@ class GeminiClient:
         Returns:
             Generated text
         """
-        # Apply rate limiting
-        rate_limiter.wait_if_needed(self.model_name)
+        # Apply rate limiting (each retry reserves again, so failures give theirs back)
+        reserved, prompt_tokens = await self._reserve(prompt, self.generation_config)
         
+        response = None
         try:
-            response = self.model.generate_content(
+            response = await asyncio.to_thread(
+                self.model.generate_content,
                 prompt,
                 generation_config=self.generation_config
             )
+            self._reconcile(reserved, response)
             return response.text
         except Exception as e:
+            if response is None:
+                self._release(reserved, prompt_tokens, e)
             error_msg = str(e)
             if "429" in error_msg or "quota" in error_msg.lower():
                 logger.error(f"❌ API Quota Exceeded: {error_msg}")
@@ -86,20 +96,28 @@ class GeminiClient:
             Text chunks as they are generated
         """
         # Apply rate limiting
-        rate_limiter.wait_if_needed(self.model_name)
+        reserved, prompt_tokens = await self._reserve(prompt, self.generation_config)
         
         try:
-            response = self.model.generate_content(
+            response = await asyncio.to_thread(
+                self.model.generate_content,
                 prompt,
                 generation_config=self.generation_config,
                 stream=True
             )
             
-            for chunk in response:
+            # Each chunk is a blocking read from the network
+            chunks = iter(response)
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
                 if chunk.text:
                     yield chunk.text
+            self._reconcile(reserved, response)
         
         except Exception as e:
+            self._release(reserved, prompt_tokens, e)
             logger.error(f"Error in streaming response: {e}")
             yield f"Error: {str(e)}"
     
@@ -120,9 +138,6 @@ class GeminiClient:
         Returns:
             Generated response
         """
-        # Apply rate limiting
-        rate_limiter.wait_if_needed(self.model_name)
-        
         # Combine prompts
         full_prompt = f"{system_prompt}\n\n{user_message}"
         
@@ -131,15 +146,56 @@ class GeminiClient:
         if max_tokens:
             config["max_output_tokens"] = max_tokens
         
+        # Apply rate limiting
+        reserved, prompt_tokens = await self._reserve(full_prompt, config)
+        
+        response = None
         try:
-            response = self.model.generate_content(
+            response = await asyncio.to_thread(
+                self.model.generate_content,
                 full_prompt,
                 generation_config=config
             )
+            self._reconcile(reserved, response)
             return response.text
         except Exception as e:
+            if response is None:
+                self._release(reserved, prompt_tokens, e)
             logger.error(f"Error generating response with context: {e}")
             raise
+    
+    async def _reserve(self, prompt: str, generation_config: dict) -> Tuple[int, int]:
+        """
+        Wait for the model's rate limits, reserving the prompt's tokens plus expected output.
+        
+        Args:
+            prompt: Input prompt
+            generation_config: Generation config of the request
+            
+        Returns:
+            (tokens reserved, prompt tokens)
+        """
+        prompt_tokens = token_counter.count_tokens(prompt)
+        output_tokens = min(settings.rate_limit_output_reserve, generation_config["max_output_tokens"])
+        reserved = await rate_limiter.acquire(self.model_name, prompt_tokens + output_tokens)
+        return reserved, prompt_tokens
+    
+    def _reconcile(self, reserved: int, response):
+        """Settle a token reservation with the usage the API reported, if any."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.total_token_count:
+            rate_limiter.reconcile(self.model_name, reserved, usage.total_token_count)
+    
+    def _release(self, reserved: int, prompt_tokens: int, error: Exception):
+        """
+        Settle the reservation of a request that failed before returning a response.
+        
+        A rejected request (429 or quota) used nothing; any other failure
+        happened after the prompt was sent, so its tokens count as used.
+        """
+        error_msg = str(error)
+        rejected = "429" in error_msg or "quota" in error_msg.lower()
+        rate_limiter.reconcile(self.model_name, reserved, 0 if rejected else min(prompt_tokens, reserved))
 
 
 # Global Gemini client instances for each model
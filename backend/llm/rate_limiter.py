@@ -1,74 +1,252 @@
 """
 Rate limiter for API calls.
-Implements a simple token bucket rate limiter.
+
+Implements token buckets per model: requests_per_minute request tokens
+are added per minute up to a burst capacity and, for models with a
+tokens-per-minute limit, tokens_per_minute budget tokens up to one
+minute's worth. A request takes one request token and reserves its
+estimated cost (prompt tokens plus reserved output tokens) from the
+budget before it is sent; reconcile() settles the reservation with the
+usage the API reports afterwards.
+
+Waiting requests are queued in arrival order. A request whose cost fits
+the current budget may go ahead of larger ones that do not fit yet, but
+only until a bypassed request has waited as long as its own cost takes
+to refill; from then on the budget is held for it. Small prompts thus
+fill the gaps left by large ones without starving them. Nobody holds
+the lock while waiting: async callers await acquire() (and leave the
+queue if cancelled), threads block in wait_if_needed().
 """
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import asyncio
 import time
 import threading
-from collections import defaultdict
-from typing import Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shortest re-check interval of a request queued behind one that can go
+MIN_WAIT = 0.01
+
+
+@dataclass(eq=False)
+class Waiter:
+    """A queued request."""
+    cost: float
+    since: float
+    wake: Callable[[], None]
+    logged: bool = False
+
+
+def log_wait(waiter: Waiter, delay: float):
+    """Log the first wait of a request."""
+    if not waiter.logged:
+        waiter.logged = True
+        logger.info(f"⏳ Rate limit: waiting {delay:.2f}s before next request")
+
 
 class RateLimiter:
     """Token bucket rate limiter for API calls."""
     
-    def __init__(self, requests_per_minute: int):
+    def __init__(self, requests_per_minute: int, burst: int = 1, tokens_per_minute: Optional[int] = None):
         """
         Initialize rate limiter.
         
         Args:
             requests_per_minute: Maximum number of requests allowed per minute
+            burst: Requests that may be made back to back after an idle period
+            tokens_per_minute: Maximum prompt plus output tokens per minute (unlimited if None)
         """
         self.requests_per_minute = requests_per_minute
-        self.interval = 60.0 / requests_per_minute  # Seconds between requests
-        self.last_request_time = 0.0
+        self.tokens_per_minute = tokens_per_minute
+        self.rate = requests_per_minute / 60.0  # Request tokens added per second
+        self.capacity = float(max(1, burst))
+        self.token_rate = tokens_per_minute / 60.0 if tokens_per_minute else None
+        
+        self.tokens = self.capacity
+        self.budget = float(tokens_per_minute or 0)
+        self.updated = time.monotonic()
+        self.waiters: List[Waiter] = []
         self.lock = threading.Lock()
     
-    def wait_if_needed(self):
+    def wait_if_needed(self, tokens: int = 0) -> int:
         """
         Wait if necessary to respect rate limit.
-        This method blocks until a request can be made.
-        """
-        with self.lock:
-            current_time = time.time()
-            time_since_last_request = current_time - self.last_request_time
+        This method blocks the calling thread until a request can be made;
+        use acquire() from async code.
+        
+        Args:
+            tokens: Estimated tokens of the request (prompt plus reserved output)
             
-            if time_since_last_request < self.interval:
-                sleep_time = self.interval - time_since_last_request
-                logger.info(f"⏳ Rate limit: waiting {sleep_time:.2f}s before next request")
-                time.sleep(sleep_time)
+        Returns:
+            Tokens reserved, to be passed to reconcile()
+        """
+        event = threading.Event()
+        waiter = self._enqueue(tokens, event.set)
+        try:
+            while True:
+                event.clear()
+                delay = self._try_grant(waiter)
+                if delay is None:
+                    return int(waiter.cost)
+                log_wait(waiter, delay)
+                event.wait(delay)
+        finally:
+            self._dequeue(waiter)
+    
+    async def acquire(self, tokens: int = 0) -> int:
+        """
+        Wait without blocking the event loop until a request can be made.
+        
+        A caller cancelled while waiting leaves the queue without
+        taking anything.
+        
+        Args:
+            tokens: Estimated tokens of the request (prompt plus reserved output)
             
-            self.last_request_time = time.time()
+        Returns:
+            Tokens reserved, to be passed to reconcile()
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                event.clear()
+                delay = self._try_grant(waiter)
+                if delay is None:
+                    return int(waiter.cost)
+                log_wait(waiter, delay)
+                try:
+                    await asyncio.wait_for(event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._dequeue(waiter)
     
-    def can_make_request(self) -> bool:
+    def reconcile(self, reserved: int, used: int):
+        """
+        Settle a reservation with the tokens a request actually used.
+        
+        Args:
+            reserved: Tokens reserved by acquire() or wait_if_needed()
+            used: Prompt plus output tokens reported by the API
+        """
+        if self.token_rate is None or reserved == used:
+            return
+        with self.lock:
+            self._refill()
+            self.budget = min(float(self.tokens_per_minute), self.budget + reserved - used)
+            self._notify()
+    
+    def can_make_request(self, tokens: int = 0) -> bool:
         """
         Check if a request can be made without blocking.
         
+        Args:
+            tokens: Estimated tokens of the request
+            
         Returns:
             True if request can be made immediately, False otherwise
         """
         with self.lock:
-            current_time = time.time()
-            time_since_last_request = current_time - self.last_request_time
-            return time_since_last_request >= self.interval
+            self._refill()
+            return not self.waiters and self._fits(self._cost(tokens))
     
-    def time_until_next_request(self) -> float:
+    def time_until_next_request(self, tokens: int = 0) -> float:
         """
         Get the time in seconds until the next request can be made.
         
+        Args:
+            tokens: Estimated tokens of the request
+            
         Returns:
             Seconds until next request (0 if can make request now)
         """
         with self.lock:
-            current_time = time.time()
-            time_since_last_request = current_time - self.last_request_time
+            self._refill()
+            return self._fit_delay(self._cost(tokens))
+    
+    def _enqueue(self, tokens: int, wake: Callable[[], None]) -> Waiter:
+        """Queue a request."""
+        cost = self._cost(tokens)
+        if self.token_rate is not None and cost < tokens:
+            logger.warning(f"⚠️  Request of {tokens} tokens exceeds the {self.tokens_per_minute} TPM limit, reserving {int(cost)}")
+        waiter = Waiter(cost, time.monotonic(), wake)
+        with self.lock:
+            self.waiters.append(waiter)
+        return waiter
+    
+    def _dequeue(self, waiter: Waiter):
+        """Remove a request that was granted or gave up, letting the ones behind it re-check."""
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                self._notify()
+    
+    def _try_grant(self, waiter: Waiter) -> Optional[float]:
+        """
+        Let a queued request go if it fits and no earlier request has priority.
+        
+        Returns:
+            None if granted, else seconds until it is worth checking again
+        """
+        with self.lock:
+            self._refill()
+            if not self._fits(waiter.cost):
+                return max(self._fit_delay(waiter.cost), MIN_WAIT)
             
-            if time_since_last_request >= self.interval:
-                return 0.0
+            now = time.monotonic()
+            for other in self.waiters:
+                if other is waiter:
+                    break
+                if self._fits(other.cost) or now - other.since >= self._patience(other.cost):
+                    # Earlier request goes first, or the budget is being held for it
+                    return max(self._fit_delay(other.cost), MIN_WAIT)
             
-            return self.interval - time_since_last_request
+            self.tokens -= 1.0
+            self.budget -= waiter.cost
+            self.waiters.remove(waiter)
+            self._notify()
+            return None
+    
+    def _cost(self, tokens: int) -> float:
+        """Tokens a request reserves (at most one minute's budget, so it can always be served)."""
+        if self.token_rate is None:
+            return 0.0
+        return float(min(max(tokens, 0), self.tokens_per_minute))
+    
+    def _fits(self, cost: float) -> bool:
+        """Check whether a request of this cost can go now; the caller holds the lock."""
+        return self.tokens >= 1.0 and (self.token_rate is None or self.budget >= cost)
+    
+    def _fit_delay(self, cost: float) -> float:
+        """Seconds until a request of this cost fits, if nothing else is taken; the caller holds the lock."""
+        delay = max(0.0, (1.0 - self.tokens) / self.rate)
+        if self.token_rate is not None:
+            delay = max(delay, (cost - self.budget) / self.token_rate)
+        return delay
+    
+    def _patience(self, cost: float) -> float:
+        """Seconds a request may be bypassed by cheaper ones (0 without a token budget: strict FIFO)."""
+        if self.token_rate is None:
+            return 0.0
+        return cost / self.token_rate
+    
+    def _notify(self):
+        """Wake all queued requests to re-check; the caller holds the lock."""
+        for waiter in self.waiters:
+            waiter.wake()
+    
+    def _refill(self):
+        """Add the tokens accrued since the last update; the caller holds the lock."""
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        if self.token_rate is not None:
+            self.budget = min(float(self.tokens_per_minute), self.budget + elapsed * self.token_rate)
+        self.updated = now
 
 
 class MultiModelRateLimiter:
@@ -79,39 +257,71 @@ class MultiModelRateLimiter:
         self.limiters: Dict[str, RateLimiter] = {}
         self.lock = threading.Lock()
     
-    def add_model(self, model_name: str, requests_per_minute: int):
+    def add_model(
+        self,
+        model_name: str,
+        requests_per_minute: int,
+        burst: int = 1,
+        tokens_per_minute: Optional[int] = None
+    ):
         """
         Add a model to the rate limiter.
         
         Args:
             model_name: Name of the model
             requests_per_minute: Rate limit for this model
+            burst: Requests allowed back to back after an idle period
+            tokens_per_minute: Token rate limit for this model (unlimited if None)
         """
         with self.lock:
-            self.limiters[model_name] = RateLimiter(requests_per_minute)
-            logger.info(f"✅ Rate limiter configured for {model_name}: {requests_per_minute} RPM")
+            self.limiters[model_name] = RateLimiter(requests_per_minute, burst, tokens_per_minute)
+            tpm = f", {tokens_per_minute} TPM" if tokens_per_minute else ""
+            logger.info(f"✅ Rate limiter configured for {model_name}: {requests_per_minute} RPM{tpm}, burst {burst}")
     
-    def wait_if_needed(self, model_name: str):
+    def wait_if_needed(self, model_name: str, tokens: int = 0) -> int:
         """
-        Wait if necessary to respect rate limit for a specific model.
+        Wait if necessary to respect rate limit for a specific model (blocks the thread).
         
         Args:
             model_name: Name of the model to check
+            tokens: Estimated tokens of the request (prompt plus reserved output)
+            
+        Returns:
+            Tokens reserved, to be passed to reconcile()
         """
-        with self.lock:
-            if model_name not in self.limiters:
-                logger.warning(f"⚠️  No rate limiter configured for {model_name}, using default")
-                # Create a default rate limiter
-                self.limiters[model_name] = RateLimiter(3)
+        return self._limiter(model_name).wait_if_needed(tokens)
+    
+    async def acquire(self, model_name: str, tokens: int = 0) -> int:
+        """
+        Wait without blocking the event loop to respect rate limit for a specific model.
+        
+        Args:
+            model_name: Name of the model to check
+            tokens: Estimated tokens of the request (prompt plus reserved output)
+            
+        Returns:
+            Tokens reserved, to be passed to reconcile()
+        """
+        return await self._limiter(model_name).acquire(tokens)
+    
+    def reconcile(self, model_name: str, reserved: int, used: int):
+        """
+        Settle a model's token reservation with the actual usage.
         
-        self.limiters[model_name].wait_if_needed()
+        Args:
+            model_name: Name of the model
+            reserved: Tokens returned by acquire() or wait_if_needed()
+            used: Prompt plus output tokens reported by the API
+        """
+        self._limiter(model_name).reconcile(reserved, used)
     
-    def can_make_request(self, model_name: str) -> bool:
+    def can_make_request(self, model_name: str, tokens: int = 0) -> bool:
         """
         Check if a request can be made for a specific model.
         
         Args:
             model_name: Name of the model to check
+            tokens: Estimated tokens of the request
             
         Returns:
             True if request can be made, False otherwise
@@ -120,14 +330,15 @@ class MultiModelRateLimiter:
             if model_name not in self.limiters:
                 return True
         
-        return self.limiters[model_name].can_make_request()
+        return self.limiters[model_name].can_make_request(tokens)
     
-    def time_until_next_request(self, model_name: str) -> float:
+    def time_until_next_request(self, model_name: str, tokens: int = 0) -> float:
         """
         Get time until next request for a specific model.
         
         Args:
             model_name: Name of the model to check
+            tokens: Estimated tokens of the request
             
         Returns:
             Seconds until next request
@@ -136,7 +347,16 @@ class MultiModelRateLimiter:
             if model_name not in self.limiters:
                 return 0.0
         
-        return self.limiters[model_name].time_until_next_request()
+        return self.limiters[model_name].time_until_next_request(tokens)
+    
+    def _limiter(self, model_name: str) -> RateLimiter:
+        """Get the limiter of a model, creating a default one if it was not configured."""
+        with self.lock:
+            if model_name not in self.limiters:
+                logger.warning(f"⚠️  No rate limiter configured for {model_name}, using default")
+                # Create a default rate limiter
+                self.limiters[model_name] = RateLimiter(3)
+            return self.limiters[model_name]
 
 
 # Global rate limiter instance
@@ -32,6 +32,21 @@ async def startup_event():
     """Run startup tasks including auto-indexing if configured."""
     logger.info("Starting up Vibe Coding AI Agent...")
     
+    # Create graph indexes and warm up the shared graph connection pool
+    try:
+        from db.unified_graph_store import unified_graph_store
+        await unified_graph_store.initialize()
+    except Exception as e:
+        logger.error(f"Error initializing graph store: {e}")
+    
+    # Load the re-ranking model in the background so the first query does not wait for it
+    from retrieval.reranker import reranker
+    reranker.warm_up()
+    
+    # Drop cached answers and retrieval results that other workers' indexing made stale
+    from services.index_watcher import index_watcher
+    index_watcher.start()
+    
     # Auto-index repository if path is configured
     if settings.repository_path:
         logger.info(f"Auto-indexing repository: {settings.repository_path}")
@@ -45,6 +60,19 @@ async def startup_event():
         logger.info("No repository path configured for auto-indexing")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close shared database connections and persist caches."""
+    from services.index_watcher import index_watcher
+    await index_watcher.stop()
+    
+    from db.unified_graph_store import unified_graph_store
+    await unified_graph_store.close()
+    
+    from llm.embedding_cache import query_embedding_cache
+    query_embedding_cache.save()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -1,11 +1,143 @@
 """
 Context packer that respects token limits.
+
+Chunks are chosen as an approximate 0/1 knapsack: score is the value and
+tokens the cost. Candidates are taken greedily by score per token,
+skipping any that do not fit rather than stopping, and the result is
+compared with the best single chunk. That is within half of the optimum
+and close to it when chunks are small against the budget. Each file may
+use at most settings.context_file_share of the budget, so one large file
+cannot crowd out the rest.
+
+Chunks are compressed before selection, so token costs are those of the
+text actually sent. Compression modes (settings.context_compression):
+"strip" removes comments, docstrings and blank lines, "dedent" removes
+common indentation, and "signatures" reduces the functions of chunks
+ranked below settings.context_full_chunks to their signatures.
 """
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Any, Optional
+import textwrap
+
+import numpy as np
+
 from db.models import CodeChunk
+from analysis.tree_sitter_parser import parser
+from analysis.cfg_builder import FUNCTION_TYPES
 from llm.token_counter import token_counter
 from config import settings
 
+COMPRESSION_MODES = ("strip", "dedent", "signatures")
+
+
+def parse_modes(modes: str) -> Tuple[str, ...]:
+    """
+    Parse a comma-separated list of compression modes.
+    
+    Raises:
+        ValueError: If a mode is unknown
+    """
+    parsed = tuple(mode.strip() for mode in modes.split(',') if mode.strip() and mode.strip() != "none")
+    unknown = [mode for mode in parsed if mode not in COMPRESSION_MODES]
+    if unknown:
+        raise ValueError(f"Unknown compression modes {unknown}, expected some of {COMPRESSION_MODES}")
+    return parsed
+
+
+def docstring_statement(block: Any) -> Optional[Any]:
+    """Get the docstring statement of a Python module or body, unless it is the only statement."""
+    statements = [child for child in block.named_children if child.type != 'comment']
+    if len(statements) < 2:
+        return None
+    first = statements[0]
+    if first.type == 'expression_statement' and first.named_children and first.named_children[0].type == 'string':
+        return first
+    return None
+
+
+class CodeCompressor:
+    """Shrinks code chunks while keeping the code the LLM needs."""
+    
+    def __init__(self, modes: str):
+        """
+        Initialize compressor.
+        
+        Args:
+            modes: Comma-separated compression modes ("none" for none)
+        """
+        self.modes = parse_modes(modes)
+    
+    def compress(self, chunk: CodeChunk, elide_bodies: bool = False) -> CodeChunk:
+        """
+        Compress one chunk and recount its tokens.
+        
+        Args:
+            chunk: Code chunk
+            elide_bodies: Reduce functions to their signatures (with "signatures" mode)
+            
+        Returns:
+            Compressed chunk (the same chunk if nothing changed)
+        """
+        strip = "strip" in self.modes
+        elide = elide_bodies and "signatures" in self.modes
+        code = chunk.code
+        
+        if strip or elide:
+            code = self._edit_tree(chunk.file_path, code, strip, elide)
+        if "dedent" in self.modes:
+            code = textwrap.dedent(code)
+        
+        if code == chunk.code:
+            return chunk
+        return CodeChunk(
+            id=chunk.id,
+            file_path=chunk.file_path,
+            start_line=chunk.start_line,
+            end_line=chunk.end_line,
+            code=code,
+            tokens=token_counter.count_tokens(code),
+            metadata={**(chunk.metadata or {}), 'compressed': True}
+        )
+    
+    def _edit_tree(self, file_path: str, code: str, strip: bool, elide: bool) -> str:
+        """Remove comments and docstrings and/or function bodies found by tree-sitter."""
+        tree = parser.parse_file(file_path, code)
+        if tree is None:
+            return code
+        
+        # (start byte, end byte, replacement), non-overlapping
+        edits: List[Tuple[int, int, bytes]] = []
+        docstrings = set()
+        stack = [tree.root_node]
+        while stack:
+            node = stack.pop()
+            span = (node.start_byte, node.end_byte)
+            if strip and (node.type == 'comment' or span in docstrings):
+                edits.append((*span, b''))
+                continue
+            if elide and node.type in FUNCTION_TYPES:
+                body = node.child_by_field_name('body')
+                if body is not None:
+                    stub = b'{ ... }' if body.type == 'statement_block' else b'...'
+                    edits.append((body.start_byte, body.end_byte, stub))
+                    stack.extend(child for child in node.children if child != body)
+                    continue
+            if strip and node.type in ('module', 'block'):
+                docstring = docstring_statement(node)
+                if docstring is not None:
+                    docstrings.add((docstring.start_byte, docstring.end_byte))
+            stack.extend(node.children)
+        
+        if not edits:
+            return code
+        
+        source = code.encode('utf8')
+        for start, end, replacement in sorted(edits, reverse=True):
+            source = source[:start] + replacement + source[end:]
+        lines = [line.rstrip() for line in source.decode('utf8').split('\n')]
+        if strip:
+            lines = [line for line in lines if line]
+        return '\n'.join(lines)
+
 
 class ContextPacker:
     """Packs relevant code chunks into context within token limits."""
@@ -14,11 +146,91 @@ class ContextPacker:
         """Initialize context packer."""
         self.max_tokens = settings.max_tokens_per_request
         self.system_reserve = settings.system_prompt_reserve
+        self.file_share = settings.context_file_share
+        self.compressor = CodeCompressor(settings.context_compression)
+        self.full_chunks = settings.context_full_chunks
+    
+    def select(
+        self,
+        ranked_chunks: List[Tuple[CodeChunk, float]],
+        available_tokens: int
+    ) -> List[int]:
+        """
+        Choose the chunks that maximize total score within the token budget.
+        
+        Args:
+            ranked_chunks: Ranked list of (CodeChunk, score) tuples
+            available_tokens: Token budget for chunks
+            
+        Returns:
+            Indices of the chosen chunks, in rank order
+        """
+        if not ranked_chunks or available_tokens <= 0:
+            return []
+        
+        tokens = np.array([max(chunk.tokens, 1) for chunk, _ in ranked_chunks], dtype=np.int64)
+        scores = np.array([max(score, 0.0) for _, score in ranked_chunks], dtype=np.float64)
+        file_budget = self.file_share * available_tokens
+        fits = (tokens <= available_tokens) & (tokens <= file_budget)
+        
+        # Highest score per token first, rank order among ties
+        order = np.lexsort((np.arange(len(ranked_chunks)), -scores / tokens))
+        
+        def fill(chosen: List[int]) -> List[int]:
+            """Add chunks in score-per-token order wherever they still fit."""
+            chosen = list(chosen)
+            used_tokens = int(tokens[chosen].sum())
+            file_tokens: Dict[str, int] = {}
+            for i in chosen:
+                file_path = ranked_chunks[i][0].file_path
+                file_tokens[file_path] = file_tokens.get(file_path, 0) + int(tokens[i])
+            for i in order[fits[order]].tolist():
+                if i in chosen:
+                    continue
+                chunk_tokens = int(tokens[i])
+                file_path = ranked_chunks[i][0].file_path
+                if used_tokens + chunk_tokens > available_tokens:
+                    continue
+                if file_tokens.get(file_path, 0) + chunk_tokens > file_budget:
+                    continue
+                chosen.append(i)
+                used_tokens += chunk_tokens
+                file_tokens[file_path] = file_tokens.get(file_path, 0) + chunk_tokens
+            return chosen
+        
+        chosen = fill([])
+        
+        # A single high-scoring chunk can be worth more than the greedy set;
+        # the budget it leaves is filled greedily again
+        if fits.any():
+            best = int(np.argmax(np.where(fits, scores, -1.0)))
+            if scores[best] > scores[chosen].sum():
+                chosen = fill([best])
+        
+        return sorted(chosen)
+    
+    def compress(self, ranked_chunks: List[Tuple[CodeChunk, float]]) -> List[Tuple[CodeChunk, float]]:
+        """
+        Compress ranked chunks; functions below the top full_chunks may be elided.
+        
+        Args:
+            ranked_chunks: Ranked list of (CodeChunk, score) tuples
+            
+        Returns:
+            Compressed (CodeChunk, score) tuples with recounted tokens
+        """
+        if not self.compressor.modes:
+            return ranked_chunks
+        return [
+            (self.compressor.compress(chunk, elide_bodies=rank >= self.full_chunks), score)
+            for rank, (chunk, score) in enumerate(ranked_chunks)
+        ]
     
     def pack_context(
         self,
         ranked_chunks: List[Tuple[CodeChunk, float]],
-        system_prompt: str
+        system_prompt: str,
+        compress: bool = True
     ) -> Tuple[str, dict]:
         """
         Pack chunks into context within token limit.
@@ -26,6 +238,7 @@ class ContextPacker:
         Args:
             ranked_chunks: Ranked list of (CodeChunk, score) tuples
             system_prompt: System prompt to include
+            compress: Whether to compress chunks first (skipped when a request is out of time)
             
         Returns:
             Tuple of (packed_context, stats)
@@ -34,35 +247,44 @@ class ContextPacker:
         system_tokens = token_counter.count_tokens(system_prompt)
         available_tokens = self.max_tokens - system_tokens - self.system_reserve
         
-        # Pack chunks greedily
-        packed_chunks = []
-        current_tokens = 0
+        # Token costs are those of the compressed text
+        original_tokens = sum(chunk.tokens for chunk, _ in ranked_chunks)
+        if compress:
+            ranked_chunks = self.compress(ranked_chunks)
         
-        for chunk, score in ranked_chunks:
-            chunk_tokens = chunk.tokens
-            
-            if current_tokens + chunk_tokens <= available_tokens:
-                packed_chunks.append(chunk)
-                current_tokens += chunk_tokens
-            else:
-                # Try to fit a truncated version
-                remaining_tokens = available_tokens - current_tokens
-                if remaining_tokens > 100:  # Minimum useful chunk size
-                    truncated_code = token_counter.truncate_to_limit(
-                        chunk.code,
-                        remaining_tokens
-                    )
-                    truncated_chunk = CodeChunk(
-                        id=chunk.id,
-                        file_path=chunk.file_path,
-                        start_line=chunk.start_line,
-                        end_line=chunk.end_line,
-                        code=truncated_code,
-                        tokens=remaining_tokens,
-                        metadata={**chunk.metadata, 'truncated': True}
-                    )
-                    packed_chunks.append(truncated_chunk)
-                    current_tokens += remaining_tokens
+        chosen = self.select(ranked_chunks, available_tokens)
+        packed_chunks = [ranked_chunks[i][0] for i in chosen]
+        packed_score = sum(max(ranked_chunks[i][1], 0.0) for i in chosen)
+        current_tokens = sum(chunk.tokens for chunk in packed_chunks)
+        
+        # Fill what is left with the best remaining chunk, truncated
+        remaining_tokens = available_tokens - current_tokens
+        if remaining_tokens > 100:  # Minimum useful chunk size
+            chosen_set = set(chosen)
+            for i, (chunk, score) in enumerate(ranked_chunks):
+                if i in chosen_set:
+                    continue
+                file_tokens = sum(c.tokens for c in packed_chunks if c.file_path == chunk.file_path)
+                fill_tokens = min(remaining_tokens, int(self.file_share * available_tokens) - file_tokens, chunk.tokens)
+                if fill_tokens <= 100:
+                    continue
+                truncated_code = token_counter.truncate_to_limit(chunk.code, fill_tokens)
+                truncated_tokens = token_counter.count_tokens(truncated_code)
+                if truncated_tokens > fill_tokens:
+                    # Decoding a token prefix can re-tokenize to more tokens
+                    continue
+                truncated_chunk = CodeChunk(
+                    id=chunk.id,
+                    file_path=chunk.file_path,
+                    start_line=chunk.start_line,
+                    end_line=chunk.end_line,
+                    code=truncated_code,
+                    tokens=truncated_tokens,
+                    metadata={**(chunk.metadata or {}), 'truncated': truncated_code != chunk.code}
+                )
+                packed_chunks.insert(sum(1 for j in chosen if j < i), truncated_chunk)
+                packed_score += max(score, 0.0) * min(1.0, truncated_tokens / max(chunk.tokens, 1))
+                current_tokens += truncated_tokens
                 break
         
         # Build context string
@@ -76,6 +298,7 @@ class ContextPacker:
         context = "\n".join(context_parts)
         
         # Calculate stats
+        total_score = sum(max(score, 0.0) for _, score in ranked_chunks)
         stats = {
             "total_chunks": len(ranked_chunks),
             "packed_chunks": len(packed_chunks),
@@ -84,7 +307,12 @@ class ContextPacker:
             "total_tokens": system_tokens + current_tokens,
             "utilization": (system_tokens + current_tokens) / self.max_tokens,
             "available_tokens": available_tokens,
-            "used_tokens": current_tokens
+            "used_tokens": current_tokens,
+            "budget_utilization": current_tokens / available_tokens if available_tokens > 0 else 0.0,
+            "packed_score": packed_score,
+            "relevance": packed_score / total_score if total_score > 0 else 0.0,
+            "compression": ",".join(self.compressor.modes) if compress and self.compressor.modes else "none",
+            "compressed_tokens_saved": original_tokens - sum(chunk.tokens for chunk, _ in ranked_chunks)
         }
         
         return context, stats
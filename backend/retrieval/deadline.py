@@ -0,0 +1,97 @@
+"""
+Per-request latency budget shared by the retrieval stages.
+
+A request starts one Deadline for settings.retrieval_budget_ms. Each
+stage runs under a slice of it (never more than what is left) and, when
+the slice runs out, the stage is skipped or returns what it has, so
+retrieval latency is bounded by configuration rather than by the
+slowest dependency. Degraded stages are recorded for the response.
+"""
+from typing import Any, Awaitable, Dict
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largest share of the budget each awaited stage may use
+STAGE_SHARES = {
+    "embedding": 0.3,
+    "vector_search": 0.4
+}
+
+
+class Deadline:
+    """Latency budget of one request."""
+    
+    def __init__(self, budget_ms: float):
+        """
+        Start the budget now.
+        
+        Args:
+            budget_ms: Total budget in milliseconds
+        """
+        self.loop = asyncio.get_running_loop()
+        self.budget = budget_ms / 1000
+        self.started_at = self.loop.time()
+        self.expires_at = self.started_at + self.budget
+        self.degraded: Dict[str, str] = {}
+    
+    def remaining(self) -> float:
+        """Get the seconds left in the budget."""
+        return max(0.0, self.expires_at - self.loop.time())
+    
+    def expired(self) -> bool:
+        """Check whether the budget is used up."""
+        return self.remaining() == 0.0
+    
+    def elapsed_ms(self) -> float:
+        """Get the milliseconds since the budget started."""
+        return (self.loop.time() - self.started_at) * 1000
+    
+    def timeout(self, stage: str) -> float:
+        """Get a stage's time slice in seconds (its share of the budget, at most what is left)."""
+        return min(self.remaining(), STAGE_SHARES.get(stage, 1.0) * self.budget)
+    
+    def degrade(self, stage: str, reason: str):
+        """Record that a stage was skipped or cut short."""
+        self.degraded.setdefault(stage, reason)
+        logger.info(f"Retrieval stage '{stage}' degraded: {reason}")
+    
+    def allows(self, stage: str) -> bool:
+        """Check whether an optional stage still fits, recording it as degraded if not."""
+        if self.expired():
+            self.degrade(stage, "skipped, budget exhausted")
+            return False
+        return True
+    
+    async def run(self, stage: str, coroutine: Awaitable, fallback: Any = None) -> Any:
+        """
+        Await a stage within its time slice.
+        
+        Args:
+            stage: Stage name
+            coroutine: Stage coroutine
+            fallback: Result if the stage is skipped or times out
+            
+        Returns:
+            Stage result, or the fallback
+        """
+        timeout = self.timeout(stage)
+        if timeout <= 0:
+            coroutine.close()
+            self.degrade(stage, "skipped, budget exhausted")
+            return fallback
+        
+        try:
+            return await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            self.degrade(stage, f"timed out after {timeout * 1000:.0f}ms")
+            return fallback
+    
+    def report(self) -> dict:
+        """Get the budget outcome for context_stats."""
+        return {
+            "budget_ms": self.budget * 1000,
+            "elapsed_ms": round(self.elapsed_ms(), 1),
+            "degraded": dict(self.degraded)
+        }
@@ -1,61 +1,224 @@
 """
 Graph-based search using ASG and CFG.
 """
-from typing import List, Dict, Any
-from db.graph_store import GraphStore
+from typing import List, Dict, Any, Optional
+import asyncio
+import re
+from db.models import CodeChunk
+from db.unified_graph_store import unified_graph_store
+from analysis.reachability import reachability_index
+from analysis.cfg_paths import cfg_path_analyzer
 from config import settings
 
+QUOTED_PATTERN = re.compile(r"`([^`]+)`")
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*(\()?")
+
+
+def question_identifiers(question: str, limit: int = 5) -> List[str]:
+    """
+    Pick the words of a question that look like code names.
+    
+    Backticked names, snake_case, camelCase/PascalCase, dotted paths and
+    calls like ``run()`` count; for dotted paths the last segment is used.
+    
+    Args:
+        question: Natural-language question
+        limit: Maximum names returned
+        
+    Returns:
+        Names in order of appearance, without duplicates
+    """
+    names = [quoted.strip("()").split(".")[-1] for quoted in QUOTED_PATTERN.findall(question)]
+    for match in WORD_PATTERN.finditer(question):
+        word = match.group(0).rstrip("(")
+        if (
+            match.group(1)
+            or "_" in word
+            or "." in word
+            or any(c.isupper() for c in word[1:])
+        ):
+            names.append(word.split(".")[-1])
+    return [name for name in dict.fromkeys(names) if name][:limit]
+
 
 class GraphSearch:
     """Performs graph-based code search."""
     
     def __init__(self):
-        """Initialize graph search with graph store."""
-        self.graph_store = GraphStore(
-            uri=settings.graph_db_url,
-            user=settings.graph_db_user,
-            password=settings.graph_db_password
-        )
+        """Initialize graph search with the shared graph store."""
+        self.graph_store = unified_graph_store
+        self.reachability = reachability_index
+        self.cfg_paths = cfg_path_analyzer
     
-    def expand_neighbors(self, node_ids: List[str], max_depth: int = 2) -> List[Dict[str, Any]]:
+    async def expand_neighbors(
+        self,
+        node_ids: List[str],
+        max_depth: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        direction: str = "both"
+    ) -> List[Dict[str, Any]]:
         """
-        Expand neighbors in the ASG.
+        Expand neighbors in the ASG from all seeds in one bounded traversal.
+        
+        Fan-out per node and the total result count are capped by
+        settings.graph_expand_fanout and settings.graph_expand_limit.
         
         Args:
             node_ids: Starting node IDs
             max_depth: Maximum traversal depth
+            relationship_types: Relationship types to follow (all if None)
+            direction: "out", "in" or "both"
+            
+        Returns:
+            List of expanded node dictionaries with "hop" and "score", nearest first
+        """
+        if not node_ids:
+            return []
+        
+        return await self.graph_store.get_neighbors_multi(
+            node_ids,
+            max_depth,
+            relationship_types,
+            direction,
+            settings.graph_expand_fanout,
+            settings.graph_expand_limit
+        )
+    
+    async def expand_question(self, question: str) -> List[Dict[str, Any]]:
+        """
+        Find the code nodes a question names and expand around them.
+        
+        Args:
+            question: Natural-language question
             
         Returns:
-            List of expanded node dictionaries
+            Matched nodes followed by their expanded neighbors
+        """
+        names = question_identifiers(question)
+        if not names:
+            return []
+        
+        results = await asyncio.gather(*[self.search_by_name(name, limit=5) for name in names])
+        matches = list({node["id"]: node for nodes in results for node in nodes}.values())
+        if not matches:
+            return []
+        return matches + await self.expand_neighbors([node["id"] for node in matches])
+    
+    async def expand_chunks(self, chunks: List[CodeChunk]) -> List[Dict[str, Any]]:
         """
-        all_neighbors = []
-        seen_ids = set()
+        Expand around the ASG nodes that chunks cover.
         
-        for node_id in node_ids:
-            neighbors = self.graph_store.get_neighbors(node_id, max_depth)
-            for neighbor in neighbors:
-                if neighbor['id'] not in seen_ids:
-                    all_neighbors.append(neighbor)
-                    seen_ids.add(neighbor['id'])
+        Uses the node IDs attached to each chunk's metadata at index time.
         
-        return all_neighbors
+        Args:
+            chunks: Retrieved code chunks, e.g. the top vector hits
+            
+        Returns:
+            Expanded neighbor nodes
+        """
+        node_ids = list(dict.fromkeys(
+            node_id for chunk in chunks for node_id in (chunk.metadata or {}).get('node_ids', [])
+        ))
+        return await self.expand_neighbors(node_ids)
     
-    def get_cfg_paths(self, function_ids: List[str]) -> Dict[str, List[List[str]]]:
+    async def get_cfg_paths(
+        self,
+        function_ids: List[str],
+        k: Optional[int] = None,
+        strategy: str = "shortest"
+    ) -> Dict[str, List[List[str]]]:
         """
         Get CFG paths for multiple functions.
         
+        CFGs are loaded from the graph store and analyzed in process on
+        their acyclic form (each loop body taken at most once), so the work
+        per function is bounded by its CFG size and k.
+        
         Args:
             function_ids: List of function node IDs
+            k: Maximum paths per function (settings.cfg_path_limit if None)
+            strategy: "shortest" (k shortest paths) or "diverse" (paths covering the most blocks)
             
         Returns:
-            Dictionary mapping function ID to list of paths
+            Dictionary mapping function ID to list of paths (lists of basic block IDs)
         """
-        paths = {}
-        for function_id in function_ids:
-            paths[function_id] = self.graph_store.get_cfg_paths(function_id)
-        return paths
+        k = k or settings.cfg_path_limit
+        cfgs = await self._load_cfgs(function_ids)
+        return {
+            function_id: self.cfg_paths.paths(cfg, k, strategy) if cfg is not None else []
+            for function_id, cfg in zip(function_ids, cfgs)
+        }
+    
+    async def count_cfg_paths(self, function_ids: List[str]) -> Dict[str, int]:
+        """
+        Count the CFG paths of multiple functions without enumerating them.
+        
+        Args:
+            function_ids: List of function node IDs
+            
+        Returns:
+            Dictionary mapping function ID to its number of paths (0 if it has no CFG)
+        """
+        cfgs = await self._load_cfgs(function_ids)
+        return {
+            function_id: self.cfg_paths.count(cfg) if cfg is not None else 0
+            for function_id, cfg in zip(function_ids, cfgs)
+        }
+    
+    async def _load_cfgs(self, function_ids: List[str]) -> list:
+        """Load the CFGs of several functions concurrently."""
+        return await asyncio.gather(*[
+            self.graph_store.get_cfg(function_id) for function_id in function_ids
+        ])
+    
+    async def get_transitive_callers(
+        self,
+        node_id: str,
+        max_depth: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get everything that eventually calls a function.
+        
+        Answered in memory from the call graph's reachability index.
+        
+        Args:
+            node_id: Function or class node ID
+            max_depth: Maximum call depth (unbounded if None)
+            limit: Maximum nodes returned (settings.reachability_limit if None)
+            
+        Returns:
+            Node dictionaries (id, name, file_path, depth), nearest first
+        """
+        return self.reachability.callers(node_id, max_depth, limit or settings.reachability_limit)
+    
+    async def get_transitive_callees(
+        self,
+        node_id: str,
+        max_depth: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get everything a function eventually calls, i.e. what its behavior depends on.
+        
+        Changes to these nodes may affect it; its transitive callers are
+        what changing it may affect.
+        
+        Args:
+            node_id: Function or class node ID
+            max_depth: Maximum call depth (unbounded if None)
+            limit: Maximum nodes returned (settings.reachability_limit if None)
+            
+        Returns:
+            Node dictionaries (id, name, file_path, depth), nearest first
+        """
+        return self.reachability.callees(node_id, max_depth, limit or settings.reachability_limit)
+    
+    async def calls_transitively(self, caller_id: str, callee_id: str) -> bool:
+        """Check whether one function eventually calls another."""
+        return self.reachability.reaches(caller_id, callee_id)
     
-    def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def search_by_name(self, name: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Search for code nodes by name.
         
@@ -66,11 +229,11 @@ class GraphSearch:
         Returns:
             List of matching nodes
         """
-        return self.graph_store.search_by_name(name, limit)
+        return await self.graph_store.search_by_name(name, limit)
     
-    def get_stats(self) -> dict:
+    async def get_stats(self) -> dict:
         """Get graph store statistics."""
-        return self.graph_store.get_stats()
+        return await self.graph_store.get_stats()
 
 
 # Global graph search instance
@@ -0,0 +1,66 @@
+"""
+Shared context-building pipeline of the chat, debug and plan endpoints.
+
+Candidates are retrieved (vector search by default), re-ranked by the
+cross-encoder, merged into non-overlapping spans and packed into the
+token budget left by the endpoint's prompt. Results are cached per
+endpoint and query; results of degraded retrievals are not cached, so
+a slow moment does not pin a worse context for later requests.
+"""
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from db.models import CodeChunk
+from retrieval.deadline import Deadline
+from retrieval.vector_search import vector_search
+from retrieval.reranker import reranker
+from retrieval.span_merger import span_merger
+from retrieval.context_packer import context_packer
+from services.retrieval_cache import retrieval_cache
+
+RankedChunks = List[Tuple[CodeChunk, float]]
+
+
+async def build_context(
+    endpoint: str,
+    query: str,
+    prompt: str,
+    deadline: Deadline,
+    k: int = 20,
+    candidates: Optional[Callable[[], Awaitable[RankedChunks]]] = None
+) -> Tuple[str, dict, frozenset]:
+    """
+    Retrieve, re-rank and pack the context for a query, reusing a cached result.
+    
+    Args:
+        endpoint: Endpoint name, keeping each endpoint's cached results apart
+        query: Search query
+        prompt: Prompt the context is sent with, whose tokens the budget leaves room for
+        deadline: Request latency budget
+        k: Number of vector results (with the default retrieval)
+        candidates: First-stage retrieval returning ranked candidates (vector search if None)
+        
+    Returns:
+        (packed context, context stats, files the candidates came from)
+    """
+    cached = retrieval_cache.get(endpoint, query)
+    if cached is not None:
+        stats = {**cached.context_stats, "retrieval_cache": {"hit": True}, "deadline": deadline.report()}
+        return cached.context, stats, cached.files
+    
+    if candidates is None:
+        ranked_chunks = await vector_search.search_within(query, deadline, k=k)
+    else:
+        ranked_chunks = await candidates()
+    
+    # Re-rank, then merge overlapping chunks so no line is packed twice
+    ranked_chunks = await reranker.rerank(query, ranked_chunks, deadline)
+    ranked_chunks = await span_merger.merge(ranked_chunks)
+    
+    context, stats = context_packer.pack_context(
+        ranked_chunks, prompt, compress=deadline.allows("compression")
+    )
+    
+    if not deadline.degraded:
+        retrieval_cache.put(endpoint, query, ranked_chunks, context, stats)
+    files = frozenset(chunk.file_path for chunk, _ in ranked_chunks)
+    return context, {**stats, "retrieval_cache": {"hit": False}, "deadline": deadline.report()}, files
@@ -1,23 +1,114 @@
 """
 Hybrid ranker combining vector and graph signals.
+
+Graph proximity is the fraction of a chunk's lines covered by expanded
+graph nodes. Node spans are merged into sorted, disjoint intervals on one
+line axis (each file offset into its own range), so the covered lines of
+every candidate come from two binary searches into prefix sums of
+interval lengths, whatever the size of the nodes.
 """
 from typing import List, Tuple, Dict, Any
+
+import numpy as np
+
 from db.models import CodeChunk
+from analysis.call_graph import call_graph
+
+# Line axis offset between files, larger than any line number
+FILE_STRIDE = 1 << 32
+
+
+class IntervalIndex:
+    """Union of graph node line spans, for covered-line counts over many ranges."""
+    
+    def __init__(self, graph_nodes: List[Dict[str, Any]]):
+        """
+        Merge node spans per file into disjoint intervals.
+        
+        Args:
+            graph_nodes: Graph nodes with file_path, start_line and end_line
+        """
+        self.files: Dict[str, int] = {}
+        starts, ends = [], []
+        for node in graph_nodes:
+            start_line = node.get('start_line', 0)
+            end_line = node.get('end_line', 0)
+            if end_line < start_line:
+                continue
+            offset = self.files.setdefault(node.get('file_path', ''), len(self.files)) * FILE_STRIDE
+            starts.append(offset + start_line)
+            ends.append(offset + end_line)
+        
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        
+        # An interval starts a new run unless it overlaps or touches the ones before it
+        reach = np.maximum.accumulate(ends) if ends.size else ends
+        new_run = np.ones(starts.size, dtype=bool)
+        new_run[1:] = starts[1:] > reach[:-1] + 1
+        run_starts = np.flatnonzero(new_run)
+        
+        self.starts = starts[run_starts]
+        self.ends = np.maximum.reduceat(ends, run_starts) if run_starts.size else ends
+        self.lengths = self.ends - self.starts + 1
+        self.covered_before = np.concatenate(([0], np.cumsum(self.lengths)))
+    
+    def covered_through(self, positions: np.ndarray) -> np.ndarray:
+        """Count covered lines at or before each position on the line axis (needs intervals)."""
+        runs = np.searchsorted(self.starts, positions, side="right")
+        last = np.maximum(runs - 1, 0)
+        partial = np.clip(positions - self.starts[last] + 1, 0, self.lengths[last])
+        return np.where(runs > 0, self.covered_before[last] + partial, 0)
+    
+    def overlap(self, file_paths: List[str], start_lines: np.ndarray, end_lines: np.ndarray) -> np.ndarray:
+        """
+        Get the fraction of each line range covered by the indexed spans.
+        
+        Args:
+            file_paths: File of each range
+            start_lines: First line of each range
+            end_lines: Last line of each range
+            
+        Returns:
+            Covered fraction per range in [0, 1]
+        """
+        file_rows = np.array([self.files.get(file_path, -1) for file_path in file_paths], dtype=np.int64)
+        result = np.zeros(len(file_paths), dtype=np.float64)
+        known = (file_rows >= 0) & (end_lines >= start_lines)
+        if not known.any() or self.starts.size == 0:
+            return result
+        
+        offsets = file_rows[known] * FILE_STRIDE
+        first = offsets + start_lines[known]
+        last = offsets + end_lines[known]
+        covered = self.covered_through(last) - self.covered_through(first - 1)
+        result[known] = covered / (last - first + 1)
+        return result
 
 
 class HybridRanker:
     """Ranks results using both semantic and graph signals."""
     
-    def __init__(self, vector_weight: float = 0.6, graph_weight: float = 0.4):
+    def __init__(
+        self,
+        vector_weight: float = 0.6,
+        graph_weight: float = 0.4,
+        centrality_share: float = 0.5
+    ):
         """
         Initialize ranker.
         
         Args:
             vector_weight: Weight for vector similarity scores
-            graph_weight: Weight for graph centrality scores
+            graph_weight: Weight for graph scores
+            centrality_share: Part of the graph score from call graph centrality;
+                the rest comes from overlap with expanded graph nodes
         """
         self.vector_weight = vector_weight
         self.graph_weight = graph_weight
+        self.centrality_share = centrality_share
     
     def rank(
         self,
@@ -27,6 +118,9 @@ class HybridRanker:
         """
         Rank code chunks using hybrid scoring.
         
+        All candidates are scored together; the cost grows with the number
+        of candidates and graph nodes, not with the lines they span.
+        
         Args:
             vector_results: Vector search results with similarity scores
             graph_nodes: Graph nodes from ASG expansion
@@ -34,38 +128,34 @@ class HybridRanker:
         Returns:
             Ranked list of (CodeChunk, score) tuples
         """
-        # Build graph node set for quick lookup
-        graph_file_lines = set()
-        for node in graph_nodes:
-            file_path = node.get('file_path', '')
-            start_line = node.get('start_line', 0)
-            end_line = node.get('end_line', 0)
-            for line in range(start_line, end_line + 1):
-                graph_file_lines.add((file_path, line))
-        
-        # Score each vector result
-        scored_results = []
-        for chunk, vector_score in vector_results:
-            # Check if chunk overlaps with graph nodes
-            graph_score = 0.0
-            chunk_lines = range(chunk.start_line, chunk.end_line + 1)
-            for line in chunk_lines:
-                if (chunk.file_path, line) in graph_file_lines:
-                    graph_score = 1.0
-                    break
-            
-            # Combined score
-            combined_score = (
-                self.vector_weight * vector_score +
-                self.graph_weight * graph_score
-            )
-            
-            scored_results.append((chunk, combined_score))
+        if not vector_results:
+            return []
+        
+        chunks = [chunk for chunk, _ in vector_results]
+        vector_scores = np.array([score for _, score in vector_results], dtype=np.float64)
+        
+        # Fraction of each chunk's lines covered by expanded graph nodes
+        proximity = IntervalIndex(graph_nodes).overlap(
+            [chunk.file_path for chunk in chunks],
+            np.array([chunk.start_line for chunk in chunks], dtype=np.int64),
+            np.array([chunk.end_line for chunk in chunks], dtype=np.int64)
+        )
+        
+        # Precomputed centrality of the nodes each chunk covers (array lookups)
+        centrality = call_graph.scores([(chunk.metadata or {}).get('node_ids', []) for chunk in chunks])
         
-        # Sort by combined score (descending)
-        scored_results.sort(key=lambda x: x[1], reverse=True)
+        graph_scores = (
+            self.centrality_share * centrality +
+            (1 - self.centrality_share) * proximity
+        )
+        combined_scores = (
+            self.vector_weight * vector_scores +
+            self.graph_weight * graph_scores
+        )
         
-        return scored_results
+        # Sort by combined score (descending), keeping input order among ties
+        order = np.argsort(-combined_scores, kind="stable")
+        return [(chunks[i], float(combined_scores[i])) for i in order]
     
     def deduplicate(
         self,
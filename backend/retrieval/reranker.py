@@ -0,0 +1,213 @@
+"""
+Second-stage re-ranking with a local cross-encoder.
+
+The top candidates of the first-stage ranking are scored against the
+query by a small cross-encoder in one batch on a dedicated thread, so
+the event loop never runs the model. Scores are cached per (query,
+chunk) content hash. If scoring does not finish within
+settings.rerank_timeout_ms, the first-stage order is kept. A batch that
+is already running completes in the background and fills the cache for
+the next identical query; one still queued behind it is dropped, so
+slow scoring cannot build up a backlog.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+
+from db.models import CodeChunk
+from retrieval.deadline import Deadline
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """Hash text for score cache keys."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def rerank_text(chunk: CodeChunk) -> str:
+    """Get the document side of a cross-encoder pair."""
+    return f"{chunk.file_path}\n{chunk.code}"
+
+
+class CrossEncoderReranker:
+    """Re-scores top candidates with a cross-encoder under a latency cap."""
+    
+    def __init__(
+        self,
+        model_name: str,
+        top_n: int = 30,
+        timeout_ms: int = 300,
+        cache_size: int = 4096,
+        enabled: bool = True
+    ):
+        """
+        Initialize reranker (the model is loaded on first use).
+        
+        Args:
+            model_name: HuggingFace cross-encoder model name
+            top_n: Number of first-stage candidates re-scored
+            timeout_ms: Latency cap after which first-stage order is kept
+            cache_size: Number of (query, chunk) scores kept
+            enabled: Whether re-ranking runs at all
+        """
+        self.model_name = model_name
+        self.top_n = top_n
+        self.timeout_ms = timeout_ms
+        self.cache_size = cache_size
+        self.enabled = enabled
+        
+        self.model = None
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One worker: batches run one at a time and the model loads once
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+    
+    async def rerank(
+        self,
+        query: str,
+        ranked_chunks: List[Tuple[CodeChunk, float]],
+        deadline: Optional[Deadline] = None
+    ) -> List[Tuple[CodeChunk, float]]:
+        """
+        Re-rank the top candidates by cross-encoder relevance.
+        
+        Re-scored chunks get the sigmoid of the cross-encoder score;
+        the remaining chunks keep their order below them. With a request
+        deadline, scoring waits at most for what is left of it; once it
+        is used up, only fully cached scores are applied.
+        
+        Args:
+            query: Search query
+            ranked_chunks: First-stage ranked list of (CodeChunk, score) tuples
+            deadline: Request latency budget
+            
+        Returns:
+            Re-ranked (CodeChunk, score) tuples, or the input on timeout or error
+        """
+        if not self.enabled or not ranked_chunks:
+            return ranked_chunks
+        
+        head = ranked_chunks[:self.top_n]
+        query_key = content_hash(query)
+        keys = [(query_key, content_hash(rerank_text(chunk))) for chunk, _ in head]
+        
+        scores = self._cached(keys)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            timeout = self.timeout_ms / 1000
+            if deadline is not None:
+                timeout = min(timeout, deadline.remaining())
+                if timeout <= 0:
+                    deadline.degrade("rerank", "skipped, budget exhausted")
+                    return ranked_chunks
+            
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.executor,
+                self._score,
+                query,
+                [head[i][0] for i in missing],
+                [keys[i] for i in missing]
+            )
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+            if not done:
+                # Drops the batch if it has not started; a running one finishes
+                future.cancel()
+                self.timeouts += 1
+                logger.info(f"Re-ranking over {timeout * 1000:.0f}ms budget, keeping first-stage order")
+                if deadline is not None:
+                    deadline.degrade("rerank", f"timed out after {timeout * 1000:.0f}ms")
+                return ranked_chunks
+            if future.exception() is not None:
+                logger.warning(f"Re-ranking failed, keeping first-stage order: {future.exception()}")
+                return ranked_chunks
+            for i, score in zip(missing, future.result()):
+                scores[i] = score
+        
+        reranked = sorted(
+            ((chunk, score) for (chunk, _), score in zip(head, scores)),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        
+        # Keep the rest below the re-scored head
+        floor = reranked[-1][1]
+        reranked.extend((chunk, min(score, floor)) for chunk, score in ranked_chunks[self.top_n:])
+        return reranked
+    
+    def warm_up(self):
+        """Start loading the model on the reranker thread, without waiting for it."""
+        if self.enabled:
+            self.executor.submit(self._load_model)
+    
+    def get_stats(self) -> dict:
+        """Get reranker statistics."""
+        return {
+            "enabled": self.enabled,
+            "model": self.model_name,
+            "loaded": self.model is not None,
+            "cached_scores": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts
+        }
+    
+    def _cached(self, keys: List[Tuple[str, str]]) -> List[Optional[float]]:
+        """Look up cached scores, None where missing."""
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            hits = sum(score is not None for score in scores)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return scores
+    
+    def _score(self, query: str, chunks: List[CodeChunk], keys: List[Tuple[str, str]]) -> List[float]:
+        """Score chunks in one forward pass and cache the results (runs on the executor)."""
+        self._load_model()
+        logits = self.model.predict(
+            [(query, rerank_text(chunk)) for chunk in chunks],
+            batch_size=len(chunks),
+            show_progress_bar=False
+        )
+        scores = [1.0 / (1.0 + math.exp(-float(logit))) for logit in logits]
+        
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+    
+    def _load_model(self):
+        """Load the cross-encoder on first use (runs on the executor)."""
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            logger.info(f"Loading cross-encoder model: {self.model_name}")
+            self.model = CrossEncoder(self.model_name, device="cpu")
+
+
+# Global reranker instance
+reranker = CrossEncoderReranker(
+    settings.rerank_model,
+    top_n=settings.rerank_top_n,
+    timeout_ms=settings.rerank_timeout_ms,
+    cache_size=settings.rerank_cache_size,
+    enabled=settings.rerank_enabled
+)
@@ -0,0 +1,153 @@
+"""
+Span merger that removes repeated lines before context packing.
+
+Chunks overlap by design (CodeChunker carries chunk_overlap tokens into
+the next chunk), so adjacent hits would repeat lines in the prompt.
+Overlapping and adjacent ranges of a file are united into one span that
+keeps the best score, and its text is sliced from the source file.
+"""
+from typing import List, Tuple, Dict, Optional
+import asyncio
+import hashlib
+import logging
+
+from db.models import CodeChunk
+from llm.token_counter import token_counter
+
+logger = logging.getLogger(__name__)
+
+
+def covers_range(chunk: CodeChunk) -> bool:
+    """Check whether a chunk's code is exactly its line range (not a summary)."""
+    return chunk.code.count('\n') == chunk.end_line - chunk.start_line
+
+
+class SpanMerger:
+    """Unites overlapping and adjacent chunks of the same file."""
+    
+    async def merge(self, ranked_chunks: List[Tuple[CodeChunk, float]]) -> List[Tuple[CodeChunk, float]]:
+        """
+        Merge overlapping and adjacent chunks per file.
+        
+        Chunks whose code is not a verbatim line range (file summaries)
+        are passed through unchanged. Source files are read on the
+        default executor, so the event loop never waits on disk.
+        
+        Args:
+            ranked_chunks: Ranked list of (CodeChunk, score) tuples
+            
+        Returns:
+            (CodeChunk, score) tuples without repeated lines, best score first
+        """
+        by_file: Dict[str, List[Tuple[CodeChunk, float]]] = {}
+        merged = []
+        for chunk, score in ranked_chunks:
+            if covers_range(chunk):
+                by_file.setdefault(chunk.file_path, []).append((chunk, score))
+            else:
+                merged.append((chunk, score))
+        
+        groups_by_file = {file_path: self._group(chunks) for file_path, chunks in by_file.items()}
+        
+        # Only files with something to merge are read, all at once
+        to_read = [
+            file_path for file_path, groups in groups_by_file.items()
+            if any(len(group) > 1 for group in groups)
+        ]
+        loop = asyncio.get_running_loop()
+        sources = await asyncio.gather(*[
+            loop.run_in_executor(None, self._read_lines, file_path) for file_path in to_read
+        ])
+        source_lines = dict(zip(to_read, sources))
+        
+        for file_path, groups in groups_by_file.items():
+            merged.extend(self._merge_group(group, source_lines.get(file_path)) for group in groups)
+        
+        # Best score first
+        merged.sort(key=lambda item: item[1], reverse=True)
+        return merged
+    
+    def _group(self, chunks: List[Tuple[CodeChunk, float]]) -> List[List[Tuple[CodeChunk, float]]]:
+        """Split one file's chunks into runs of overlapping or adjacent line ranges."""
+        chunks = sorted(chunks, key=lambda item: (item[0].start_line, item[0].end_line))
+        groups = [[chunks[0]]]
+        end_line = chunks[0][0].end_line
+        for chunk, score in chunks[1:]:
+            if chunk.start_line <= end_line + 1:
+                groups[-1].append((chunk, score))
+            else:
+                groups.append([(chunk, score)])
+            end_line = max(end_line, chunk.end_line)
+        return groups
+    
+    def _merge_group(
+        self,
+        group: List[Tuple[CodeChunk, float]],
+        source_lines: Optional[List[str]]
+    ) -> Tuple[CodeChunk, float]:
+        """Unite a run of overlapping chunks (sorted by start line) into one span."""
+        if len(group) == 1:
+            return group[0]
+        
+        chunks = [chunk for chunk, _ in group]
+        best_chunk, best_score = max(group, key=lambda item: item[1])
+        start_line = chunks[0].start_line
+        end_line = max(chunk.end_line for chunk in chunks)
+        
+        code = self._slice_source(chunks, source_lines)
+        if code is None:
+            code = self._stitch(chunks)
+        
+        node_ids = []
+        for chunk in chunks:
+            node_ids.extend((chunk.metadata or {}).get('node_ids', []))
+        
+        file_path = best_chunk.file_path
+        return CodeChunk(
+            id=hashlib.md5(f"{file_path}:{start_line}-{end_line}".encode()).hexdigest(),
+            file_path=file_path,
+            start_line=start_line,
+            end_line=end_line,
+            code=code,
+            tokens=token_counter.count_tokens(code),
+            metadata={
+                **(best_chunk.metadata or {}),
+                'node_ids': list(dict.fromkeys(node_ids)),
+                'merged_from': [chunk.id for chunk in chunks]
+            }
+        ), best_score
+    
+    def _slice_source(self, chunks: List[CodeChunk], source_lines: Optional[List[str]]) -> Optional[str]:
+        """Slice a span from the source, or None if the file changed since indexing."""
+        if source_lines is None:
+            return None
+        
+        for chunk in chunks:
+            if '\n'.join(source_lines[chunk.start_line - 1:chunk.end_line]) != chunk.code:
+                return None
+        
+        end_line = max(chunk.end_line for chunk in chunks)
+        return '\n'.join(source_lines[chunks[0].start_line - 1:end_line])
+    
+    def _stitch(self, chunks: List[CodeChunk]) -> str:
+        """Join the chunks' own lines, skipping lines an earlier chunk already has."""
+        lines = []
+        end_line = chunks[0].start_line - 1
+        for chunk in chunks:
+            if chunk.end_line > end_line:
+                lines.extend(chunk.code.split('\n')[end_line + 1 - chunk.start_line:])
+                end_line = chunk.end_line
+        return '\n'.join(lines)
+    
+    def _read_lines(self, file_path: str) -> Optional[List[str]]:
+        """Read a source file's lines, or None if it cannot be read."""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return f.read().split('\n')
+        except (OSError, UnicodeDecodeError) as e:
+            logger.debug(f"Cannot re-slice {file_path} from source: {e}")
+            return None
+
+
+# Global span merger instance
+span_merger = SpanMerger()
@@ -1,10 +1,14 @@
 """
 Vector similarity search using the vector store.
 """
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional
+import asyncio
 from db.models import CodeChunk
-from db.vector_store import VectorStore
+from db.vector_store import get_vector_store, get_file_vector_store
 from llm.embeddings import embedding_generator
+from llm.embedding_cache import query_embedding_cache
+from retrieval.deadline import Deadline
 from config import settings
 
 
@@ -12,25 +16,48 @@ class VectorSearch:
     """Performs vector similarity search."""
     
     def __init__(self):
-        """Initialize vector search with vector store."""
-        self.vector_store = VectorStore(settings.vector_db_path)
+        """Initialize vector search with the shared vector store."""
+        self.vector_store = get_vector_store(
+            settings.vector_db_path,
+            num_shards=settings.vector_shards,
+            strategy=settings.vector_shard_strategy,
+            use_workers=settings.vector_shard_workers
+        )
+        self.file_store = get_file_vector_store(settings.vector_db_path)
+        # FAISS releases the GIL, so searches on this pool run in parallel
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.vector_search_workers,
+            thread_name_prefix="vector-search"
+        )
     
-    async def search(self, query: str, k: int = 10) -> List[Tuple[CodeChunk, float]]:
+    async def search(
+        self,
+        query: str,
+        k: int = 10,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Tuple[CodeChunk, float]]:
         """
         Search for relevant code chunks using vector similarity.
         
+        With hierarchical search enabled, the file-level index picks
+        candidate files first and only their chunks are compared.
+        
         Args:
             query: Search query
             k: Number of results to return
+            query_embedding: Precomputed query embedding (embedded here if None)
             
         Returns:
             List of (CodeChunk, similarity_score) tuples
         """
-        # Generate query embedding
-        query_embedding = await embedding_generator.generate_query_embedding(query)
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
         
-        # Search vector store
-        results = self.vector_store.search(query_embedding, k=k)
+        # Search vector store off the event loop
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self.executor, self._search, query_embedding, k
+        )
         
         # Convert distances to similarity scores (lower distance = higher similarity)
         # Using inverse distance as similarity
@@ -41,6 +68,72 @@ class VectorSearch:
         
         return scored_results
     
+    async def search_within(
+        self,
+        query: str,
+        deadline: Deadline,
+        k: int = 10,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Tuple[CodeChunk, float]]:
+        """
+        Search within a request's latency budget.
+        
+        Query embedding and the index search each run under their slice
+        of the budget; either running out yields no vector results.
+        
+        Args:
+            query: Search query
+            deadline: Request latency budget
+            k: Number of results to return
+            query_embedding: Query embedding, if the request already has one
+            
+        Returns:
+            List of (CodeChunk, similarity_score) tuples (empty if degraded)
+        """
+        if query_embedding is None and "embedding" not in deadline.degraded:
+            query_embedding = await deadline.run("embedding", self.embed_query(query))
+        if query_embedding is None:
+            deadline.degrade("vector_search", "skipped, no query embedding")
+            return []
+        return await deadline.run("vector_search", self.search(query, k, query_embedding), [])
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query, unless it was embedded recently.
+        
+        Args:
+            query: Search query
+            
+        Returns:
+            Query embedding
+        """
+        query_embedding = query_embedding_cache.get(embedding_generator.model, query)
+        if query_embedding is None:
+            query_embedding = await embedding_generator.generate_query_embedding(query)
+            query_embedding_cache.put(embedding_generator.model, query, query_embedding)
+        return query_embedding
+    
+    def _search(self, query_embedding: List[float], k: int) -> List[Tuple[CodeChunk, float]]:
+        """Search the index (blocking; runs on the executor)."""
+        # Checking the file-level index refreshes it, so it stays off the event loop too
+        if settings.hierarchical_search and self.file_store.get_stats()['total_embeddings'] > 0:
+            return self._hierarchical_search(query_embedding, k)
+        return self.vector_store.search(query_embedding, k)
+    
+    def _hierarchical_search(self, query_embedding: List[float], k: int) -> List[Tuple[CodeChunk, float]]:
+        """Search chunks of the files whose summaries best match the query."""
+        # Over-fetch: a re-indexed file can have more than one summary
+        file_hits = self.file_store.search(query_embedding, k=settings.file_candidates * 2)
+        candidate_files = list(dict.fromkeys(chunk.file_path for chunk, _ in file_hits))
+        
+        results = self.vector_store.search_files(
+            query_embedding, candidate_files[:settings.file_candidates], k
+        )
+        if not results:
+            # Files indexed before file summaries existed have no summary
+            results = self.vector_store.search(query_embedding, k)
+        return results
+    
     def get_stats(self) -> dict:
         """Get vector store statistics."""
         return self.vector_store.get_stats()
@@ -0,0 +1,237 @@
+"""
+Cache of chat answers, matched exactly or by question similarity.
+
+An answer is reused for the same question (whitespace-normalized) or
+for a question whose embedding is within settings.answer_cache_similarity
+cosine similarity of a cached one. Each entry depends on the files its
+context was retrieved from and on the index generation: when a file is
+re-indexed (reported through services.index_events, by this process or
+by the index watcher for other workers) only the answers built from it
+are dropped, while adding a new file starts a new generation, since new
+code can change what any question retrieves. Entries also expire after
+settings.answer_cache_ttl_seconds.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+from llm.embedding_cache import normalize_query
+from services.index_events import index_events
+from config import settings
+
+
+@dataclass
+class CachedAnswer:
+    """A cached answer and what it depends on."""
+    answer: str
+    context_stats: dict
+    files: frozenset
+    generation: int
+    embedding: Optional[np.ndarray] = None
+    created_at: float = field(default_factory=time.time)
+
+
+class AnswerCache:
+    """Exact and semantic answer cache with file-level invalidation."""
+    
+    def __init__(
+        self,
+        max_size: int = 256,
+        similarity: float = 0.95,
+        ttl_seconds: float = 3600.0,
+        enabled: bool = True
+    ):
+        """
+        Initialize answer cache.
+        
+        Args:
+            max_size: Maximum number of cached answers
+            similarity: Minimum cosine similarity for a semantic match
+            ttl_seconds: Age after which an answer is no longer reused
+            enabled: Whether answers are cached at all
+        """
+        self.max_size = max_size
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # Bumped when a file is added to the index; read it before retrieval
+        # and pass it to store(), so an answer never outlives a newer file
+        self.generation = 0
+        
+        # Question hash -> entry, least recently used first
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+    
+    def lookup_exact(self, question: str) -> Optional[Tuple[CachedAnswer, str, float]]:
+        """
+        Find a cached answer to the same question.
+        
+        Needs no embedding, so it is checked before the question is embedded.
+        A miss is only counted by lookup_similar().
+        
+        Args:
+            question: User question
+            
+        Returns:
+            (entry, "exact", 1.0), or None
+        """
+        if not self.enabled:
+            return None
+        
+        key = question_key(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry, "exact", 1.0
+            return None
+    
+    def lookup_similar(self, embedding: Optional[List[float]]) -> Optional[Tuple[CachedAnswer, str, float]]:
+        """
+        Find a cached answer to a near-identical question.
+        
+        Args:
+            embedding: Question embedding (a miss if None)
+            
+        Returns:
+            (entry, "semantic", similarity), or None on a miss
+        """
+        if not self.enabled:
+            return None
+        
+        query = unit_vector(embedding)
+        with self._lock:
+            if query is not None:
+                best_key, best_similarity = None, self.similarity
+                for other_key, other in self._entries.items():
+                    if not self._fresh(other) or other.embedding is None:
+                        continue
+                    if other.embedding.shape != query.shape:
+                        continue
+                    similarity = float(other.embedding @ query)
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = other_key, similarity
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key], "semantic", best_similarity
+            
+            self.misses += 1
+            return None
+    
+    def store(
+        self,
+        question: str,
+        answer: str,
+        context_stats: dict,
+        files: Iterable[str],
+        embedding: Optional[List[float]] = None,
+        generation: Optional[int] = None
+    ):
+        """
+        Cache an answer.
+        
+        Args:
+            question: User question
+            answer: Generated answer
+            context_stats: Context stats of the original response
+            files: Files the context was retrieved from
+            embedding: Question embedding, for semantic matching
+            generation: self.generation read before retrieval (the current one if None)
+        """
+        if not self.enabled:
+            return
+        
+        key = question_key(question)
+        with self._lock:
+            self._entries[key] = CachedAnswer(
+                answer=answer,
+                context_stats=context_stats,
+                files=frozenset(files),
+                generation=self.generation if generation is None else generation,
+                embedding=unit_vector(embedding)
+            )
+            self._entries.move_to_end(key)
+            self._evict()
+    
+    def file_indexed(self, file_path: str, new: bool):
+        """
+        Invalidate answers after a file was (re-)indexed.
+        
+        Args:
+            file_path: Indexed file
+            new: Whether the file was added to the index (starts a new generation)
+        """
+        with self._lock:
+            if new:
+                self.generation += 1
+                self._evict()
+                return
+            stale = [key for key, entry in self._entries.items() if file_path in entry.files]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "generation": self.generation,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
+    
+    def _fresh(self, entry: CachedAnswer) -> bool:
+        """Check whether an entry may still be reused; the caller holds the lock."""
+        return entry.generation == self.generation and time.time() - entry.created_at < self.ttl_seconds
+    
+    def _evict(self):
+        """Drop stale entries and the least recently used beyond max_size; the caller holds the lock."""
+        stale = [key for key, entry in self._entries.items() if not self._fresh(entry)]
+        for key in stale:
+            del self._entries[key]
+        self.invalidated += len(stale)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def question_key(question: str) -> str:
+    """Hash a whitespace-normalized question."""
+    return hashlib.sha256(normalize_query(question).encode('utf-8')).hexdigest()
+
+
+def unit_vector(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+    """Normalize an embedding for cosine similarity (None for missing or zero vectors)."""
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+
+# Global answer cache instance
+answer_cache = AnswerCache(
+    settings.answer_cache_size,
+    similarity=settings.answer_cache_similarity,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+    enabled=settings.answer_cache_enabled
+)
+index_events.on_file_indexed(answer_cache.file_indexed)
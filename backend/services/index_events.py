@@ -0,0 +1,55 @@
+"""
+Notifications from the Indexer to the caches built on indexed code.
+
+The Indexer reports each (re-)indexed file once, here; caches that hold
+results derived from file contents register a callback instead of
+being called one by one from the indexing pipeline.
+"""
+from typing import Callable, List
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+FileIndexedCallback = Callable[[str, bool], None]
+
+
+class IndexEvents:
+    """Registry of callbacks run after a file is indexed."""
+    
+    def __init__(self):
+        """Initialize with no callbacks."""
+        self._callbacks: List[FileIndexedCallback] = []
+        self._lock = threading.Lock()
+    
+    def on_file_indexed(self, callback: FileIndexedCallback):
+        """
+        Register a callback for indexed files.
+        
+        Args:
+            callback: Called with (file_path, new), new being whether the file was added to the index
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+    
+    def file_indexed(self, file_path: str, new: bool):
+        """
+        Notify every callback that a file was (re-)indexed.
+        
+        A failing callback is logged and does not stop the others.
+        
+        Args:
+            file_path: Indexed file
+            new: Whether the file was added to the index
+        """
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(file_path, new)
+            except Exception as e:
+                logger.error(f"Error invalidating after indexing {file_path}: {e}")
+
+
+# Global index events instance
+index_events = IndexEvents()
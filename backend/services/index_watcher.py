@@ -0,0 +1,111 @@
+"""
+Watcher that reports files indexed by other workers.
+
+The Indexer reports the files it indexes through services.index_events,
+but only in its own process. Every settings.index_watch_seconds this
+watcher loads newly published vector store generations (off the event
+loop) and compares per-file versions with the previous check, reporting
+each changed file through the same events, so caches in every worker
+drop what another worker's indexing made stale. A file indexed in this
+process is reported again when the watcher sees it; dropping its cache
+entries twice only costs a miss. It also reloads the call graph (and
+its reachability index) after another worker's indexing run.
+"""
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+
+from db.vector_store import get_vector_store
+from services.index_events import IndexEvents, index_events
+from analysis.reachability import ReachabilityIndex, reachability_index
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IndexWatcher:
+    """Polls the vector store for files (re-)indexed by any process."""
+    
+    def __init__(
+        self,
+        vector_store: Any,
+        interval: float = 2.0,
+        events: IndexEvents = index_events,
+        reachability: Optional[ReachabilityIndex] = None
+    ):
+        """
+        Initialize watcher (polling starts with start()).
+        
+        Args:
+            vector_store: Vector store whose published files are watched
+            interval: Seconds between checks
+            events: Events the changed files are reported through
+            reachability: Reachability index synced with its saved call graph (none if None)
+        """
+        self.vector_store = vector_store
+        self.interval = interval
+        self.events = events
+        self.reachability = reachability
+        self.versions: Optional[Dict[str, int]] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def poll(self) -> int:
+        """
+        Load new generations and report files changed since the last check.
+        
+        Blocks on the vector store; async code runs it on a thread. The
+        first check only records the current versions.
+        
+        Returns:
+            Number of files reported
+        """
+        if self.reachability is not None:
+            self.reachability.sync()
+        
+        self.vector_store.refresh(blocking=False)
+        versions = self.vector_store.file_versions()
+        previous, self.versions = self.versions, versions
+        if previous is None:
+            return 0
+        
+        changed = [path for path, version in versions.items() if previous.get(path) != version]
+        removed = [path for path in previous if path not in versions]
+        for path in changed:
+            self.events.file_indexed(path, new=path not in previous)
+        for path in removed:
+            self.events.file_indexed(path, new=False)
+        return len(changed) + len(removed)
+    
+    def start(self):
+        """Start polling on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop polling."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        """Check for changes every interval until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception as e:
+                logger.error(f"Error checking the index for changes: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Global index watcher instance
+index_watcher = IndexWatcher(
+    get_vector_store(
+        settings.vector_db_path,
+        num_shards=settings.vector_shards,
+        strategy=settings.vector_shard_strategy,
+        use_workers=settings.vector_shard_workers
+    ),
+    interval=settings.index_watch_seconds,
+    reachability=reachability_index
+)
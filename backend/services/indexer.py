@@ -3,19 +3,23 @@ Main indexing pipeline orchestrating ASG, CFG, and embedding generation.
 """
 from typing import List
 from pathlib import Path
+import asyncio
 import hashlib
 import logging
 
 from services.file_scanner import file_scanner
 from services.metrics import metrics_tracker
+from services.index_events import index_events
 from analysis.tree_sitter_parser import parser
 from analysis.asg_builder import asg_builder
 from analysis.cfg_builder import cfg_builder
 from analysis.chunker import chunker
+from analysis.call_graph import call_graph, RANKED_NODE_TYPES
+from analysis.reachability import reachability_index
 from llm.embeddings import embedding_generator
-from db.vector_store import VectorStore
-from db.graph_store import GraphStore
-from db.models import FileMetadata
+from db.vector_store import get_vector_store, get_file_vector_store
+from db.unified_graph_store import unified_graph_store
+from db.models import FileMetadata, NodeType, CodeChunk, CodeNode
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -26,12 +30,14 @@ class Indexer:
     
     def __init__(self):
         """Initialize indexer with database connections."""
-        self.vector_store = VectorStore(settings.vector_db_path)
-        self.graph_store = GraphStore(
-            uri=settings.graph_db_url,
-            user=settings.graph_db_user,
-            password=settings.graph_db_password
+        self.vector_store = get_vector_store(
+            settings.vector_db_path,
+            num_shards=settings.vector_shards,
+            strategy=settings.vector_shard_strategy,
+            use_workers=settings.vector_shard_workers
         )
+        self.file_store = get_file_vector_store(settings.vector_db_path)
+        self.graph_store = unified_graph_store
         self.indexed_files = {}  # file_path -> file_hash
     
     async def index_repository(self, repo_path: str) -> dict:
@@ -60,6 +66,13 @@ class Indexer:
                 logger.error(f"Error indexing {file_path}: {e}")
                 metrics_tracker.increment('files_failed')
         
+        await self.graph_store.flush()
+        
+        # Refresh centrality and reachability if the call graph changed
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, call_graph.compute):
+            await loop.run_in_executor(None, reachability_index.rebuild)
+        
         metrics_tracker.finish_indexing()
         logger.info("Indexing complete!")
         
@@ -89,54 +102,71 @@ class Indexer:
         # 1. Build ASG
         asg_nodes, asg_edges = asg_builder.build_asg(file_path, content)
         
-        # Store ASG nodes and edges
-        for node in asg_nodes:
-            self.graph_store.add_code_node(node)
-            metrics_tracker.increment('asg_nodes')
-        
-        for edge in asg_edges:
-            self.graph_store.add_code_edge(edge)
-        
-        # 2. Build CFG for each function
-        function_nodes = [n for n in asg_nodes if n.type.value == 'function']
-        for func_node in function_nodes:
-            cfg_nodes, cfg_edges = cfg_builder.build_cfg(
-                func_node.id,
-                func_node.code,
-                func_node.start_line
-            )
-            
-            for cfg_node in cfg_nodes:
-                self.graph_store.add_cfg_node(cfg_node)
-                metrics_tracker.increment('cfg_nodes')
-            
-            for cfg_edge in cfg_edges:
-                self.graph_store.add_cfg_edge(cfg_edge)
+        # 2. Build a basic-block CFG for each function
+        function_nodes = [n for n in asg_nodes if n.type == NodeType.FUNCTION]
+        cfgs = cfg_builder.build_cfgs(file_path, content, function_nodes)
+        
+        # Store ASG and CFG (one serialized CFG per function) in one transaction for the file
+        await self.graph_store.add_file_graph(asg_nodes, asg_edges, cfgs)
+        metrics_tracker.increment('asg_nodes', len(asg_nodes))
+        metrics_tracker.increment('cfg_nodes', sum(len(cfg.blocks) for cfg in cfgs))
+        call_graph.update_file(file_path, asg_nodes)
         
         # 3. Chunk file
         chunks = chunker.chunk_file(file_path, content)
         metrics_tracker.increment('chunks', len(chunks))
         
+        # Attach the nodes each chunk covers, so ranking can look up their centrality
+        ranked_nodes = [n for n in asg_nodes if n.type in RANKED_NODE_TYPES]
+        for chunk in chunks:
+            chunk.metadata['node_ids'] = self._covered_node_ids(chunk, ranked_nodes)
+        
         # 4. Generate embeddings
         for chunk in chunks:
             embedding = await embedding_generator.generate_embedding(chunk.code)
             chunk.embedding = embedding
             metrics_tracker.increment('embeddings')
         
-        # 5. Store embeddings
-        self.vector_store.add_embeddings(chunks)
+        # 5. Store embeddings (disk writes stay off the event loop)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.vector_store.add_embeddings, chunks)
+        
+        # 6. Embed a file-level summary for hierarchical retrieval
+        if chunks:
+            file_chunk = chunker.build_file_chunk(file_path, content, asg_nodes)
+            file_chunk.embedding = await embedding_generator.generate_embedding(file_chunk.code)
+            await loop.run_in_executor(None, self.file_store.add_embeddings, [file_chunk])
         
-        # Track indexed file
+        # Track indexed file; results cached from its old contents are stale
+        new_file = file_path not in self.indexed_files
+        index_events.file_indexed(file_path, new=new_file)
         self.indexed_files[file_path] = file_hash
         
         logger.info(f"Indexed {file_path}: {len(asg_nodes)} ASG nodes, {len(chunks)} chunks")
     
-    def get_stats(self) -> dict:
+    def _covered_node_ids(self, chunk: CodeChunk, nodes: List[CodeNode]) -> List[str]:
+        """
+        Get the IDs of the nodes a chunk overlaps.
+        
+        Functions and methods are preferred; an enclosing class is only
+        used when the chunk covers no function.
+        """
+        overlapping = [
+            node for node in nodes
+            if node.start_line <= chunk.end_line and node.end_line >= chunk.start_line
+        ]
+        functions = [node.id for node in overlapping if node.type != NodeType.CLASS]
+        return functions or [node.id for node in overlapping]
+    
+    async def get_stats(self) -> dict:
         """Get indexing statistics."""
         return {
             'metrics': metrics_tracker.get_stats(),
-            'vector_store': self.vector_store.get_stats(),
-            'graph_store': self.graph_store.get_stats()
+            'vector_store': {
+                **self.vector_store.get_stats(),
+                'files': self.file_store.get_stats()
+            },
+            'graph_store': await self.graph_store.get_stats()
         }
 
 
@@ -0,0 +1,193 @@
+"""
+Cache of retrieval results: ranked chunk IDs and packed context per query.
+
+Repeated queries skip query embedding, vector search, graph expansion,
+ranking and packing. Each entry records the files its candidates came
+from, and a reverse index from file to entries lets the cache drop
+exactly the entries a re-indexed file affects when it is reported
+through services.index_events (by the Indexer, or by the index watcher
+for files other workers indexed). Entries also expire after
+settings.retrieval_cache_ttl_seconds, bounding staleness if a change is
+missed. Memory is bounded by the size of the cached context, least
+recently used entries first.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set, Tuple
+import hashlib
+import threading
+import time
+
+from db.models import CodeChunk
+from llm.embedding_cache import normalize_query
+from services.index_events import index_events
+from config import settings
+
+# Estimated bytes per cached chunk ID, file reference and entry
+ID_BYTES = 64
+ENTRY_BYTES = 512
+
+
+@dataclass
+class CachedRetrieval:
+    """Retrieval result of one query."""
+    chunk_ids: List[str]
+    context: str
+    context_stats: dict
+    files: frozenset
+    size: int
+    created_at: float = field(default_factory=time.time)
+
+
+class RetrievalCache:
+    """Byte-bounded LRU of retrieval results with file-level invalidation."""
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600.0, enabled: bool = True):
+        """
+        Initialize retrieval cache.
+        
+        Args:
+            max_bytes: Approximate memory budget for cached entries
+            ttl_seconds: Age after which a result is no longer reused
+            enabled: Whether results are cached at all
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        
+        # (endpoint, query hash) -> entry, least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], CachedRetrieval]" = OrderedDict()
+        self._by_file: Dict[str, Set[Tuple[str, str]]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expired = 0
+    
+    def get(self, endpoint: str, query: str) -> Optional[CachedRetrieval]:
+        """
+        Get the cached retrieval result of a query.
+        
+        Args:
+            endpoint: Pipeline the result was built by (e.g. "chat")
+            query: Search query
+            
+        Returns:
+            Cached result, or None
+        """
+        if not self.enabled:
+            return None
+        
+        key = (endpoint, query_hash(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created_at >= self.ttl_seconds:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(
+        self,
+        endpoint: str,
+        query: str,
+        ranked_chunks: List[Tuple[CodeChunk, float]],
+        context: str,
+        context_stats: dict
+    ):
+        """
+        Cache a retrieval result.
+        
+        Args:
+            endpoint: Pipeline the result was built by
+            query: Search query
+            ranked_chunks: Ranked (CodeChunk, score) tuples the context was packed from
+            context: Packed context
+            context_stats: Packing stats
+        """
+        if not self.enabled:
+            return
+        
+        files = frozenset(chunk.file_path for chunk, _ in ranked_chunks)
+        chunk_ids = [chunk.id for chunk, _ in ranked_chunks]
+        size = ENTRY_BYTES + len(context.encode('utf-8')) + ID_BYTES * (len(chunk_ids) + len(files))
+        if size > self.max_bytes:
+            return
+        
+        key = (endpoint, query_hash(query))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CachedRetrieval(chunk_ids, context, context_stats, files, size)
+            self._bytes += size
+            for file_path in files:
+                self._by_file.setdefault(file_path, set()).add(key)
+            
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def file_indexed(self, file_path: str, new: bool):
+        """
+        Drop the results a (re-)indexed file may change.
+        
+        Args:
+            file_path: Indexed file
+            new: Whether the file was added to the index; any query may now retrieve it
+        """
+        with self._lock:
+            keys = list(self._entries) if new else list(self._by_file.get(file_path, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+    
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+    
+    def _remove(self, key: Tuple[str, str]):
+        """Remove an entry and its file references; the caller holds the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for file_path in entry.files:
+            keys = self._by_file.get(file_path)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_file[file_path]
+
+
+def query_hash(query: str) -> str:
+    """Hash a whitespace-normalized query."""
+    return hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+
+
+# Global retrieval cache instance
+retrieval_cache = RetrievalCache(
+    settings.retrieval_cache_max_mb * 1024 * 1024,
+    ttl_seconds=settings.retrieval_cache_ttl_seconds,
+    enabled=settings.retrieval_cache_enabled
+)
+index_events.on_file_indexed(retrieval_cache.file_indexed)
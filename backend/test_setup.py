@@ -101,13 +101,419 @@ def test_database_clients():
     print("\n")
     return True
 
+def test_vector_store_concurrency():
+    """Stress concurrent searches against a writer appending embeddings."""
+    print("Testing vector store concurrency...")
+    
+    try:
+        import tempfile
+        import threading
+        import numpy as np
+        from concurrent.futures import ThreadPoolExecutor
+        from db.vector_store import VectorStore
+        from db.models import CodeChunk
+        
+        dimension = 16
+        
+        def vector_for(i):
+            return np.random.default_rng(i).random(dimension, dtype=np.float32)
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            store = VectorStore(db_path, dimension=dimension)
+            writer_done = threading.Event()
+            
+            def writer():
+                try:
+                    for batch in range(100):
+                        store.add_embeddings([
+                            CodeChunk(
+                                id=str(i), file_path=f"file_{batch}.py", start_line=1,
+                                end_line=1, code="", tokens=0,
+                                embedding=vector_for(i).tolist(), metadata={}
+                            )
+                            for i in range(batch * 5, batch * 5 + 5)
+                        ])
+                finally:
+                    writer_done.set()
+            
+            def reader(seed):
+                # Every result's distance must match the vector of the chunk
+                # it was returned with, or index and metadata are out of sync
+                rng = np.random.default_rng(seed)
+                searches = mismatches = 0
+                while not writer_done.is_set() or searches < 50:
+                    query = rng.random(dimension, dtype=np.float32)
+                    for chunk, distance in store.search(query.tolist(), k=10):
+                        expected = float(np.sum((query - vector_for(int(chunk.id))) ** 2))
+                        if abs(expected - distance) > 1e-3:
+                            mismatches += 1
+                    searches += 1
+                return searches, mismatches
+            
+            with ThreadPoolExecutor(max_workers=9) as pool:
+                writes = pool.submit(writer)
+                reads = [pool.submit(reader, seed) for seed in range(8)]
+                writes.result()
+                results = [r.result() for r in reads]
+            
+            searches = sum(r[0] for r in results)
+            mismatches = sum(r[1] for r in results)
+            stats = store.get_stats()
+        
+        if mismatches or stats["total_embeddings"] != 500:
+            print(f"  ✗ {mismatches} inconsistent results, {stats['total_embeddings']}/500 embeddings")
+            return False
+        print(f"  ✓ {searches} concurrent searches consistent during 100 writes")
+    
+    except Exception as e:
+        print(f"  ✗ Vector store concurrency error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_vector_store_processes():
+    """Publish from several processes into one store; no vectors may be lost and segments stay compacted."""
+    print("Testing vector store publishing across processes...")
+    
+    try:
+        import tempfile
+        import multiprocessing
+        import numpy as np
+        from db.vector_store import VectorStore, COMPACT_SEGMENTS
+        from db.models import CodeChunk
+        
+        dimension = 8
+        
+        def chunks_for(first, file_path):
+            return [
+                CodeChunk(
+                    id=str(i), file_path=file_path, start_line=1, end_line=1, code="", tokens=0,
+                    embedding=np.random.default_rng(i).random(dimension, dtype=np.float32).tolist(),
+                    metadata={}
+                )
+                for i in range(first, first + 3)
+            ]
+        
+        def worker(db_path, worker_id):
+            store = VectorStore(db_path, dimension=dimension)
+            for batch in range(30):
+                first = (worker_id * 30 + batch) * 3
+                store.add_embeddings(chunks_for(first, f"worker_{worker_id}/file_{batch}.py"))
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            reader = VectorStore(db_path, dimension=dimension)
+            context = multiprocessing.get_context("fork")
+            processes = [context.Process(target=worker, args=(db_path, w)) for w in range(3)]
+            for process in processes:
+                process.start()
+            while any(process.is_alive() for process in processes):
+                reader.refresh()
+            for process in processes:
+                process.join()
+            reader.refresh()
+            
+            fresh = VectorStore(db_path, dimension=dimension)
+            expected = list(range(270))
+            stats = fresh.get_stats()
+            checks = [
+                ("All vectors published", sorted(int(c.id) for c in fresh.chunk_metadata) == expected),
+                ("Concurrent reader caught up", sorted(int(c.id) for c in reader.chunk_metadata) == expected),
+                ("Segments compacted", stats["segments"] <= COMPACT_SEGMENTS),
+                ("File rows after compaction", len(reader.search_files([0.5] * dimension, ["worker_1/file_7.py"], 5)) == 3)
+            ]
+        
+        for name, result in checks:
+            print(f"  {'✓' if result else '✗'} {name}")
+        if not all(result for _, result in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Vector store publishing error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_sharded_vector_store():
+    """Check sharded scatter-gather search against a single store, using local worker processes."""
+    print("Testing sharded vector store...")
+    
+    try:
+        import tempfile
+        import numpy as np
+        from db.vector_store import VectorStore
+        from db.sharded_vector_store import ShardedVectorStore
+        from db.models import CodeChunk
+        
+        dimension = 16
+        rng = np.random.default_rng(0)
+        chunks = [
+            CodeChunk(
+                id=str(i), file_path=f"pkg_{i % 7}/module_{i % 23}.py", start_line=i,
+                end_line=i, code="", tokens=0,
+                embedding=rng.random(dimension, dtype=np.float32).tolist(), metadata={}
+            )
+            for i in range(300)
+        ]
+        
+        with tempfile.TemporaryDirectory() as single_path, tempfile.TemporaryDirectory() as sharded_path:
+            single = VectorStore(single_path, dimension=dimension)
+            single.add_embeddings(chunks)
+            
+            sharded = ShardedVectorStore(sharded_path, num_shards=3, use_workers=True, dimension=dimension)
+            try:
+                sharded.add_embeddings(chunks)
+                stats = sharded.get_stats()
+                
+                mismatches = 0
+                for _ in range(20):
+                    query = rng.random(dimension, dtype=np.float32).tolist()
+                    expected = [chunk.id for chunk, _ in single.search(query, k=10)]
+                    actual = [chunk.id for chunk, _ in sharded.search(query, k=10)]
+                    if expected != actual:
+                        mismatches += 1
+            finally:
+                sharded.close()
+        
+        populated = sum(1 for shard in stats["shards"] if shard["total_embeddings"] > 0)
+        if mismatches or stats["total_embeddings"] != len(chunks) or populated != 3:
+            print(f"  ✗ {mismatches}/20 queries differ from unsharded search ({populated} shards populated)")
+            return False
+        print("  ✓ 3 worker shards match unsharded search on 20 queries")
+    
+    except Exception as e:
+        print(f"  ✗ Sharded vector store error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_graph_write_batching():
+    """Check how one file's graph is split into batched UNWIND statements."""
+    print("Testing graph write batching...")
+    
+    try:
+        from db.graph_store import file_graph_statements, CODE_NODES_QUERY, CFGS_QUERY
+        from db.graph_stats import LABEL, RELATIONSHIP, CODE_NODE_LABEL, CFG_BLOCK_LABEL
+        from db.models import CodeNode, CodeEdge, BasicBlock, FunctionCFG, NodeType
+        
+        code_nodes = [
+            CodeNode(id=f"f{i}", type=NodeType.FUNCTION, name=f"func_{i}", file_path="a.py",
+                     start_line=i, end_line=i, code="", metadata={})
+            for i in range(5)
+        ]
+        code_edges = [CodeEdge(f"f{i}", f"f{i + 1}", "calls", {}) for i in range(4)]
+        code_edges.append(CodeEdge("f0", "f4", "contains", {}))
+        cfgs = [FunctionCFG(f"f{i}", [BasicBlock("entry", i, i), BasicBlock("exit", i, i)], [(0, 1, "")])
+                for i in range(2)]
+        
+        statements = file_graph_statements(code_nodes, code_edges, cfgs, batch_size=2)
+        counters = [counter for _, _, counter in statements]
+        
+        checks = [
+            ("One statement per kind and batch", len(statements) == 3 + 2 + 1 + 1),
+            ("Batches within batch size", all(0 < len(rows) <= 2 for _, rows, _ in statements)),
+            ("Every row written once", sum(len(rows) for _, rows, _ in statements) == 5 + 5 + 2),
+            ("Nodes first, then edges, then CFGs",
+             [query for query, _, _ in statements][:3] == [CODE_NODES_QUERY] * 3
+             and statements[-1][0] == CFGS_QUERY),
+            ("Counted per kind and file", counters == [(LABEL, CODE_NODE_LABEL, "a.py")] * 3 + [
+                (RELATIONSHIP, "CALLS", "a.py"), (RELATIONSHIP, "CALLS", "a.py"),
+                (RELATIONSHIP, "CONTAINS", "a.py"), (LABEL, CFG_BLOCK_LABEL, "a.py")
+            ])
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Graph write batching error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_embedded_graph_store():
+    """Check the embedded CSR graph store, including a save/load round trip."""
+    print("Testing embedded graph store...")
+    
+    try:
+        import tempfile
+        from db.embedded_graph_store import EmbeddedGraphStore
+        from analysis.cfg_paths import CFGPathAnalyzer
+        from db.models import CodeNode, CodeEdge, BasicBlock, FunctionCFG, NodeType
+        
+        # Call chain f0 -> f1 -> ... -> f9, plus a diamond CFG for f0
+        code_nodes = [
+            CodeNode(id=f"f{i}", type=NodeType.FUNCTION, name=f"func_{i}", file_path="a.py",
+                     start_line=i, end_line=i, code="", metadata={})
+            for i in range(10)
+        ]
+        code_edges = [CodeEdge(f"f{i}", f"f{i + 1}", "calls", {}) for i in range(9)]
+        cfg = FunctionCFG("f0", [
+            BasicBlock("entry", 1, 1), BasicBlock("exit", 5, 5), BasicBlock("condition", 2, 2),
+            BasicBlock("block", 3, 3), BasicBlock("block", 4, 4),
+        ], [(0, 2, ""), (2, 3, "true"), (2, 4, "false"), (3, 1, ""), (4, 1, ""), (3, 2, "back")])
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            store = EmbeddedGraphStore(db_path)
+            store.add_file_graph(code_nodes, code_edges, [cfg])
+            store.flush()
+            
+            # Reload from disk so every check runs against the persisted graph
+            store = EmbeddedGraphStore(db_path)
+            neighbors = sorted(node["id"] for node in store.get_neighbors("f5", max_depth=2))
+            loaded = store.get_cfg("f0")
+            found = [node["id"] for node in store.search_by_name("func_7")]
+            stats = store.get_stats()
+            
+            # A writer in another worker flushes on its timer; this reader picks it up
+            writer = EmbeddedGraphStore(db_path, flush_interval=0)
+            writer.add_code_nodes([
+                CodeNode(id="g0", type=NodeType.FUNCTION, name="late_func", file_path="b.py",
+                         start_line=1, end_line=1, code="", metadata={})
+            ])
+            reloaded = [node["id"] for node in store.search_by_name("late_func")]
+        
+        # The back edge then -> cond becomes then -> else: three paths, two of them shortest
+        analyzer = CFGPathAnalyzer()
+        shortest = sorted(analyzer.paths(loaded, k=2))
+        diverse = analyzer.paths(loaded, k=10, strategy="diverse")
+        
+        checks = [
+            ("Two-hop neighbors", neighbors == ["f3", "f4", "f6", "f7"]),
+            ("CFG round trip", loaded == cfg),
+            ("CFG path count", analyzer.count(loaded) == 3),
+            ("Shortest CFG paths", shortest == [
+                ["f0_block_0", "f0_block_2", "f0_block_3", "f0_block_1"],
+                ["f0_block_0", "f0_block_2", "f0_block_4", "f0_block_1"],
+            ]),
+            ("Diverse CFG paths", diverse == [["f0_block_0", "f0_block_2", "f0_block_3", "f0_block_4", "f0_block_1"]]),
+            ("Search by name", found == ["f7"]),
+            ("Reload after another writer's flush", reloaded == ["g0"]),
+            ("Stats", (stats["code_nodes"], stats["cfg_nodes"], stats["relationships"]) == (10, 5, 9)),
+            ("Per-file stats", stats["files"] == {"a.py": {"code_nodes": 10, "cfg_nodes": 5, "relationships": 9}}),
+        ]
+        for name, result in checks:
+            status = "✓" if result else "✗"
+            print(f"  {status} {name}")
+        if not all(result for _, result in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Embedded graph store error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_embedded_graph_expansion():
+    """Check the embedded store's bounded multi-source BFS against a plain BFS."""
+    print("Testing embedded graph expansion...")
+    
+    try:
+        import random
+        import tempfile
+        from collections import deque
+        from db.embedded_graph_store import EmbeddedGraphStore
+        from db.models import CodeNode, CodeEdge, NodeType
+        
+        # Random CALLS and CONTAINS edges between 80 nodes, plus a star around "hub"
+        rng = random.Random(11)
+        code_nodes = [
+            CodeNode(id=f"n{i}", type=NodeType.FUNCTION, name=f"func_{i}", file_path="a.py",
+                     start_line=i, end_line=i, code="", metadata={})
+            for i in range(80)
+        ] + [
+            CodeNode(id=f"s{i}", type=NodeType.FUNCTION, name=f"spoke_{i}", file_path="b.py",
+                     start_line=i, end_line=i, code="", metadata={})
+            for i in range(10)
+        ] + [CodeNode(id="hub", type=NodeType.CLASS, name="Hub", file_path="b.py",
+                      start_line=1, end_line=20, code="", metadata={})]
+        edges = {(f"n{rng.randrange(80)}", f"n{rng.randrange(80)}", rng.choice(["calls", "contains"]))
+                 for _ in range(120)}
+        edges |= {("hub", f"s{i}", "contains") for i in range(10)}
+        code_edges = [CodeEdge(source, target, relationship, {}) for source, target, relationship in sorted(edges)]
+        
+        def bfs(seeds, max_depth, types, direction):
+            """Hop distance of every node within max_depth of the nearest seed."""
+            adjacency = {}
+            for source, target, relationship in edges:
+                if types and relationship.upper() not in types:
+                    continue
+                if direction in ("out", "both"):
+                    adjacency.setdefault(source, []).append(target)
+                if direction in ("in", "both"):
+                    adjacency.setdefault(target, []).append(source)
+            hops = {seed: 0 for seed in seeds}
+            queue = deque(seeds)
+            while queue:
+                node = queue.popleft()
+                if hops[node] == max_depth:
+                    continue
+                for peer in adjacency.get(node, []):
+                    if peer not in hops:
+                        hops[peer] = hops[node] + 1
+                        queue.append(peer)
+            return {node: hop for node, hop in hops.items() if node not in seeds}
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            store = EmbeddedGraphStore(db_path)
+            store.add_file_graph(code_nodes, code_edges, [])
+            
+            # Unbounded fanout and limit: exactly the BFS hop distances
+            cases = [
+                (seeds, depth, types, direction)
+                for seeds in (["n0"], ["n3", "n17", "n42"])
+                for depth in (1, 2, 3)
+                for types in (None, ["CALLS"])
+                for direction in ("out", "in", "both")
+            ]
+            exact = all(
+                {node["id"]: node["hop"] for node in store.get_neighbors_multi(
+                    seeds, depth, types, direction, fanout=1000, limit=1000
+                )} == bfs(seeds, depth, [name.upper() for name in types or []], direction)
+                for seeds, depth, types, direction in cases
+            )
+            
+            # Bounds: results stop at the limit, nearest first, each at its true hop
+            expected = bfs(["n3", "n17", "n42"], 3, [], "both")
+            limited = store.get_neighbors_multi(["n3", "n17", "n42"], 3, limit=10, fanout=1000)
+            hops = [node["hop"] for node in limited]
+            fanned = store.get_neighbors_multi(["hub"], 1, direction="out", fanout=3)
+            scores = [node["score"] for node in store.get_neighbors_multi(["n0"], 3)]
+        
+        checks = [
+            ("Hop distances match BFS", exact),
+            ("Limit respected, nearest first", len(limited) == 10 and hops == sorted(hops)),
+            ("Limited results at their BFS hop", all(expected.get(node["id"]) == node["hop"] for node in limited)),
+            ("Fanout caps neighbors per node", len(fanned) == 3),
+            ("Scores fall with distance", scores == sorted(scores, reverse=True))
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Embedded graph expansion error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
 def test_code_analysis():
     """Test code analysis components."""
     print("Testing code analysis...")
     
     try:
         from analysis.tree_sitter_parser import parser
+        from analysis.asg_builder import asg_builder
+        from analysis.cfg_builder import cfg_builder
         from analysis.chunker import chunker
+        from db.models import FunctionCFG, CodeChunk
         
         # Test Python parsing
         test_code = """
@@ -122,10 +528,51 @@ def hello_world():
             print("  ✗ Tree-sitter parsing failed")
             return False
         
+        # Test basic-block CFG: loop header, if/else branches, return
+        cfg_code = """
+def count(items):
+    total = 0
+    for item in items:
+        if item:
+            total += 1
+        else:
+            continue
+    return total
+"""
+        nodes, _ = asg_builder.build_asg("test.py", cfg_code)
+        cfgs = cfg_builder.build_cfgs("test.py", cfg_code, nodes)
+        kinds = [block.kind for block in cfgs[0].blocks] if cfgs else []
+        restored = FunctionCFG.from_bytes(cfgs[0].function_id, cfgs[0].to_bytes()) if cfgs else None
+        if sorted(kinds) == ["block", "block", "block", "block", "condition", "entry", "exit", "loop"] and restored == cfgs[0]:
+            print(f"  ✓ Basic-block CFG ({len(kinds)} blocks, {len(cfgs[0].edges)} edges)")
+        else:
+            print(f"  ✗ Basic-block CFG failed: {kinds}")
+            return False
+        
         # Test chunking
         chunks = chunker.chunk_file("test.py", test_code)
         print(f"  ✓ Code chunking ({len(chunks)} chunks)")
         
+        # Test context compression: comments and docstrings stripped, bodies elided
+        from retrieval.context_packer import CodeCompressor
+        compress_code = """    def total(self, items):
+        \"\"\"Sum the items.\"\"\"
+        # Skip empty input
+        return sum(items)
+"""
+        compress_chunk = CodeChunk(
+            id="c", file_path="test.py", start_line=1, end_line=4,
+            code=compress_code, tokens=0, metadata={}
+        )
+        compressor = CodeCompressor("strip,dedent,signatures")
+        stripped = compressor.compress(compress_chunk).code
+        elided = compressor.compress(compress_chunk, elide_bodies=True).code
+        if stripped == "def total(self, items):\n    return sum(items)" and elided == "def total(self, items):\n    ...":
+            print("  ✓ Context compression")
+        else:
+            print(f"  ✗ Context compression failed: {stripped!r}, {elided!r}")
+            return False
+    
     except Exception as e:
         print(f"  ✗ Code analysis error: {e}")
         return False
@@ -133,6 +580,951 @@ def hello_world():
     print("\n")
     return True
 
+def test_context_packer():
+    """Test context packing against the token budget."""
+    print("Testing context packer...")
+    
+    try:
+        from retrieval.context_packer import ContextPacker, CodeCompressor
+        from llm.token_counter import token_counter
+        from db.models import CodeChunk
+        
+        def make_chunk(chunk_id, file_path, target_tokens):
+            line = "value = compute(value, offset)\n"
+            code = line * max(1, target_tokens // token_counter.count_tokens(line))
+            return CodeChunk(
+                id=chunk_id, file_path=file_path, start_line=1, end_line=code.count("\n"),
+                code=code, tokens=token_counter.count_tokens(code), metadata={}
+            )
+        
+        # B alone beats the greedy set {C, A}; C still fits next to it, and
+        # A only fits truncated to what is left of f.py's share
+        packer = ContextPacker()
+        packer.compressor = CodeCompressor("none")
+        packer.file_share = 0.5
+        packer.max_tokens = packer.system_reserve + 10000
+        b = make_chunk("B", "f.py", 4000)
+        c = make_chunk("C", "g.py", 1000)
+        a = make_chunk("A", "f.py", 1100)
+        context, stats = packer.pack_context([(b, 3.0), (c, 1.2), (a, 1.0)], "")
+        
+        # Code of each packed chunk sits between a pair of fences
+        blocks = context.split("```")[1::2]
+        packed_tokens = sum(token_counter.count_tokens(block[1:-1]) for block in blocks)
+        checks = [
+            ("Chunks added after the best single chunk", packer.select([(b, 3.0), (c, 1.2), (a, 1.0)], 10000) == [0, 1]),
+            ("Truncated fill packed", stats["packed_chunks"] == 3),
+            ("File share respected", stats["used_tokens"] - c.tokens <= 5000),
+            ("Used tokens match the packed text", stats["used_tokens"] == packed_tokens),
+            ("Relevance at most 1", 0.0 < stats["relevance"] <= 1.0)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            print(f"  ✗ Context stats: {stats}")
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Context packer error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_span_merger():
+    """Test merging of overlapping chunks."""
+    print("Testing span merger...")
+    
+    try:
+        import asyncio
+        import tempfile
+        from pathlib import Path
+        from retrieval.span_merger import span_merger
+        from db.models import CodeChunk
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = str(Path(tmp) / "spans.py")
+            lines = [f"line_{n} = {n}" for n in range(1, 21)]
+            Path(file_path).write_text("\n".join(lines), encoding="utf-8")
+            
+            def span(chunk_id, start, end, score):
+                code = "\n".join(lines[start - 1:end])
+                return CodeChunk(id=chunk_id, file_path=file_path, start_line=start, end_line=end,
+                                 code=code, tokens=10, metadata={}), score
+            
+            # Overlapping (1-5, 4-8), identical (1-5 twice), adjacent (9-10), separate (15-16)
+            ranked = [span("a", 1, 5, 0.5), span("b", 4, 8, 0.9), span("c", 9, 10, 0.3),
+                      span("d", 1, 5, 0.4), span("e", 15, 16, 0.7)]
+            merged = asyncio.run(span_merger.merge(ranked))
+            
+            # Source changed since indexing: spans are stitched from the chunks' own lines
+            Path(file_path).write_text("\n".join(["# edited"] + lines), encoding="utf-8")
+            stitched = asyncio.run(span_merger.merge(ranked))
+        
+        expected = "\n".join(lines[:10])
+        packed_lines = [line for chunk, _ in merged for line in chunk.code.split("\n")]
+        checks = [
+            ("Overlapping, identical and adjacent ranges merged", [(c.start_line, c.end_line) for c, _ in merged] == [(1, 10), (15, 16)]),
+            ("Merged span keeps the best score", merged[0][1] == 0.9),
+            ("Merged span sliced from source", merged[0][0].code == expected),
+            ("No duplicate lines", len(packed_lines) == len(set(packed_lines))),
+            ("Changed source stitched from chunks", stitched[0][0].code == expected)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Span merger error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_answer_cache():
+    """Test exact, semantic and invalidated answer cache lookups."""
+    print("Testing answer cache...")
+    
+    try:
+        import time
+        from services.answer_cache import AnswerCache
+        
+        cache = AnswerCache(max_size=8, similarity=0.95, ttl_seconds=60)
+        generation = cache.generation
+        cache.store("what does index_file do", "A", {}, ["indexer.py"], [1.0, 0.0, 0.0], generation)
+        cache.store("how is context packed", "B", {}, ["context_packer.py"], [0.0, 1.0, 0.0], generation)
+        
+        exact = cache.lookup_exact("what does  index_file do ")
+        similar = cache.lookup_similar([0.99, 0.1, 0.0])
+        dissimilar = cache.lookup_similar([0.8, 0.6, 0.0])
+        
+        # Re-indexing a file drops only the answers built from it
+        cache.file_indexed("indexer.py", new=False)
+        dropped = cache.lookup_exact("what does index_file do")
+        kept = cache.lookup_exact("how is context packed")
+        
+        # A new file makes every earlier answer stale, including one stored late
+        cache.file_indexed("new_module.py", new=True)
+        after_new = cache.lookup_exact("how is context packed")
+        cache.store("what is late", "C", {}, ["late.py"], None, generation)
+        late = cache.lookup_exact("what is late")
+        
+        short = AnswerCache(ttl_seconds=0.05)
+        short.store("q", "D", {}, [], None)
+        fresh = short.lookup_exact("q")
+        time.sleep(0.1)
+        expired = short.lookup_exact("q")
+        
+        checks = [
+            ("Exact hit", exact is not None and exact[0].answer == "A" and exact[1] == "exact"),
+            ("Semantic hit above the threshold", similar is not None and similar[0].answer == "A" and similar[2] >= 0.95),
+            ("Semantic miss below the threshold", dissimilar is None),
+            ("Re-indexed file drops only its answers", dropped is None and kept is not None),
+            ("New file starts a generation", after_new is None and late is None),
+            ("Expired after TTL", fresh is not None and expired is None)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Answer cache error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_retrieval_cache_processes():
+    """Re-indexing in another process invalidates cached retrieval results through the index watcher."""
+    print("Testing retrieval cache across processes...")
+    
+    try:
+        import tempfile
+        import time
+        import multiprocessing
+        from db.vector_store import VectorStore
+        from db.models import CodeChunk
+        from services.retrieval_cache import RetrievalCache
+        from services.index_events import IndexEvents
+        from services.index_watcher import IndexWatcher
+        
+        dimension = 4
+        
+        def index_file(db_path, file_path):
+            chunk = CodeChunk(id=file_path, file_path=file_path, start_line=1, end_line=1, code="x = 1",
+                              tokens=3, embedding=[1.0] * dimension, metadata={})
+            VectorStore(db_path, dimension=dimension).add_embeddings([chunk])
+        
+        def in_process(db_path, file_path):
+            process = multiprocessing.get_context("fork").Process(target=index_file, args=(db_path, file_path))
+            process.start()
+            process.join()
+        
+        def ranked(file_path):
+            return [(CodeChunk(id=file_path, file_path=file_path, start_line=1, end_line=1,
+                               code="x = 1", tokens=3, metadata={}), 1.0)]
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            in_process(db_path, "shared.py")
+            in_process(db_path, "other.py")
+            
+            cache = RetrievalCache()
+            events = IndexEvents()
+            events.on_file_indexed(cache.file_indexed)
+            watcher = IndexWatcher(VectorStore(db_path, dimension=dimension), events=events)
+            watcher.poll()
+            
+            cache.put("chat", "shared question", ranked("shared.py"), "context", {})
+            cache.put("chat", "other question", ranked("other.py"), "context", {})
+            in_process(db_path, "shared.py")
+            reported = watcher.poll()
+            
+            shared = cache.get("chat", "shared question")
+            other = cache.get("chat", "other question")
+            in_process(db_path, "added.py")
+            watcher.poll()
+            after_new = cache.get("chat", "other question")
+        
+        short = RetrievalCache(ttl_seconds=0.05)
+        short.put("chat", "q", ranked("a.py"), "context", {})
+        time.sleep(0.1)
+        
+        checks = [
+            ("Re-index in another process reported", reported == 1),
+            ("Only that file's results dropped", shared is None and other is not None),
+            ("New file in another process drops all results", after_new is None),
+            ("Expired after TTL", short.get("chat", "q") is None and short.expired == 1)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Retrieval cache error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_retrieval_pipeline():
+    """Test the shared context pipeline and cache invalidation."""
+    print("Testing retrieval pipeline...")
+    
+    try:
+        import asyncio
+        from retrieval.pipeline import build_context
+        from retrieval.deadline import Deadline
+        from retrieval.reranker import reranker
+        from services.index_events import index_events
+        from db.models import CodeChunk
+        
+        chunks = [
+            (CodeChunk(id=f"p{i}", file_path=f"pipeline_{i}.py", start_line=1, end_line=2,
+                       code=f"def f{i}():\n    return {i}", tokens=10, metadata={}), 1.0 - i / 10)
+            for i in range(3)
+        ]
+        retrievals = []
+        
+        async def candidates():
+            retrievals.append(1)
+            return chunks
+        
+        async def run(endpoint):
+            return await build_context(endpoint, "how is f computed", "prompt", Deadline(2000), candidates=candidates)
+        
+        enabled, reranker.enabled = reranker.enabled, False
+        try:
+            context, stats, files = asyncio.run(run("test"))
+            _, cached_stats, cached_files = asyncio.run(run("test"))
+            asyncio.run(run("other"))
+            index_events.file_indexed("pipeline_1.py", new=False)
+            _, reindexed_stats, _ = asyncio.run(run("test"))
+        finally:
+            reranker.enabled = enabled
+        
+        checks = [
+            ("Context packed in rank order", context.index("f0") < context.index("f1") < context.index("f2")),
+            ("Result cached per endpoint", cached_stats["retrieval_cache"]["hit"] and cached_files == files and len(retrievals) == 3),
+            ("Re-indexed file invalidates through the index hook", not reindexed_stats["retrieval_cache"]["hit"])
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Retrieval pipeline error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_query_embedding_cache():
+    """Test the query embedding LRU cache."""
+    print("Testing query embedding cache...")
+    
+    try:
+        import tempfile
+        import time
+        from pathlib import Path
+        from llm.embedding_cache import QueryEmbeddingCache
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "queries.pkl")
+            cache = QueryEmbeddingCache(max_size=2, ttl_seconds=60, path=path)
+            cache.put("model", "where is  main", [1.0, 0.0])
+            cache.put("model", "what calls f", [0.0, 1.0])
+            normalized = cache.get("model", " where is main ")
+            other_model = cache.get("other", "where is main")
+            cache.put("model", "how to index", [0.5, 0.5])
+            evicted = cache.get("model", "what calls f")
+            cache.put("model", "failed", [0.0, 0.0])
+            cache.save()
+            restored = QueryEmbeddingCache(max_size=2, ttl_seconds=60, path=path)
+            
+            short = QueryEmbeddingCache(max_size=2, ttl_seconds=0.05)
+            short.put("model", "q", [1.0])
+            time.sleep(0.1)
+            expired = short.get("model", "q")
+        
+        checks = [
+            ("Whitespace-normalized hit", normalized == [1.0, 0.0]),
+            ("Keyed by model", other_model is None),
+            ("Least recently used evicted", evicted is None and cache.get("model", "where is main") is not None),
+            ("Zero embeddings not cached", cache.get("model", "failed") is None),
+            ("Persisted across restarts", restored.get("model", "how to index") == [0.5, 0.5]),
+            ("Expired after TTL", expired is None and short.expired == 1)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Query embedding cache error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_call_graph_centrality():
+    """Check call graph PageRank against a dense reference, and its warm start."""
+    print("Testing call graph centrality...")
+    
+    try:
+        import random
+        import tempfile
+        import numpy as np
+        import retrieval.ranker as ranker_module
+        from analysis.call_graph import CallGraph
+        from retrieval.ranker import HybridRanker
+        from db.models import CodeChunk, CodeNode, NodeType
+        
+        # 200 functions over 10 files; every function also calls "helper"
+        rng = random.Random(5)
+        
+        def file_nodes(file_index, extra_calls=()):
+            nodes = [
+                CodeNode(id=f"f{i}", type=NodeType.FUNCTION, name=f"func_{i}", file_path=f"m{file_index}.py",
+                         start_line=i, end_line=i, code="",
+                         metadata={"calls": [f"func_{rng.randrange(200)}" for _ in range(rng.randrange(3))]
+                                   + ["helper"] + list(extra_calls)})
+                for i in range(file_index * 20, file_index * 20 + 20)
+            ]
+            if file_index == 0:
+                nodes.append(CodeNode(id="helper", type=NodeType.FUNCTION, name="helper", file_path="m0.py",
+                                      start_line=1, end_line=1, code="", metadata={}))
+            return nodes
+        
+        files = {f"m{i}.py": file_nodes(i) for i in range(10)}
+        
+        def reference(graph):
+            """Dense power iteration to convergence, dangling mass spread evenly."""
+            node_ids, _, _, src, dst, weights = graph._edge_arrays()
+            n = len(node_ids)
+            matrix = np.zeros((n, n))
+            np.add.at(matrix, (dst, src), weights)
+            out_weight = matrix.sum(axis=0)
+            dangling = out_weight == 0
+            matrix[:, ~dangling] /= out_weight[~dangling]
+            ranks = np.full(n, 1.0 / n)
+            for _ in range(1000):
+                ranks = 0.15 / n + 0.85 * (matrix @ ranks + ranks[dangling].sum() / n)
+            return dict(zip(node_ids, ranks))
+        
+        with tempfile.TemporaryDirectory() as db_path, tempfile.TemporaryDirectory() as cold_path:
+            graph = CallGraph(db_path)
+            for path, nodes in files.items():
+                graph.update_file(path, nodes)
+            graph.compute()
+            node_index, ranks, _ = graph._snapshot
+            expected = reference(graph)
+            matches = all(abs(ranks[row] - expected[node_id]) < 1e-6 for node_id, row in node_index.items())
+            
+            # Re-index one file: the warm start converges faster than a cold start
+            files["m3.py"] = file_nodes(3, extra_calls=["func_7"])
+            graph.update_file("m3.py", files["m3.py"])
+            warm_iterations = graph.compute()
+            cold = CallGraph(cold_path)
+            for path, nodes in files.items():
+                cold.update_file(path, nodes)
+            cold_iterations = cold.compute()
+            warm_matches_cold = np.allclose(graph._snapshot[1], cold._snapshot[1], atol=1e-5)
+            unchanged = graph.compute() == 0
+            reloaded = CallGraph(db_path).score(["helper"])
+            
+            # Equal vector scores: the chunk covering the most central node ranks first
+            chunks = [
+                (CodeChunk(id=f"c{i}", file_path="m0.py", start_line=i, end_line=i, code="", tokens=1,
+                           metadata={"node_ids": node_ids}), 0.5)
+                for i, node_ids in enumerate([["f1"], ["f2", "helper"], []])
+            ]
+            shared = ranker_module.call_graph
+            ranker_module.call_graph = graph
+            try:
+                ranked = [chunk.id for chunk, _ in HybridRanker().rank(chunks, [])]
+            finally:
+                ranker_module.call_graph = shared
+            batch = graph.scores([["f1"], ["f2", "helper"], [], ["unknown"]])
+        
+        checks = [
+            ("PageRank matches dense reference", matches),
+            ("Warm start converges faster", 0 < warm_iterations < cold_iterations),
+            ("Warm start reaches the cold-start ranks", warm_matches_cold),
+            ("Unchanged graph not recomputed", unchanged),
+            ("Most called node scores 1.0, also after reload", graph.score(["helper"]) == 1.0 and reloaded == 1.0),
+            ("Batch scores match score()", batch.tolist() == [graph.score(["f1"]), 1.0, 0.0, 0.0]),
+            ("Chunks ordered by centrality", ranked == ["c1", "c0", "c2"])
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Call graph centrality error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_hybrid_ranker():
+    """Test graph proximity scoring in the hybrid ranker."""
+    print("Testing hybrid ranker...")
+    
+    try:
+        import numpy as np
+        from retrieval.ranker import IntervalIndex, HybridRanker
+        from db.models import CodeChunk
+        
+        rng = np.random.default_rng(7)
+        files = ["a.py", "b.py", "c.py"]
+        nodes = []
+        for _ in range(200):
+            start = int(rng.integers(1, 500))
+            nodes.append({"file_path": files[int(rng.integers(0, 2))], "start_line": start,
+                          "end_line": start + int(rng.integers(0, 40))})
+        ranges = [(files[int(rng.integers(0, 3))], int(start), int(start) + int(rng.integers(0, 60)))
+                  for start in rng.integers(1, 550, size=300)]
+        
+        # Covered fraction by counting lines one by one
+        covered = {file_path: set() for file_path in files}
+        for node in nodes:
+            covered[node["file_path"]].update(range(node["start_line"], node["end_line"] + 1))
+        expected = [
+            sum(line in covered[file_path] for line in range(start, end + 1)) / (end - start + 1)
+            for file_path, start, end in ranges
+        ]
+        overlap = IntervalIndex(nodes).overlap(
+            [file_path for file_path, _, _ in ranges],
+            np.array([start for _, start, _ in ranges], dtype=np.int64),
+            np.array([end for _, _, end in ranges], dtype=np.int64)
+        )
+        
+        # Equal vector scores: the chunk under a graph node ranks first
+        chunks = [
+            (CodeChunk(id=f"r{i}", file_path="ranked.py", start_line=10 * i + 1, end_line=10 * i + 10,
+                       code="", tokens=1, metadata={}), 0.5)
+            for i in range(3)
+        ]
+        ranked = HybridRanker().rank(chunks, [{"file_path": "ranked.py", "start_line": 21, "end_line": 30}])
+        
+        checks = [
+            ("Interval overlap matches line counting", np.allclose(overlap, expected)),
+            ("No graph nodes, no proximity", not IntervalIndex([]).overlap(["a.py"], np.array([1]), np.array([5])).any()),
+            ("Covered chunk ranked first", [chunk.id for chunk, _ in ranked] == ["r2", "r0", "r1"])
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Hybrid ranker error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_reranker_timeout():
+    """Test that slow re-ranking keeps the first-stage order and builds no backlog."""
+    print("Testing reranker timeout...")
+    
+    try:
+        import asyncio
+        import time
+        from retrieval.reranker import CrossEncoderReranker
+        from db.models import CodeChunk
+        
+        class SlowModel:
+            """Cross-encoder stub, well over the timeout, scoring later chunks higher."""
+            
+            def __init__(self):
+                self.batches = 0
+            
+            def predict(self, pairs, batch_size, show_progress_bar):
+                self.batches += 1
+                time.sleep(0.3)
+                return [float(text[-1]) for _, text in pairs]
+        
+        model = SlowModel()
+        reranker = CrossEncoderReranker("stub", timeout_ms=50)
+        reranker.model = model
+        chunks = [
+            (CodeChunk(id=f"c{i}", file_path="a.py", start_line=i, end_line=i,
+                       code=f"c{i}", tokens=1, metadata={}), 1.0 - i / 10)
+            for i in range(3)
+        ]
+        
+        async def rerank_concurrently():
+            started = time.monotonic()
+            results = await asyncio.gather(*[reranker.rerank(f"query {i}", chunks) for i in range(5)])
+            return results, time.monotonic() - started
+        
+        results, elapsed = asyncio.run(rerank_concurrently())
+        # Wait for the running batch; queued ones were dropped
+        reranker.executor.submit(lambda: None).result()
+        batches = model.batches
+        
+        # The batch that ran filled the cache: its query re-ranks without the model
+        cached = asyncio.run(reranker.rerank("query 0", chunks))
+        
+        checks = [
+            ("First-stage order kept on timeout", all(result == chunks for result in results)),
+            ("Timed out within the cap", elapsed < 0.25 and reranker.timeouts == 5),
+            ("Queued batches dropped", batches == 1),
+            ("Finished batch cached", [chunk.id for chunk, _ in cached] == ["c2", "c1", "c0"] and model.batches == 1)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Reranker timeout error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_deadline():
+    """Test the per-request retrieval deadline."""
+    print("Testing retrieval deadline...")
+    
+    try:
+        import asyncio
+        from retrieval.deadline import Deadline
+        
+        async def stage(delay, result):
+            await asyncio.sleep(delay)
+            return result
+        
+        async def run():
+            deadline = Deadline(200)
+            quick = await deadline.run("embedding", stage(0.0, "embedded"))
+            # The embedding stage may use 30% of the budget
+            slow = await deadline.run("embedding", stage(1.0, "embedded"), fallback=None)
+            slice_elapsed = deadline.elapsed_ms()
+            allowed = deadline.allows("compression")
+            await asyncio.sleep(0.2)
+            skipped = await deadline.run("vector_search", stage(0.0, "found"), fallback=[])
+            return quick, slow, slice_elapsed, allowed, skipped, deadline.allows("compression"), deadline.report()
+        
+        quick, slow, slice_elapsed, allowed, skipped, allowed_late, report = asyncio.run(run())
+        checks = [
+            ("Stage within its slice", quick == "embedded"),
+            ("Slow stage cut at its share of the budget", slow is None and slice_elapsed < 150),
+            ("Optional stage allowed while time is left", allowed),
+            ("Stages skipped once the budget is used up", skipped == [] and not allowed_late),
+            ("Degraded stages reported", sorted(report["degraded"]) == ["compression", "embedding", "vector_search"])
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Retrieval deadline error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_graph_expansion_budget():
+    """Test collection of graph expansions under the chat latency budget."""
+    print("Testing graph expansion budget...")
+    
+    try:
+        import asyncio
+        import time
+        from api.chat import collect_graph_nodes
+        from retrieval.deadline import Deadline
+        
+        async def expansion(delay, node_id):
+            await asyncio.sleep(delay)
+            return [{"id": node_id}]
+        
+        async def collect(question_delay, chunk_delay, budget):
+            deadline = Deadline(2000)
+            loop = asyncio.get_running_loop()
+            started = time.monotonic()
+            nodes = await collect_graph_nodes(
+                [asyncio.create_task(expansion(question_delay, "question"))],
+                [asyncio.create_task(expansion(chunk_delay, "chunk"))],
+                loop.time() + budget,
+                deadline
+            )
+            return sorted(node["id"] for node in nodes), time.monotonic() - started, deadline.degraded
+        
+        # Question expansion done first: no wait for the slow chunk expansion
+        fast, fast_elapsed, fast_degraded = asyncio.run(collect(0.01, 1.0, 0.5))
+        # Chunk expansion finishing while the question expansion runs is kept
+        both, _, _ = asyncio.run(collect(0.05, 0.0, 0.5))
+        # Question expansion over budget is dropped and recorded
+        late, late_elapsed, late_degraded = asyncio.run(collect(1.0, 1.0, 0.05))
+        
+        checks = [
+            ("Unfinished chunk expansion dropped without waiting", fast == ["question"] and fast_elapsed < 0.5 and not fast_degraded),
+            ("Finished chunk expansion kept", both == ["chunk", "question"]),
+            ("Question expansion bounded by the budget", late == [] and late_elapsed < 0.5 and "graph_expansion" in late_degraded)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Graph expansion budget error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_reachability_index():
+    """Check transitive call queries on a cyclic call graph against a plain BFS."""
+    print("Testing reachability index...")
+    
+    try:
+        import random
+        import tempfile
+        from collections import deque
+        from analysis.call_graph import CallGraph
+        from analysis.reachability import ReachabilityIndex
+        from db.models import CodeNode, NodeType
+        
+        # Random calls between 60 functions: cycles, self-calls and unreached nodes
+        rng = random.Random(7)
+        calls = {i: [f"func_{rng.randrange(60)}" for _ in range(rng.randrange(4))] for i in range(60)}
+        nodes = [
+            CodeNode(id=f"f{i}", type=NodeType.FUNCTION, name=f"func_{i}", file_path=f"m{i % 3}.py",
+                     start_line=i, end_line=i, code="", metadata={"calls": calls[i]})
+            for i in range(60)
+        ]
+        
+        with tempfile.TemporaryDirectory() as db_path:
+            graph = CallGraph(db_path)
+            # A worker that did not index: built (empty) before the indexing run
+            reader = ReachabilityIndex(CallGraph(db_path))
+            reader.callees("f0")
+            
+            for path in ("m0.py", "m1.py", "m2.py"):
+                graph.update_file(path, [node for node in nodes if node.file_path == path])
+            graph.compute()
+            index = ReachabilityIndex(graph)
+            index.rebuild()
+            synced = reader.sync()
+            
+            # Brute force over the resolved edges
+            node_ids, _, _, src, dst = graph.edges()
+            successors = {node_id: [] for node_id in node_ids}
+            predecessors = {node_id: [] for node_id in node_ids}
+            for s, d in zip(src.tolist(), dst.tolist()):
+                successors[node_ids[s]].append(node_ids[d])
+                predecessors[node_ids[d]].append(node_ids[s])
+            
+            def bfs(start, edges):
+                seen, queue = set(), deque([start])
+                while queue:
+                    for peer in edges[queue.popleft()]:
+                        if peer not in seen:
+                            seen.add(peer)
+                            queue.append(peer)
+                seen.discard(start)
+                return seen
+            
+            callees = {node_id: bfs(node_id, successors) for node_id in node_ids}
+            callers = {node_id: bfs(node_id, predecessors) for node_id in node_ids}
+            
+            callees_match = all(
+                {node["id"] for node in index.callees(node_id, limit=100)} == callees[node_id]
+                for node_id in node_ids
+            )
+            callers_match = all(
+                {node["id"] for node in index.callers(node_id, limit=100)} == callers[node_id]
+                for node_id in node_ids
+            )
+            reaches_match = all(
+                index.reaches(a, b) == (b in callees[a])
+                for a in node_ids for b in node_ids if a != b
+            )
+            
+            # Bounded queries: the nearest nodes, within the limit
+            bounded = [
+                [node["depth"] for node in index.callees(node_id, limit=5)]
+                for node_id in node_ids
+            ]
+            bounded_ok = all(
+                len(depths) == min(5, len(callees[node_id])) and depths == sorted(depths)
+                for node_id, depths in zip(node_ids, bounded)
+            )
+            cyclic = sum(1 for node_id in node_ids if callees[node_id] & callers[node_id])
+            reader_match = synced and all(
+                {node["id"] for node in reader.callers(node_id, limit=100)} == callers[node_id]
+                for node_id in node_ids
+            )
+        
+        checks = [
+            ("Graph has call cycles", cyclic > 0),
+            ("Transitive callees match BFS", callees_match),
+            ("Transitive callers match BFS", callers_match),
+            ("reaches() matches BFS", reaches_match),
+            ("Limited results nearest first", bounded_ok),
+            ("Other worker reloads the saved call graph", reader_match)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Reachability index error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_async_rate_limiter():
+    """Test that the rate limiter waits without blocking the event loop."""
+    print("Testing async rate limiter...")
+    
+    try:
+        import asyncio
+        import time
+        from llm.rate_limiter import RateLimiter
+        
+        async def run():
+            limiter = RateLimiter(600, burst=2)
+            ticks = 0
+            
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+            
+            ticking = asyncio.create_task(ticker())
+            started = time.monotonic()
+            for _ in range(4):
+                await limiter.acquire()
+            elapsed = time.monotonic() - started
+            ticking.cancel()
+            return elapsed, ticks
+        
+        elapsed, ticks = asyncio.run(run())
+        checks = [
+            # Burst of 2, then one request per 0.1s
+            ("Requests paced by the bucket", 0.15 <= elapsed < 0.5),
+            ("Event loop kept running while waiting", ticks >= 10)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Async rate limiter error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_rate_limiter_tokens():
+    """Test queueing and token budgets of the rate limiter."""
+    print("Testing rate limiter token budget...")
+    
+    try:
+        import asyncio
+        import time
+        from llm.rate_limiter import RateLimiter
+        
+        async def fifo():
+            limiter = RateLimiter(600, burst=1)
+            order = []
+            
+            async def request(name):
+                await limiter.acquire()
+                order.append(name)
+            
+            tasks = []
+            for name in "abc":
+                tasks.append(asyncio.create_task(request(name)))
+                await asyncio.sleep(0)
+            await asyncio.gather(*tasks)
+            return order
+        
+        async def cancel():
+            limiter = RateLimiter(60, burst=1)
+            await limiter.acquire()
+            waiting = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            return len(limiter.waiters)
+        
+        async def bypass():
+            # 1000 tokens/s; a 600-token request may be passed over for 0.6s
+            limiter = RateLimiter(60000, burst=100, tokens_per_minute=60000)
+            await limiter.acquire(59900)
+            started = time.monotonic()
+            grants = []
+            
+            async def request(name, tokens):
+                await limiter.acquire(tokens)
+                grants.append((name, time.monotonic() - started))
+            
+            large = asyncio.create_task(request("large", 600))
+            small = []
+            while time.monotonic() - started < 1.5:
+                small.append(asyncio.create_task(request("small", 50)))
+                await asyncio.sleep(0.02)
+            await asyncio.gather(large, *small)
+            return grants
+        
+        def refund():
+            limiter = RateLimiter(60, tokens_per_minute=6000)
+            reserved = limiter.wait_if_needed(5000)
+            before = limiter.budget
+            limiter.reconcile(reserved, 1000)
+            return reserved, limiter.budget - before
+        
+        order = asyncio.run(fifo())
+        left_waiting = asyncio.run(cancel())
+        grants = asyncio.run(bypass())
+        large_at = next(at for name, at in grants if name == "large")
+        bypassed = [at for name, at in grants if name == "small" and at < large_at]
+        reserved, refunded = refund()
+        
+        checks = [
+            ("FIFO without a token budget", order == ["a", "b", "c"]),
+            ("Cancelled request leaves the queue", left_waiting == 0),
+            ("Small prompts pass a large one", len(bypassed) > 0),
+            ("Large prompt served once its patience runs out", large_at < 1.4),
+            ("Reconcile refunds unused tokens", reserved == 5000 and refunded >= 4000)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            print(f"  ✗ Large prompt granted after {large_at:.2f}s, {len(bypassed)} small prompts before it")
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Rate limiter token budget error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
+def test_failed_request_refunds():
+    """Test that failed LLM requests give back their token reservations."""
+    print("Testing failed request refunds...")
+    
+    try:
+        import asyncio
+        from llm.gemini_client import GeminiClient
+        from llm.rate_limiter import rate_limiter
+        from llm.token_counter import token_counter
+        
+        class FailingModel:
+            """Stub model raising the given error, before or while streaming."""
+            
+            def __init__(self, error):
+                self.error = error
+            
+            def generate_content(self, prompt, generation_config, stream=False):
+                if not stream:
+                    raise self.error
+                
+                def chunks():
+                    yield type("Chunk", (), {"text": "partial"})()
+                    raise self.error
+                return chunks()
+        
+        rate_limiter.add_model("refund-test", 6000, burst=10, tokens_per_minute=60000)
+        limiter = rate_limiter.limiters["refund-test"]
+        client = GeminiClient("refund-test")
+        prompt = "Explain the indexer. " * 50
+        prompt_tokens = token_counter.count_tokens(f"system\n\n{prompt}")
+        
+        async def fail(error, stream=False):
+            client.model = FailingModel(error)
+            limiter.budget = float(limiter.tokens_per_minute)
+            if stream:
+                return [text async for text in client.generate_response_stream(f"system\n\n{prompt}")]
+            try:
+                await client.generate_with_context("system", prompt)
+            except Exception:
+                pass
+            return None
+        
+        asyncio.run(fail(Exception("429 Resource has been exhausted (e.g. check quota)")))
+        after_rejected = limiter.budget
+        asyncio.run(fail(TimeoutError("Deadline exceeded")))
+        after_timeout = limiter.budget
+        streamed = asyncio.run(fail(TimeoutError("Deadline exceeded"), stream=True))
+        after_stream = limiter.budget
+        
+        full = limiter.tokens_per_minute
+        checks = [
+            ("Rejected request refunded in full", after_rejected == full),
+            ("Dispatched request keeps only its prompt tokens", full - prompt_tokens <= after_timeout < full - prompt_tokens + 100),
+            ("Failed stream refunded", streamed[0] == "partial" and full - prompt_tokens <= after_stream < full - prompt_tokens + 100)
+        ]
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+        if not all(passed for _, passed in checks):
+            print(f"  ✗ Budgets {after_rejected:.0f}, {after_timeout:.0f}, {after_stream:.0f} of {full}, prompt {prompt_tokens}")
+            return False
+    
+    except Exception as e:
+        print(f"  ✗ Failed request refund error: {e}")
+        return False
+    
+    print("\n")
+    return True
+
 def test_token_counter():
     """Test token counting."""
     print("Testing token counter...")
@@ -163,7 +1555,28 @@ def main():
     results.append(("Imports", test_imports()))
     results.append(("Configuration", test_configuration()))
     results.append(("Database Clients", test_database_clients()))
+    results.append(("Vector Store Concurrency", test_vector_store_concurrency()))
+    results.append(("Vector Store Processes", test_vector_store_processes()))
+    results.append(("Sharded Vector Store", test_sharded_vector_store()))
+    results.append(("Graph Write Batching", test_graph_write_batching()))
+    results.append(("Embedded Graph Store", test_embedded_graph_store()))
+    results.append(("Embedded Graph Expansion", test_embedded_graph_expansion()))
     results.append(("Code Analysis", test_code_analysis()))
+    results.append(("Context Packer", test_context_packer()))
+    results.append(("Query Embedding Cache", test_query_embedding_cache()))
+    results.append(("Call Graph Centrality", test_call_graph_centrality()))
+    results.append(("Hybrid Ranker", test_hybrid_ranker()))
+    results.append(("Reranker Timeout", test_reranker_timeout()))
+    results.append(("Retrieval Deadline", test_deadline()))
+    results.append(("Graph Expansion Budget", test_graph_expansion_budget()))
+    results.append(("Reachability Index", test_reachability_index()))
+    results.append(("Span Merger", test_span_merger()))
+    results.append(("Answer Cache", test_answer_cache()))
+    results.append(("Retrieval Pipeline", test_retrieval_pipeline()))
+    results.append(("Retrieval Cache Processes", test_retrieval_cache_processes()))
+    results.append(("Async Rate Limiter", test_async_rate_limiter()))
+    results.append(("Rate Limiter Token Budget", test_rate_limiter_tokens()))
+    results.append(("Failed Request Refunds", test_failed_request_refunds()))
     results.append(("Token Counter", test_token_counter()))
     
     print("=" * 60)